@@ -1,7 +1,7 @@
 import time, psutil, torch
 import pandas as pd
 from tqdm import tqdm
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, BertTokenizer
+from transformers import AutoTokenizer, AutoModelForSequenceClassification, BertTokenizerFast
 from torch.utils.data import DataLoader
 from datasets import Dataset
 import sys, os
@@ -44,6 +44,70 @@ def benchmark(model, tokenizer, dataset, device, batch_size=1):
 
     return avg_time, peak_memory
 
+def length_buckets(lengths, batch_size):
+    """
+    sort indices by token length and cut them into batches (same as the server inference worker)
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+def benchmark_bucketing(model, tokenizer, texts, device, batch_size=64, bucketed=True):
+    """
+    benchmark padding every batch to its longest comment (arrival order) vs length-bucketed batches
+    """
+    model.to(device)
+    model.eval()
+
+    # tokenize once without padding, padding is done per batch like in serving
+    encodings = tokenizer(texts, truncation=True, max_length=512)
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    if bucketed:
+        batches = length_buckets(lengths, batch_size)
+    else:
+        batches = [list(range(i, min(i + batch_size, len(texts)))) for i in range(0, len(texts), batch_size)]
+
+    total_time = 0
+    padded_tokens = 0
+    with torch.no_grad():
+        for batch in tqdm(batches, desc=f"{'Bucketed' if bucketed else 'Padded'} inference on {device}"):
+            start = time.perf_counter()
+            features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch]
+            inputs = tokenizer.pad(features, return_tensors='pt')
+            inputs = {k: v.to(device) for k, v in inputs.items()}
+            _ = model(**inputs)
+            end = time.perf_counter()
+            total_time += (end - start)
+            padded_tokens += inputs["input_ids"].numel()
+
+    return {
+        "time_per_sample": total_time / len(texts),
+        "throughput": len(texts) / total_time,
+        # real tokens / tokens after padding, 1.0 means no wasted compute on padding
+        "padding_efficiency": sum(lengths) / padded_tokens,
+    }
+
+def run_bucketing_benchmark(batch_size):
+    # token length distribution of real comments from the test split
+    lengths = pd.Series([len(ids) for ids in tokenizer_indobert(test_texts, truncation=True, max_length=512)["input_ids"]])
+    print(f"\n===== TOKEN LENGTH (IndoBERT-lite, {len(lengths)} comments) =====")
+    print(f"mean {lengths.mean():.1f}\tp50 {lengths.quantile(0.5):.0f}\tp90 {lengths.quantile(0.9):.0f}\tp99 {lengths.quantile(0.99):.0f}\tmax {lengths.max()}")
+
+    devices = [torch.device("cpu")] + ([torch.device("cuda")] if torch.cuda.is_available() else [])
+    print(f"\n===== BUCKETING RESULTS (Batch Size = {batch_size}) =====")
+    print("Device\tMode\t\tTime/sample (s)\tSamples/s\tPadding eff.")
+    for device in devices:
+        for bucketed in (False, True):
+            result = benchmark_bucketing(model_indobert, tokenizer_indobert, test_texts, device, batch_size, bucketed)
+            mode = "bucketed" if bucketed else "padded"
+            print(f"{device.type.upper()}\t{mode}\t{result['time_per_sample']:.6f}\t{result['throughput']:.2f}\t\t{result['padding_efficiency']:.3f}")
+            benchmark_result.append({
+                "model": "IndoBERT-lite",
+                "device": device.type.upper(),
+                "batch_size": batch_size,
+                "mode": mode,
+                **result
+            })
+
 # load model and tokenizer
 model_name_indobert = "indobenchmark/indobert-lite-base-p2"
 model_name_roberta = "distilbert/distilroberta-base"
@@ -54,7 +118,8 @@ model_indobert.load_state_dict(torch.load("models/best_indobert.pt", weights_onl
 model_roberta = AutoModelForSequenceClassification.from_pretrained(model_name_roberta, num_labels=2)
 model_roberta.load_state_dict(torch.load("models/best_roberta.pt", weights_only=True))
 
-tokenizer_indobert = BertTokenizer.from_pretrained(model_name_indobert)
+# fast (rust) tokenizer like the server, same ids as BertTokenizer
+tokenizer_indobert = BertTokenizerFast.from_pretrained(model_name_indobert)
 tokenizer_roberta = AutoTokenizer.from_pretrained(model_name_roberta)
 
 # benchmark fine-tuned model on CPU and GPU
@@ -114,6 +179,15 @@ if len(sys.argv) > 1 and sys.argv[1] == "--run":
     # append mode
     df_benchmark.to_csv("data/benchmark_batchsize.csv", mode="a", index=False, header=not os.path.exists("data/benchmark_batchsize.csv"))
 
+elif len(sys.argv) > 1 and sys.argv[1] == "--bucketing":
+    # python benchmark.py --bucketing [batch_size]
+    bz = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    benchmark_result = []
+    run_bucketing_benchmark(bz)
+
+    df_benchmark = pd.DataFrame(benchmark_result)
+    df_benchmark.to_csv("data/benchmark_bucketing.csv", mode="a", index=False, header=not os.path.exists("data/benchmark_bucketing.csv"))
+
 # Bagian utama yang menjalankan semua subprocess
 elif __name__ == "__main__":
     list_bz = [1, 4, 8, 16, 32, 64, 128]
@@ -0,0 +1,144 @@
+import time, psutil, torch
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from transformers import AutoModelForSequenceClassification, BertTokenizerFast
+from sklearn.metrics import f1_score, recall_score
+import sys, os
+import subprocess
+
+# export the fine-tuned IndoBERT-lite classifier for CPU serving and check the accuracy parity of each backend:
+# - python export_onnx.py --export            -> models/best_indobert.onnx, models/best_indobert.int8.onnx and models/indobert_tokenizer.json
+# - python export_onnx.py                     -> benchmark every backend (one subprocess each so RSS is not shared)
+# - python export_onnx.py --run <backend>     -> benchmark one backend (torch | torch-int8 | onnx | onnx-int8)
+
+model_name_indobert = "indobenchmark/indobert-lite-base-p2"
+CHECKPOINT_PATH = "models/best_indobert.pt"
+ONNX_PATH = "models/best_indobert.onnx"
+ONNX_INT8_PATH = "models/best_indobert.int8.onnx"
+TOKENIZER_PATH = "models/indobert_tokenizer.json" # fast tokenizer loaded by the server without transformers
+RESULT_PATH = "data/benchmark_backends.csv"
+BACKENDS = ["torch", "torch-int8", "onnx", "onnx-int8"]
+BATCH_SIZE = 64
+
+def load_torch_model():
+    model = AutoModelForSequenceClassification.from_pretrained(model_name_indobert, num_labels=2)
+    model.load_state_dict(torch.load(CHECKPOINT_PATH, weights_only=True, map_location="cpu"))
+    model.eval()
+    return model
+
+def export_onnx():
+    """
+    export fp32 ONNX graph with dynamic batch and sequence axes, then quantize linear layers to int8.
+    the fast tokenizer is saved next to them, check its ids with server/benchmark_tokenizer.py
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    model = load_torch_model()
+    tokenizer = BertTokenizerFast.from_pretrained(model_name_indobert)
+    tokenizer.backend_tokenizer.save(TOKENIZER_PATH)
+    print(f"Exported {TOKENIZER_PATH}")
+    dummy = tokenizer(["contoh komentar", "slot gacor maxwin hari ini"], return_tensors="pt", padding=True)
+
+    torch.onnx.export(
+        model,
+        (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+        ONNX_PATH,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "token_type_ids": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+    print(f"Exported {ONNX_PATH}")
+
+    quantize_dynamic(ONNX_PATH, ONNX_INT8_PATH, weight_type=QuantType.QInt8)
+    print(f"Exported {ONNX_INT8_PATH}")
+
+def load_backend(backend):
+    """
+    return a function that take padded numpy inputs and return logits as numpy array
+    """
+    torch.set_num_threads(1) # same as one server inference worker
+
+    if backend in ("torch", "torch-int8"):
+        model = load_torch_model()
+        if backend == "torch-int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        def forward(inputs):
+            with torch.no_grad():
+                return model(**{k: torch.from_numpy(v) for k, v in inputs.items()}).logits.numpy()
+        return forward
+
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    session = ort.InferenceSession(ONNX_INT8_PATH if backend == "onnx-int8" else ONNX_PATH, options, providers=["CPUExecutionProvider"])
+
+    def forward(inputs):
+        return session.run(["logits"], {k: v.astype(np.int64) for k, v in inputs.items()})[0]
+    return forward
+
+def benchmark_backend(backend, texts, labels):
+    """
+    latency, throughput, RSS and accuracy of one backend on the test split
+    """
+    tokenizer = BertTokenizerFast.from_pretrained(model_name_indobert)
+    forward = load_backend(backend)
+
+    preds = []
+    total_time = 0
+    for start in tqdm(range(0, len(texts), BATCH_SIZE), desc=f"Inference with {backend}"):
+        batch = texts[start:start + BATCH_SIZE]
+        begin = time.perf_counter()
+        inputs = tokenizer(batch, return_tensors="np", truncation=True, padding=True, max_length=512)
+        logits = forward(dict(inputs))
+        total_time += time.perf_counter() - begin
+        preds.extend(np.argmax(logits, axis=1).tolist())
+
+    return {
+        "backend": backend,
+        "batch_size": BATCH_SIZE,
+        "time_per_sample": total_time / len(texts),
+        "throughput": len(texts) / total_time,
+        "rss_mb": psutil.Process().memory_info().rss / (1024 ** 2),
+        "f1": f1_score(labels, preds),
+        "recall": recall_score(labels, preds),
+        "preds": preds,
+    }
+
+if len(sys.argv) > 1 and sys.argv[1] == "--export":
+    export_onnx()
+
+elif len(sys.argv) > 1 and sys.argv[1] == "--run":
+    # load test dataset
+    data_test = pd.read_csv("data/data_test_judol.csv")
+    result = benchmark_backend(sys.argv[2], data_test["clean_comment"].tolist(), data_test["label"].tolist())
+
+    # keep predictions so parity with fp32 can be computed by the parent process
+    pd.DataFrame({"prediction": result.pop("preds")}).to_csv(f"data/prediction/preds_backend_{result['backend']}.csv", index=False)
+    pd.DataFrame([result]).to_csv(RESULT_PATH, mode="a", index=False, header=not os.path.exists(RESULT_PATH))
+
+elif __name__ == "__main__":
+    if os.path.exists(RESULT_PATH):
+        os.remove(RESULT_PATH)
+    for backend in BACKENDS:
+        print(f"\nRunning benchmark for backend: {backend}")
+        subprocess.run([sys.executable, __file__, "--run", backend])
+
+    df = pd.read_csv(RESULT_PATH)
+    baseline = df[df["backend"] == "torch"].iloc[0]
+    baseline_preds = pd.read_csv("data/prediction/preds_backend_torch.csv")["prediction"]
+
+    print("\n===== BACKEND RESULTS (CPU, 1 thread) =====")
+    print("Backend\t\tTime/sample (s)\tSamples/s\tRSS (MB)\tF1\tΔF1\tAgreement")
+    for _, row in df.iterrows():
+        preds = pd.read_csv(f"data/prediction/preds_backend_{row['backend']}.csv")["prediction"]
+        agreement = (preds == baseline_preds).mean()
+        print(f"{row['backend']:<12}\t{row['time_per_sample']:.6f}\t{row['throughput']:.2f}\t\t{row['rss_mb']:.1f}\t\t{row['f1']:.4f}\t{row['f1'] - baseline['f1']:+.4f}\t{agreement:.4f}")
@@ -0,0 +1,151 @@
+import time
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import f1_score, recall_score, precision_score
+
+# first stage of the server prediction cascade: hashed character n-gram logistic regression.
+# comments scored below the uncertain band are benign, above it judi, only the band goes to IndoBERT.
+# - python train_cascade.py   -> models/cascade.npz (copy it to server/models/) and data/prediction/preds_cascade.csv
+# n-gram range and C are selected on the validation split, the band is the narrowest one that keep every
+# validation comment on the right side, then recall parity and skipped traffic are reported on the test split
+
+MODEL_PATH = "models/cascade.npz"
+RESULT_PATH = "data/prediction/preds_cascade.csv"
+INDOBERT_PREDS_PATH = "data/prediction/preds_indobert-lite.csv"
+HASH_BITS = 18 # 2^18 weights
+NGRAM_RANGES = [(1, 4), (1, 5), (2, 5), (3, 5)]
+C_VALUES = [1, 4, 16]
+BAND_MARGIN = 0.05 # widen the band found on validation, unseen spam is more varied than the split
+CHECK_SAMPLES = 32 # texts and scores saved with the model, the server refuse to load it when its scores differ
+
+# 64-bit polynomial hash of the code points, mixed with fibonacci hashing into HASH_BITS buckets
+HASH_SEED = np.uint64(14695981039346656037)
+HASH_PRIME = np.uint64(1099511628211)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+def ngram_buckets(texts, ngram_range, bits):
+    """
+    bucket of every character n-gram of every text, vectorized over the whole batch (same as server/src/services/cascade.py).
+    return (text index, bucket) of each n-gram and the 1/sqrt(n-gram count) scale of each text
+    """
+    # collapse whitespace and pad, so word boundaries are part of the n-grams
+    padded = [" " + " ".join(text.split()) + " " for text in texts]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    chars = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    docs = np.repeat(np.arange(len(padded)), lengths)
+    ends = np.repeat(np.cumsum(lengths), lengths)
+    positions = np.arange(len(chars))
+
+    lo, hi = ngram_range
+    hashes = np.full(len(chars), HASH_SEED)
+    doc_parts, bucket_parts = [], []
+    for n in range(1, hi + 1):
+        # hash of the n-gram starting at each position, extended by one character per step (uint64 wraps around)
+        count = len(chars) - n + 1
+        hashes = hashes[:count] * HASH_PRIME + chars[n - 1:n - 1 + count]
+        if n < lo:
+            continue
+        inside = positions[:count] + n <= ends[:count] # n-gram doesn't cross into the next text
+        bucket_parts.append(((hashes[inside] * HASH_MIX) >> np.uint64(64 - bits)).astype(np.int64))
+        doc_parts.append(docs[:count][inside])
+
+    doc_index = np.concatenate(doc_parts)
+    buckets = np.concatenate(bucket_parts)
+    scale = 1 / np.sqrt(np.maximum(np.bincount(doc_index, minlength=len(padded)), 1))
+    return doc_index, buckets, scale
+
+def features(texts, ngram_range, bits=HASH_BITS):
+    doc_index, buckets, scale = ngram_buckets(texts, ngram_range, bits)
+    # duplicate (text, bucket) entries are summed into counts
+    return csr_matrix((scale[doc_index], (doc_index, buckets)), shape=(len(texts), 1 << bits))
+
+def score(texts, weights, bias, ngram_range, bits=HASH_BITS):
+    """
+    probability of judi without building the feature matrix, what the server computes
+    """
+    doc_index, buckets, scale = ngram_buckets(texts, ngram_range, bits)
+    logits = np.bincount(doc_index, weights=weights[buckets], minlength=len(texts)) * scale + bias
+    return 1 / (1 + np.exp(-logits))
+
+def uncertain_band(probs, labels, margin):
+    # lowest judi and highest benign probability, everything outside is decided by the cascade alone
+    low = max(probs[labels == 1].min() - margin, 0.0)
+    high = min(probs[labels == 0].max() + margin, 1.0)
+    return low, high
+
+def cascade_predictions(probs, low, high, fallback):
+    return np.where(probs < low, 0, np.where(probs > high, 1, fallback))
+
+# load dataset
+df_train = pd.read_csv("data/data_train_judol.csv")
+df_valid = pd.read_csv("data/data_valid_judol.csv")
+df_test = pd.read_csv("data/data_test_judol.csv")
+df_indobert = pd.read_csv(INDOBERT_PREDS_PATH)
+assert (df_indobert["text"].values == df_test["clean_comment"].values).all(), "IndoBERT predictions don't match the test split"
+
+train_texts, y_train = df_train["clean_comment"].tolist(), df_train["label"].values
+valid_texts, y_valid = df_valid["clean_comment"].tolist(), df_valid["label"].values
+test_texts, y_test = df_test["clean_comment"].tolist(), df_test["label"].values
+
+# model selection on the validation split: most comments outside the band
+print("===== MODEL SELECTION (validation) =====")
+print("N-grams\tC\tF1\tLow\tHigh\tSkipped")
+best = None
+for ngram_range in NGRAM_RANGES:
+    X_train, X_valid = features(train_texts, ngram_range), features(valid_texts, ngram_range)
+    for C in C_VALUES:
+        clf = LogisticRegression(C=C, max_iter=3000).fit(X_train, y_train)
+        probs = clf.predict_proba(X_valid)[:, 1]
+        low, high = uncertain_band(probs, y_valid, BAND_MARGIN)
+        skipped = ((probs < low) | (probs > high)).mean()
+        print(f"{ngram_range}\t{C}\t{f1_score(y_valid, probs > 0.5):.4f}\t{low:.3f}\t{high:.3f}\t{skipped:.3f}")
+        if best is None or skipped > best["skipped"]:
+            best = {"ngram_range": ngram_range, "C": C, "clf": clf, "low": low, "high": high, "skipped": skipped}
+
+ngram_range, clf, low, high = best["ngram_range"], best["clf"], best["low"], best["high"]
+weights = clf.coef_[0].astype(np.float32)
+bias = float(clf.intercept_[0])
+print(f"\nselected n-grams {ngram_range}, C={best['C']}, band ({low:.3f}, {high:.3f})")
+
+# the numpy scoring used by the server must agree with sklearn
+test_probs = score(test_texts, weights, bias, ngram_range)
+assert np.allclose(test_probs, clf.predict_proba(features(test_texts, ngram_range))[:, 1], atol=1e-4)
+
+# test split: IndoBERT alone vs cascade in front of IndoBERT
+indobert_preds = df_indobert["prediction"].values
+final_preds = cascade_predictions(test_probs, low, high, indobert_preds)
+stage = np.where(test_probs < low, "cascade-benign", np.where(test_probs > high, "cascade-judi", "indobert"))
+print("\n===== TEST SPLIT =====")
+print("Pipeline\t\tRecall\tPrecision\tF1")
+for name, preds in (("indobert", indobert_preds), ("cascade (alone)", (test_probs > 0.5).astype(int)), ("cascade + indobert", final_preds)):
+    print(f"{name:<20}\t{recall_score(y_test, preds):.4f}\t{precision_score(y_test, preds):.4f}\t\t{f1_score(y_test, preds):.4f}")
+print(f"\nskip the transformer: {(stage != 'indobert').mean():.3f} "
+      f"(benign {(stage == 'cascade-benign').mean():.3f}, judi {(stage == 'cascade-judi').mean():.3f})")
+print(f"judi missed by the cascade: {int(((stage == 'cascade-benign') & (y_test == 1)).sum())}, "
+      f"benign flagged by the cascade: {int(((stage == 'cascade-judi') & (y_test == 0)).sum())}")
+
+# scoring speed on batches of 1000 comments, one thread
+batch = (test_texts * (1000 // len(test_texts) + 1))[:1000]
+begin = time.perf_counter()
+for _ in range(50):
+    score(batch, weights, bias, ngram_range)
+elapsed = (time.perf_counter() - begin) / 50
+print(f"scoring: {elapsed / len(batch) * 1e6:.1f} µs/comment, {len(batch) / elapsed:,.0f} comments/s")
+
+pd.DataFrame({"text": test_texts, "label": y_test, "probability": test_probs, "stage": stage, "prediction": final_preds}).to_csv(RESULT_PATH, index=False)
+
+# model file for the server: weights, band and a parity check of the featurizer
+check_texts = np.array(test_texts[:CHECK_SAMPLES])
+np.savez_compressed(
+    MODEL_PATH,
+    weights=weights,
+    bias=np.float64(bias),
+    hash_bits=np.int64(HASH_BITS),
+    ngram_range=np.array(ngram_range, dtype=np.int64),
+    band=np.array([low, high]),
+    check_texts=check_texts,
+    check_scores=score(check_texts.tolist(), weights, bias, ngram_range),
+)
+print(f"Exported {MODEL_PATH}")
@@ -2,10 +2,16 @@
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+import asyncio
 
 from src.middleware.require_login import RequireLoginMiddleware
 from src.database.init import engine, init_db, AsyncSessionLocal
-from src.database.models import Base
+from src.services.inference_service import inference_pool
+from src.services.job_service import job_queue
+from src.services.moderation_service import moderation_scheduler, AUTO_MODERATION_ENABLED
+from src.core.http_client import get_http_client, close_http_client
+from src.utils.tokenization import load_tokenizer, TOKENIZE_AT_INGEST
 # from src.api import auth, content
 from src.router import auth, content
 
@@ -13,10 +19,33 @@ from src.router import auth, content
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application startup: Connecting to database...")
-    await init_db(Base)
+    await init_db()
     app.state.db = AsyncSessionLocal
+    # shared pooled client for every youtube/oauth call
+    app.state.http_client = get_http_client()
+    if TOKENIZE_AT_INGEST:
+        # fast tokenizer for the token ids stored at ingest, fail at startup when the exported file is missing
+        load_tokenizer()
+    # load the model in background, non-inference routes are served right away
+    print("Application startup: Loading inference model in background...")
+    model_loading = asyncio.create_task(inference_pool.start())
+    # workers for background sync/predict jobs
+    await job_queue.start()
+    if AUTO_MODERATION_ENABLED:
+        # periodic sync + predict + moderation of channels that enable it
+        await moderation_scheduler.start()
     yield
     # Shutdown
+    print("Application shutdown: Stopping auto moderation scheduler...")
+    await moderation_scheduler.shutdown()
+    print("Application shutdown: Stopping background jobs...")
+    await job_queue.shutdown()
+    print("Application shutdown: Stopping inference workers...")
+    model_loading.cancel()
+    await inference_pool.shutdown()
+    print("Application shutdown: Closing http connections...")
+    await close_http_client()
+    del app.state.http_client
     print("Application shutdown: Closing database connections...")
     await engine.dispose()
     del app.state.db
@@ -39,4 +68,12 @@ app.include_router(content.router, prefix="/content")
 # health check
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+# readiness check, only ready when the inference model is loaded and warmed up
+@app.get("/ready")
+def readiness_check():
+    model = inference_pool.status()
+    if model["state"] != "ready":
+        return JSONResponse(status_code=503, content={"status": "not ready", "model": model})
+    return {"status": "ready", "model": model}
@@ -0,0 +1,66 @@
+# microbenchmark for writing model predictions back to postgresql
+# usage: python benchmark_db.py [rows]   (uses POSTGRESQL_URL from .env, creates and removes its own video)
+import asyncio
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import update, delete
+
+from src.database.init import engine, init_db, AsyncSessionLocal
+from src.database.models import Video, Comment
+from src.database.crud_content import update_comments_prediction_batch
+
+async def update_row_by_row(db, predictions, model_version):
+    # previous implementation: one UPDATE per comment inside one transaction
+    for pred in predictions:
+        stmt = (
+            update(Comment)
+            .where(Comment.comment_id == pred["comment_id"])
+            .values(is_judi=pred["is_judi"], confidence=pred["confidence"], model_version=model_version)
+        )
+        await db.execute(stmt)
+    await db.commit()
+
+async def main(rows: int):
+    await init_db()
+    video_id = f"bench-{uuid.uuid4().hex[:8]}"
+    now = datetime.now(timezone.utc)
+
+    async with AsyncSessionLocal() as db:
+        # seed comments for a throwaway video
+        db.add(Video(video_id=video_id, playlist_id="bench", title="benchmark"))
+        db.add_all([
+            Comment(
+                comment_id=f"{video_id}-{i}", video_id=video_id, author_display_name="bench",
+                text=f"comment {i}", published_at=now, updated_at=now
+            )
+            for i in range(rows)
+        ])
+        await db.commit()
+
+        predictions = [
+            {"comment_id": f"{video_id}-{i}", "is_judi": random.random() < 0.1, "confidence": random.random()}
+            for i in range(rows)
+        ]
+
+        try:
+            print(f"===== PREDICTION WRITE-BACK ({rows} rows) =====")
+            print("Method\t\tTime (s)\tRows/s")
+            for name, method in (("row-by-row", update_row_by_row), ("bulk unnest", update_comments_prediction_batch)):
+                start = time.perf_counter()
+                await method(db, predictions, "bench")
+                elapsed = time.perf_counter() - start
+                print(f"{name}\t{elapsed:.3f}\t\t{rows / elapsed:.0f}")
+        finally:
+            # cleanup
+            await db.execute(delete(Comment).where(Comment.video_id == video_id))
+            await db.execute(delete(Video).where(Video.video_id == video_id))
+            await db.commit()
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 30000))
@@ -0,0 +1,120 @@
+# microbenchmark and parity check for src/utils/preprocessing.normalize_text
+# usage: python benchmark_normalize.py [corpus_dir]   (default ../engine/data, needs beautifulsoup4 for the previous implementation)
+# every comment of the csv corpora must normalize byte-identical to the reference implementation, exit code 1 otherwise
+import csv
+import glob
+import os
+import re
+import sys
+import time
+import unicodedata
+
+from bs4 import BeautifulSoup
+
+from src.utils.preprocessing import CHARACTER_MAP, normalize_text, normalize_many, map_characters
+
+TEXT_COLUMNS = ("comment", "clean_comment", "text")
+MAX_KEY_LENGTH = max(len(key) for key in CHARACTER_MAP)
+
+def per_character_map(text: str) -> str:
+    # previous implementation: one dict lookup per character, multi-codepoint keys (keycap, VS16 emoji) never match
+    return ''.join(CHARACTER_MAP.get(char, char) for char in text)
+
+def longest_match_map(text: str) -> str:
+    # reference: longest CHARACTER_MAP key at every position, plain python
+    result = []
+    i, n = 0, len(text)
+    while i < n:
+        for size in range(min(MAX_KEY_LENGTH, n - i), 0, -1):
+            value = CHARACTER_MAP.get(text[i:i + size])
+            if value is not None:
+                result.append(value)
+                i += size
+                break
+        else:
+            result.append(text[i])
+            i += 1
+    return ''.join(result)
+
+def previous_character_stage(text: str, map_characters=per_character_map) -> str:
+    text = map_characters(text)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join([c for c in text if not unicodedata.combining(c)])
+    text = re.sub(r'[\u200B\u200C\u200D\uFEFF]', '', text)
+    return re.sub(r'[^\w\s\-]', ' ', text)
+
+def previous_normalize_text(text: str, map_characters=per_character_map) -> str:
+    # previous implementation: bs4 tree per comment, uncompiled regex passes, per-character steps
+    text = BeautifulSoup(text, "html.parser").get_text()
+    text = re.sub(r'https?://\S+|www\.\S+', '', text)
+    text = re.sub(r'\b(bit\.ly|tinyurl\.com|t\.co|goo\.gl|linktr\.ee)/\S+', '', text)
+    text = re.sub(r'\b\d{1,2}:\d{2}(?::\d{2})?\b', '', text)
+    text = re.sub(r'[@#](\w+)', r'\1', text)
+    text = previous_character_stage(text, map_characters)
+    return text.lower().strip()
+
+def reference_normalize_text(text: str) -> str:
+    return previous_normalize_text(text, longest_match_map)
+
+def load_corpus(corpus_dir: str) -> list[str]:
+    texts = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "**", "*.csv"), recursive=True)):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                texts.extend(row[column] for column in TEXT_COLUMNS if row.get(column))
+    return texts
+
+def measure(name: str, run, texts: list[str], repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run(texts)
+    elapsed = time.perf_counter() - start
+    rate = len(texts) * repeat / elapsed
+    print(f"{name:<32}\t{elapsed / repeat:.4f}\t\t{rate:,.0f}")
+    return rate
+
+def main(corpus_dir: str):
+    texts = load_corpus(corpus_dir)
+    if not texts:
+        sys.exit(f"No comments found in {corpus_dir}")
+
+    mismatches = [(text, expected, actual) for text in texts
+                  if (expected := reference_normalize_text(text)) != (actual := normalize_text(text))]
+    print(f"===== PARITY ({len(texts)} comments, {len(set(texts))} distinct) =====")
+    for text, expected, actual in mismatches[:10]:
+        print(f"input:    {text!r}\nexpected: {expected!r}\nactual:   {actual!r}\n")
+    print(f"{len(mismatches)} mismatches")
+
+    # comments where multi-codepoint keys now apply, they were split into junk tokens before
+    distinct = list(dict.fromkeys(texts))
+    changed = [(before, after) for text in distinct
+               if (before := previous_normalize_text(text)) != (after := normalize_text(text))]
+    words_before = sum(len(before.split()) for before, _ in changed)
+    words_after = sum(len(after.split()) for _, after in changed)
+    print(f"\n{len(changed)} distinct comments changed by multi-codepoint keys, words {words_before} -> {words_after}")
+    for before, after in changed[:3]:
+        print(f"  {before!r} -> {after!r}")
+
+    print(f"\n===== THROUGHPUT ({len(distinct)} distinct comments) =====")
+    print("Method\t\t\t\t\tTime (s)\tComments/s")
+    before = measure("previous normalize_text", lambda batch: [previous_normalize_text(t) for t in batch], distinct, 1)
+    after = measure("normalize_text", lambda batch: [normalize_text(t) for t in batch], distinct, 5)
+    measure("normalize_many", normalize_many, distinct, 5)
+    measure("normalize_many (raw corpus)", normalize_many, texts, 5)
+    print(f"\nspeedup {after / before:.1f}x")
+
+    # character map stage only (map, NFKD, combining, zero-width, symbols), on every comment and on the spam using sequences
+    sequences = [text for text in distinct if longest_match_map(text) != per_character_map(text)]
+    for name, batch in (("all comments", distinct), ("comments with sequences", sequences)):
+        if not batch:
+            continue
+        print(f"\n===== CHARACTER MAP STAGE, {name} ({len(batch)}) =====")
+        print("Method\t\t\t\t\tTime (s)\tComments/s")
+        measure("per-character join", lambda b: [previous_character_stage(t) for t in b], batch, 3)
+        measure("longest match, python loop", lambda b: [previous_character_stage(t, longest_match_map) for t in b], batch, 3)
+        measure("trie + translate table", lambda b: [map_characters(t) for t in b], batch, 20)
+
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "engine", "data"))
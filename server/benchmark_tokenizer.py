@@ -0,0 +1,96 @@
+# parity check and microbenchmark of the fast serving tokenizer (src/utils/tokenization) against the slow BertTokenizer
+# usage: python benchmark_tokenizer.py [corpus_dir] [slow_tokenizer]   (default ../engine/data and the hub IndoBERT tokenizer)
+# every normalized comment of the csv corpora must get the same input ids, and every padded batch the same arrays,
+# as BertTokenizer(truncation=True, max_length=512) + pad(); exit code 1 otherwise
+import csv
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+from transformers import BertTokenizer
+
+from src.services.inference_worker import length_buckets, BATCH_SIZE
+from src.utils import tokenization
+from src.utils.preprocessing import normalize_many
+
+TEXT_COLUMNS = ("comment", "clean_comment", "text")
+
+def load_corpus(corpus_dir: str) -> list[str]:
+    texts = []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "**", "*.csv"), recursive=True)):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                texts.extend(row[column] for column in TEXT_COLUMNS if row.get(column))
+    return texts
+
+def slow_batches(slow: BertTokenizer, texts: list[str]) -> list[dict]:
+    # previous serving path: tokenize without padding, then pad each length bucket
+    encodings = slow(texts, truncation=True, max_length=tokenization.MAX_LENGTH)
+    lengths = [len(ids) for ids in encodings["input_ids"]]
+    return [
+        dict(slow.pad([{key: encodings[key][i] for key in encodings.keys()} for i in bucket], return_tensors="np"))
+        for bucket in length_buckets(lengths, BATCH_SIZE)
+    ]
+
+def fast_batches(sequences: list[np.ndarray]) -> list[dict]:
+    lengths = [len(ids) for ids in sequences]
+    return [tokenization.pad_batch([sequences[i] for i in bucket]) for bucket in length_buckets(lengths, BATCH_SIZE)]
+
+def measure(name: str, run, texts: list, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run(texts)
+    elapsed = time.perf_counter() - start
+    rate = len(texts) * repeat / elapsed
+    print(f"{name:<32}\t{elapsed / repeat:.4f}\t\t{rate:,.0f}")
+    return rate
+
+def main(corpus_dir: str, slow_name: str):
+    raw = load_corpus(corpus_dir)
+    if not raw:
+        sys.exit(f"No comments found in {corpus_dir}")
+    texts = list(dict.fromkeys(normalize_many(raw)))
+
+    slow = BertTokenizer.from_pretrained(slow_name)
+    tokenization.load_tokenizer(from_hub=True)
+    print(f"fast tokenizer: {tokenization.TOKENIZER_PATH if os.path.exists(tokenization.TOKENIZER_PATH) else 'converted from ' + tokenization.MODEL_NAME}")
+    print(f"tokenizer version: {tokenization.tokenizer_version}")
+
+    # input ids of every comment
+    expected = slow(texts, truncation=True, max_length=tokenization.MAX_LENGTH)["input_ids"]
+    actual = tokenization.encode(texts)
+    mismatches = [(text, ids, fast.tolist()) for text, ids, fast in zip(texts, expected, actual) if ids != fast.tolist()]
+    print(f"\n===== PARITY ({len(texts)} distinct normalized comments) =====")
+    for text, ids, fast in mismatches[:10]:
+        print(f"input:    {text!r}\nexpected: {slow.convert_ids_to_tokens(ids)}\nactual:   {slow.convert_ids_to_tokens(fast)}\n")
+    print(f"{len(mismatches)} input ids mismatches")
+
+    # padded model inputs, and ids stored at ingest read back
+    batch_mismatches = sum(
+        sorted(want) != sorted(got) or any(not np.array_equal(want[key], got[key]) for key in want)
+        for want, got in zip(slow_batches(slow, texts), fast_batches(actual))
+    )
+    normalized = normalize_many(raw)
+    stored = tokenization.encode_comments(normalized)
+    roundtrip = sum(not np.array_equal(tokenization.unpack(data), ids)
+                    for data, ids in zip(stored, tokenization.encode(normalized)))
+    print(f"{batch_mismatches} padded batch mismatches, {roundtrip} stored ids mismatches")
+    print(f"stored ids: {sum(map(len, stored)) / len(stored):.0f} bytes per comment on average")
+
+    print(f"\n===== THROUGHPUT ({len(texts)} distinct normalized comments, batches of {BATCH_SIZE}) =====")
+    print("Method\t\t\t\t\tTime (s)\tComments/s")
+    before = measure("BertTokenizer + pad", lambda batch: slow_batches(slow, batch), texts, 1)
+    after = measure("fast tokenizer + pad", lambda batch: fast_batches(tokenization.encode(batch)), texts, 5)
+    ingest = measure("stored ids + pad", lambda batch: fast_batches([tokenization.unpack(d) for d in batch]),
+                     [ids.tobytes() for ids in actual], 5)
+    print(f"\nspeedup {after / before:.1f}x (fast tokenizer), {ingest / before:.1f}x (tokenized at ingest)")
+
+    sys.exit(1 if mismatches or batch_mismatches or roundtrip else 0)
+
+if __name__ == "__main__":
+    main(
+        sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "engine", "data"),
+        sys.argv[2] if len(sys.argv) > 2 else tokenization.MODEL_NAME
+    )
@@ -0,0 +1,134 @@
+# regression check for the query plans of the hot comment/video queries
+# usage: python check_query_plans.py [comments]   (uses POSTGRESQL_URL from .env, creates and removes its own videos)
+# every query is captured while the real crud function runs, then EXPLAINed; exit code 1 when an expected index is not used.
+# tests/test_query_plans.py run the same check under pytest
+import asyncio
+import json
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, delete, insert, text
+
+from src.database.init import engine, init_db, AsyncSessionLocal
+from src.database.models import Video, Comment, VideoStats
+from src.database import crud_content
+from src.utils.preprocessing import content_hash
+
+MODEL_VERSION = "plan-check"
+# both partial indexes only contain published comments of a video, the planner pick the smaller one
+PUBLISHED_INDEXES = ("ix_comments_video_published", "ix_comments_video_model_version")
+VIDEOS = 20 # videos that get the comments
+FILLER_VIDEOS = 5000 # videos of other playlists, so the videos table is not tiny
+
+def plan_indexes(plan: dict) -> set[str]:
+    # every index name used anywhere in the plan tree
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= plan_indexes(child)
+    return names
+
+async def seed(db, prefix: str, playlist_id: str, comments: int):
+    now = datetime.now(timezone.utc)
+    videos = [f"{prefix}-v{i}" for i in range(VIDEOS)]
+    await db.execute(insert(Video), [
+        {"video_id": video_id, "playlist_id": playlist_id if i < 5 else f"{prefix}-other-{i}", "title": "plan check",
+         "published_at": now - timedelta(days=i), "created_at": now, "updated_at": now}
+        for i, video_id in enumerate(videos)
+    ] + [
+        {"video_id": f"{prefix}-f{i}", "playlist_id": f"{prefix}-other-{i % 500}", "title": "plan check",
+         "published_at": now - timedelta(hours=i), "created_at": now, "updated_at": now}
+        for i in range(FILLER_VIDEOS)
+    ])
+    rows = []
+    for i in range(comments):
+        scored = random.random() > 0.01
+        is_judi = random.random() < 0.05 if scored else None
+        rows.append({
+            "comment_id": f"{prefix}-c{i}", "video_id": videos[i % VIDEOS], "author_display_name": "plan",
+            "text": f"comment {i}", "content_hash": content_hash(f"comment {i}"),
+            "published_at": now - timedelta(seconds=i), "updated_at": now,
+            "moderation_status": "rejected" if random.random() < 0.02 else "published",
+            "is_judi": is_judi, "confidence": random.random(), "label": False,
+            "model_version": MODEL_VERSION if scored else None, "created_at": now,
+        })
+    for start in range(0, len(rows), 5000):
+        await db.execute(insert(Comment), rows[start:start + 5000])
+    await db.commit()
+    # vacuum too, like autovacuum would, so index-only scans are costed with a set visibility map
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE comments"))
+        await conn.execute(text("VACUUM ANALYZE videos"))
+    return videos + [f"{prefix}-f{i}" for i in range(FILLER_VIDEOS)]
+
+async def check_plans(comments: int) -> list[tuple[str, bool, set[str]]]:
+    """
+    seed the comments, run every check and return (name, ok, indexes used) of each one
+    """
+    await init_db()
+    prefix = f"plan-{uuid.uuid4().hex[:8]}"
+    playlist_id = f"{prefix}-playlist"
+
+    # capture the sql sent by the crud functions
+    captured: list[tuple[str, tuple]] = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE")):
+            captured.append((statement, parameters))
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+
+    results = []
+    async with AsyncSessionLocal() as db:
+        videos = await seed(db, prefix, playlist_id, comments)
+        video_id = videos[0]
+        try:
+            first_page = await crud_content.get_comments(db, video_id, 1, 11)
+            last = first_page[-1]
+            checks = [
+                # (name, query, indexes the plan may use, any of them is fine)
+                ("get_comments (page 1)", lambda: crud_content.get_comments(db, video_id, 1, 11), ("ix_comments_video_published",)),
+                ("get_comments (cursor)", lambda: crud_content.get_comments(db, video_id, 1, 11, (last.published_at, last.comment_id)), ("ix_comments_video_published",)),
+                ("refresh_video_stats", lambda: crud_content.refresh_video_stats(db, {video_id}), PUBLISHED_INDEXES),
+                # full rows of almost every comment of the video, a bitmap scan of the video_id index is as good
+                ("get_all_comments", lambda: crud_content.get_all_comments(db, video_id), PUBLISHED_INDEXES + ("ix_comments_video_id",)),
+                ("get_unscored_comments", lambda: crud_content.get_unscored_comments(db, video_id, MODEL_VERSION), ("ix_comments_video_model_version", "ix_comments_video_unscored")),
+                ("get_flagged_comments", lambda: crud_content.get_flagged_comments(db, video_id), ("ix_comments_video_flagged",)),
+                ("get_predictions_by_hash", lambda: crud_content.get_predictions_by_hash(db, [content_hash(f"comment {i}") for i in range(0, 2000, 100)], MODEL_VERSION), ("ix_comments_content_hash",)),
+                ("get_comments_to_moderate", lambda: crud_content.get_comments_to_moderate(db, video_id, 0.9), ("ix_comments_video_flagged",)),
+                ("get_videos", lambda: crud_content.get_videos(db, playlist_id, 1, 11), ("ix_videos_playlist_published",)),
+                ("get_videos (cursor)", lambda: crud_content.get_videos(db, playlist_id, 1, 3, (datetime.now(timezone.utc), "")), ("ix_videos_playlist_published",)),
+                ("get_videos (undated cursor)", lambda: crud_content.get_videos(db, playlist_id, 1, 11, (None, "~")), ("ix_videos_playlist_published",)),
+            ]
+
+            print(f"===== QUERY PLANS ({comments} comments, {VIDEOS} videos) =====")
+            for name, run, expected in checks:
+                captured.clear()
+                await run()
+                statement, parameters = captured[-1]
+                conn = await db.connection()
+                explain = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                value = explain.scalar()
+                plan = (json.loads(value) if isinstance(value, str) else value)[0]["Plan"]
+                used = plan_indexes(plan)
+                ok = bool(used & set(expected))
+                results.append((name, ok, used))
+                print(f"{'ok  ' if ok else 'FAIL'}\t{name:<28}\t{', '.join(sorted(used)) or plan['Node Type']}")
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+            # cleanup
+            await db.rollback()
+            await db.execute(delete(VideoStats).where(VideoStats.video_id.in_(videos)))
+            await db.execute(delete(Comment).where(Comment.video_id.in_(videos)))
+            await db.execute(delete(Video).where(Video.video_id.in_(videos)))
+            await db.commit()
+
+    return results
+
+async def main(comments: int):
+    results = await check_plans(comments)
+    await engine.dispose()
+    sys.exit(0 if all(ok for _, ok, _ in results) else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -0,0 +1,77 @@
+"""baseline schema, as created by Base.metadata.create_all before migrations were introduced
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("user_id", sa.String(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("channel_id", sa.String()),
+        sa.Column("channel_name", sa.String()),
+        sa.Column("custom_url", sa.String()),
+        sa.Column("playlist_id", sa.String()),
+    )
+    op.create_index("ix_users_user_id", "users", ["user_id"])
+
+    op.create_table(
+        "refresh_tokens",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("session_id", sa.String(), nullable=False),
+        sa.Column("user_id", sa.String(), sa.ForeignKey("users.user_id"), nullable=False),
+        sa.Column("refresh_token_encrypted", sa.String(), nullable=False),
+        sa.Column("expires_at", sa.DateTime()),
+    )
+
+    op.create_table(
+        "videos",
+        sa.Column("video_id", sa.String(), primary_key=True),
+        sa.Column("channel_id", sa.String(), nullable=True),
+        sa.Column("playlist_id", sa.String(), nullable=False),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=True),
+        sa.Column("published_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_fetch_comment", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_videos_video_id", "videos", ["video_id"], unique=True)
+    op.create_index("ix_videos_channel_id", "videos", ["channel_id"])
+    op.create_index("ix_videos_playlist_id", "videos", ["playlist_id"])
+
+    op.create_table(
+        "comments",
+        sa.Column("comment_id", sa.String(), primary_key=True),
+        sa.Column("video_id", sa.String(), sa.ForeignKey("videos.video_id", ondelete="CASCADE"), nullable=False),
+        sa.Column("author_display_name", sa.String(), nullable=True),
+        sa.Column("text", sa.Text(), nullable=False),
+        sa.Column("published_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("moderation_status", sa.String()),
+        sa.Column("is_judi", sa.Boolean()),
+        sa.Column("label", sa.Boolean()),
+        sa.Column("confidence", sa.Float()),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_comments_comment_id", "comments", ["comment_id"], unique=True)
+    op.create_index("ix_comments_video_id", "comments", ["video_id"])
+
+
+def downgrade():
+    op.drop_table("comments")
+    op.drop_table("videos")
+    op.drop_table("refresh_tokens")
+    op.drop_table("users")
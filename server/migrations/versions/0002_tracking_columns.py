@@ -0,0 +1,32 @@
+"""columns added after the baseline: reply threads, model version of predictions, auto moderation setting
+
+Revision ID: 0002_tracking_columns
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0002_tracking_columns"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # IF NOT EXISTS: databases recreated with create_all after these columns were added already have them
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS parent_id VARCHAR")
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS total_reply_count INTEGER")
+    op.execute("ALTER TABLE comments ADD COLUMN IF NOT EXISTS model_version VARCHAR")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_comments_parent_id ON comments (parent_id)")
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS auto_moderation BOOLEAN NOT NULL DEFAULT false")
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS moderation_threshold DOUBLE PRECISION")
+
+
+def downgrade():
+    op.drop_column("users", "moderation_threshold")
+    op.drop_column("users", "auto_moderation")
+    op.drop_index("ix_comments_parent_id", table_name="comments")
+    op.drop_column("comments", "model_version")
+    op.drop_column("comments", "total_reply_count")
+    op.drop_column("comments", "parent_id")
@@ -0,0 +1,62 @@
+"""composite and partial indexes matching the comment and video queries, drop indexes duplicating primary keys
+
+Revision ID: 0003_query_indexes
+Revises: 0002_tracking_columns
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_query_indexes"
+down_revision = "0002_tracking_columns"
+branch_labels = None
+depends_on = None
+
+PUBLISHED = sa.text("moderation_status = 'published'")
+
+
+def upgrade():
+    # primary keys already have a unique index
+    op.drop_index("ix_users_user_id", table_name="users", if_exists=True)
+    op.drop_index("ix_videos_video_id", table_name="videos", if_exists=True)
+    op.drop_index("ix_comments_comment_id", table_name="comments", if_exists=True)
+
+    # listing, count and get_all_comments of published comments, also serve the keyset cursor
+    op.create_index(
+        "ix_comments_video_published", "comments", ["video_id", "published_at", "comment_id"],
+        postgresql_where=PUBLISHED, if_not_exists=True
+    )
+    # incremental prediction: never scored / changed since scored ...
+    op.create_index(
+        "ix_comments_video_unscored", "comments", ["video_id"],
+        postgresql_where=sa.text("is_judi IS NULL"), if_not_exists=True
+    )
+    # ... or scored by another model version
+    op.create_index(
+        "ix_comments_video_model_version", "comments", ["video_id", "model_version"],
+        postgresql_where=PUBLISHED, if_not_exists=True
+    )
+    # flagged comments and comments above the auto moderation threshold
+    op.create_index(
+        "ix_comments_video_flagged", "comments", ["video_id", "confidence"],
+        postgresql_where=sa.text("is_judi AND moderation_status = 'published'"), if_not_exists=True
+    )
+
+    # video history listing newest first, replace the playlist_id only index
+    op.create_index(
+        "ix_videos_playlist_published", "videos", ["playlist_id", "published_at", "video_id"], if_not_exists=True
+    )
+    op.drop_index("ix_videos_playlist_id", table_name="videos", if_exists=True)
+
+
+def downgrade():
+    op.create_index("ix_videos_playlist_id", "videos", ["playlist_id"])
+    op.drop_index("ix_videos_playlist_published", table_name="videos")
+    op.drop_index("ix_comments_video_flagged", table_name="comments")
+    op.drop_index("ix_comments_video_model_version", table_name="comments")
+    op.drop_index("ix_comments_video_unscored", table_name="comments")
+    op.drop_index("ix_comments_video_published", table_name="comments")
+    op.create_index("ix_comments_comment_id", "comments", ["comment_id"], unique=True)
+    op.create_index("ix_videos_video_id", "videos", ["video_id"], unique=True)
+    op.create_index("ix_users_user_id", "users", ["user_id"])
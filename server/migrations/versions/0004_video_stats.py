@@ -0,0 +1,38 @@
+"""video_stats: published and flagged comment count of every video, maintained by the comment writes
+
+Revision ID: 0004_video_stats
+Revises: 0003_query_indexes
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_video_stats"
+down_revision = "0003_query_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "video_stats",
+        sa.Column("video_id", sa.String(), sa.ForeignKey("videos.video_id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("comment_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("flagged_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_scored_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    # backfill from the stored comments, the time of past predictions is unknown
+    op.execute("""
+        INSERT INTO video_stats (video_id, comment_count, flagged_count)
+        SELECT video_id,
+               count(*) FILTER (WHERE moderation_status = 'published'),
+               count(*) FILTER (WHERE is_judi AND moderation_status = 'published')
+        FROM comments
+        GROUP BY video_id
+    """)
+
+
+def downgrade():
+    op.drop_table("video_stats")
@@ -0,0 +1,25 @@
+"""comments.token_ids: token ids of the normalized text stored at ingest, so prediction skip tokenization
+
+Revision ID: 0005_comment_token_ids
+Revises: 0004_video_stats
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_comment_token_ids"
+down_revision = "0004_video_stats"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # nullable without default, adding them doesn't rewrite the table. existing comments are tokenized by the worker
+    op.add_column("comments", sa.Column("token_ids", sa.LargeBinary(), nullable=True))
+    op.add_column("comments", sa.Column("tokenizer_version", sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("comments", "tokenizer_version")
+    op.drop_column("comments", "token_ids")
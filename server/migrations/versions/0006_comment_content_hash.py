@@ -0,0 +1,29 @@
+"""comments.normalized_text and content_hash computed at ingest, hash index for duplicate text lookups
+
+Revision ID: 0006_comment_content_hash
+Revises: 0005_comment_token_ids
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006_comment_content_hash"
+down_revision = "0005_comment_token_ids"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # normalization runs in python, existing comments are filled by their next sync
+    op.add_column("comments", sa.Column("normalized_text", sa.Text(), nullable=True))
+    op.add_column("comments", sa.Column("content_hash", sa.String(32), nullable=True))
+    op.add_column("comments", sa.Column("preprocessing_version", sa.String(), nullable=True))
+    op.create_index("ix_comments_content_hash", "comments", ["content_hash"], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index("ix_comments_content_hash", table_name="comments")
+    op.drop_column("comments", "preprocessing_version")
+    op.drop_column("comments", "content_hash")
+    op.drop_column("comments", "normalized_text")
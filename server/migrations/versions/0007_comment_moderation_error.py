@@ -0,0 +1,22 @@
+"""comments.moderation_error: reason of a permanent setModerationStatus failure, skipped by auto moderation
+
+Revision ID: 0007_comment_moderation_error
+Revises: 0006_comment_content_hash
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_comment_moderation_error"
+down_revision = "0006_comment_content_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("comments", sa.Column("moderation_error", sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("comments", "moderation_error")
@@ -0,0 +1,22 @@
+"""comments.replies_synced_count: total_reply_count of a thread when its replies were last paged
+
+Revision ID: 0008_comment_replies_synced
+Revises: 0007_comment_moderation_error
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008_comment_replies_synced"
+down_revision = "0007_comment_moderation_error"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("comments", sa.Column("replies_synced_count", sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("comments", "replies_synced_count")
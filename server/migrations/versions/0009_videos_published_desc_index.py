@@ -0,0 +1,27 @@
+"""ix_videos_playlist_published in the order of the video listing (published_at DESC NULLS LAST, video_id DESC)
+
+Revision ID: 0009_videos_published_desc_index
+Revises: 0008_comment_replies_synced
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_videos_published_desc_index"
+down_revision = "0008_comment_replies_synced"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("ix_videos_playlist_published", table_name="videos", if_exists=True)
+    op.create_index(
+        "ix_videos_playlist_published", "videos",
+        ["playlist_id", sa.text("published_at DESC NULLS LAST"), sa.text("video_id DESC")]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_videos_playlist_published", table_name="videos")
+    op.create_index("ix_videos_playlist_published", "videos", ["playlist_id", "published_at", "video_id"])
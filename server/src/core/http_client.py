@@ -0,0 +1,37 @@
+# src/core/http_client.py
+import httpx
+import os
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100")) # max open connections to google
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")) # idle connections kept for reuse
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")) # seconds an idle connection is kept
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15")) # seconds for read/write/pool
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")) # seconds to open a connection
+
+# one application-scoped client, so every youtube/oauth call reuse pooled keep-alive connections
+http_client: httpx.AsyncClient | None = None
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    # get shared client, created on first use if lifespan hasn't created it (e.g. in scripts)
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = create_http_client()
+    return http_client
+
+async def close_http_client():
+    # close pooled connections on shutdown
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
@@ -0,0 +1,99 @@
+# src/core/prediction_cache.py
+from collections import OrderedDict
+import hashlib
+import logging
+import json
+
+from src.core.session import redis_client
+
+logger = logging.getLogger(__name__)
+
+class PredictionCache:
+    """
+    content-addressed cache of model predictions, key is the hash of normalized text + model version.
+    in-process LRU, optionally backed by redis so it's shared between workers and survive restart
+    """
+    def __init__(self, model_version: str, max_size: int = 100_000, use_redis: bool = False, redis_ttl: int = 3600 * 24 * 7):
+        self.model_version = model_version
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self.redis_ttl = redis_ttl
+        self._entries: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+
+    def key(self, normalized_text: str) -> str:
+        # hash of model version + normalized text, so new model never reuse old predictions
+        payload = f"{self.model_version}\0{normalized_text}".encode()
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def _remember(self, key: str, value: tuple[bool, float]):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        # evict least recently used entries
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_many(self, keys: list[str]) -> dict[str, tuple[bool, float]]:
+        """
+        get cached predictions for the keys, missing keys are not in the result
+        """
+        found: dict[str, tuple[bool, float]] = {}
+        missing: list[str] = []
+        for key in keys:
+            value = self._entries.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                self._entries.move_to_end(key)
+                found[key] = value
+
+        if missing and self.use_redis:
+            try:
+                values = await redis_client.mget([f"pred:{key}" for key in missing])
+                for key, data in zip(missing, values):
+                    if data:
+                        is_judi, confidence = json.loads(data)
+                        found[key] = (is_judi, confidence)
+                        self._remember(key, found[key])
+                        self.redis_hits += 1
+            except Exception as e:
+                # redis is optional, fall back to the model
+                logger.warning(f"Prediction cache redis lookup failed: {e}")
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set_many(self, predictions: dict[str, tuple[bool, float]]):
+        """
+        store new predictions in memory (and redis if enabled)
+        """
+        for key, value in predictions.items():
+            self._remember(key, value)
+
+        if predictions and self.use_redis:
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for key, value in predictions.items():
+                        pipe.setex(f"pred:{key}", self.redis_ttl, json.dumps(value))
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Prediction cache redis write failed: {e}")
+
+    def stats(self) -> dict:
+        """
+        counters to see how much forward-pass work the cache saves
+        """
+        lookups = self.hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "redis": self.use_redis,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
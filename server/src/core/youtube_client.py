@@ -0,0 +1,246 @@
+# src/core/youtube_client.py
+"""
+every youtube data api call go through this client:
+- quota units are counted per project and per user in redis, so every api process share the same daily budget
+- a token bucket limit the request rate of this process
+- 429/5xx and rate limit 403 are retried with jittered exponential backoff, quotaExceeded 403 is not
+- units and requests are counted per endpoint, and per scope (e.g. the moderation scheduler) with its own daily budget
+"""
+from contextvars import ContextVar
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import asyncio
+import logging
+import random
+import time
+import os
+
+import httpx
+
+from src.core.http_client import get_http_client
+from src.core.session import redis_client
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+API_KEY = os.getenv("GOOGLE_API_KEY")
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000")) # quota units of the google cloud project per day
+YOUTUBE_USER_DAILY_QUOTA = int(os.getenv("YOUTUBE_USER_DAILY_QUOTA", "0")) # max units one user can spend per day, 0 = no limit
+YOUTUBE_RATE_LIMIT = float(os.getenv("YOUTUBE_RATE_LIMIT", "20")) # requests per second of this process
+YOUTUBE_BURST = int(os.getenv("YOUTUBE_BURST", "40")) # requests that can be sent at once after being idle
+YOUTUBE_MAX_RETRIES = int(os.getenv("YOUTUBE_MAX_RETRIES", "4")) # retries of 429/5xx/rate limited request
+YOUTUBE_BACKOFF_BASE = float(os.getenv("YOUTUBE_BACKOFF_BASE", "0.5")) # seconds, doubled on every retry
+YOUTUBE_BACKOFF_MAX = float(os.getenv("YOUTUBE_BACKOFF_MAX", "20")) # max seconds between retries
+
+BASE_URL = "https://www.googleapis.com/youtube/v3"
+# endpoint name -> (http method, path, quota cost)
+ENDPOINTS = {
+    "channels.list": ("GET", "/channels", 1),
+    "playlistItems.list": ("GET", "/playlistItems", 1),
+    "commentThreads.list": ("GET", "/commentThreads", 1),
+    "comments.list": ("GET", "/comments", 1),
+    "comments.setModerationStatus": ("POST", "/comments/setModerationStatus", 50),
+}
+QUOTA_REASONS = ("quotaExceeded", "dailyLimitExceeded")
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# the daily quota reset at midnight pacific time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+# user whose quota is used by calls in the current request/job, set by the login middleware and background jobs
+quota_user: ContextVar[str | None] = ContextVar("quota_user", default=None)
+# (scope name, daily units of the scope) of calls in the current job, e.g. ("moderation", 5000), 0 units = no limit
+quota_scope: ContextVar[tuple[str, int] | None] = ContextVar("quota_scope", default=None)
+
+def error_reason(res: httpx.Response) -> str | None:
+    """
+    get error reason of google api response, e.g. quotaExceeded, commentsDisabled, forbidden
+    """
+    try:
+        errors = res.json().get("error", {}).get("errors", [])
+    except ValueError:
+        return None
+    return errors[0].get("reason") if errors else None
+
+class TokenBucket:
+    """
+    refill `rate` tokens per second up to `capacity`, acquire wait until a token is available
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class YouTubeClient:
+    def __init__(
+            self,
+            daily_quota: int = YOUTUBE_DAILY_QUOTA,
+            user_daily_quota: int = YOUTUBE_USER_DAILY_QUOTA,
+            rate_limit: float = YOUTUBE_RATE_LIMIT,
+            burst: int = YOUTUBE_BURST,
+            max_retries: int = YOUTUBE_MAX_RETRIES
+            ):
+        self.daily_quota = daily_quota
+        self.user_daily_quota = user_daily_quota
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate_limit, burst)
+        # per endpoint counters of this process
+        self._metrics = {
+            name: {"requests": 0, "units": 0, "retries": 0, "errors": 0} for name in ENDPOINTS
+        }
+
+    def _quota_key(self) -> str:
+        return f"youtube:quota:{datetime.now(QUOTA_TIMEZONE).strftime('%Y-%m-%d')}"
+
+    async def _reserve(self, endpoint: str, cost: int, user_id: str | None, scope: tuple[str, int] | None):
+        """
+        count the units before the request is sent, raise 429 when the project, user or scope budget is spent
+        """
+        key = self._quota_key()
+        user_key = f"{key}:user:{user_id}" if user_id else None
+        scope_name, scope_quota = scope or (None, 0)
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.hincrby(key, "project", cost)
+                pipe.hincrby(key, f"endpoint:{endpoint}", cost)
+                pipe.expire(key, 3600 * 48)
+                if user_key:
+                    pipe.incrby(user_key, cost)
+                    pipe.expire(user_key, 3600 * 48)
+                if scope_name:
+                    pipe.hincrby(key, f"scope:{scope_name}", cost)
+                results = await pipe.execute()
+        except Exception as e:
+            # redis is down, don't block youtube calls because of accounting
+            logger.warning(f"YouTube quota accounting failed: {e}")
+            return
+
+        project_used = results[0]
+        user_used = results[3] if user_key else 0
+        scope_used = results[-1] if scope_name else 0
+        over_project = project_used > self.daily_quota
+        over_user = bool(user_key) and self.user_daily_quota > 0 and user_used > self.user_daily_quota
+        over_scope = bool(scope_name) and scope_quota > 0 and scope_used > scope_quota
+        if over_project or over_user or over_scope:
+            # give the units back, the request is not sent
+            try:
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.hincrby(key, "project", -cost)
+                    pipe.hincrby(key, f"endpoint:{endpoint}", -cost)
+                    if scope_name:
+                        pipe.hincrby(key, f"scope:{scope_name}", -cost)
+                    if user_key:
+                        pipe.incrby(user_key, -cost)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"YouTube quota accounting failed: {e}")
+            budget = "" if over_project else " for this user" if over_user else f" for {scope_name}"
+            raise HTTPException(429, "YouTube quota budget exhausted" + budget)
+
+    async def used_today(self, field: str = "project") -> int:
+        """
+        quota units counted today (shared by every api process): project, endpoint:<name> or scope:<name>
+        """
+        return int(await redis_client.hget(self._quota_key(), field) or 0)
+
+    async def request(
+            self,
+            endpoint: str,
+            access_token: str | None = None,
+            params: dict | None = None,
+            user_id: str | None = None
+            ) -> httpx.Response:
+        """
+        send one youtube data api request with quota accounting, rate limit and retries.
+        raise 429 when the quota is spent, other error responses are returned for the caller to handle
+        """
+        method, path, cost = ENDPOINTS[endpoint]
+        params = {**(params or {}), **({"key": API_KEY} if API_KEY else {})}
+        headers = {"Authorization": f"Bearer {access_token}"} if access_token else None
+        user_id = user_id or quota_user.get()
+        scope = quota_scope.get()
+        metrics = self._metrics[endpoint]
+
+        for attempt in range(self.max_retries + 1):
+            # every attempt cost quota, even when google answer with an error
+            await self._reserve(endpoint, cost, user_id, scope)
+            await self._bucket.acquire()
+            metrics["requests"] += 1
+            metrics["units"] += cost
+
+            retry_after = None
+            try:
+                res = await get_http_client().request(method, BASE_URL + path, params=params, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    metrics["errors"] += 1
+                    raise HTTPException(502, f"YouTube request failed: {type(e).__name__}")
+                logger.warning(f"{endpoint} transport error, retrying: {e}")
+            else:
+                reason = error_reason(res) if res.status_code in (403, 429) else None
+                if res.status_code == 403 and reason in QUOTA_REASONS:
+                    # the project quota is really spent, retrying only waste more requests
+                    metrics["errors"] += 1
+                    raise HTTPException(429, "YouTube quota exceeded")
+
+                transient = res.status_code == 429 or res.status_code >= 500 or reason in RATE_LIMIT_REASONS
+                if not transient or attempt == self.max_retries:
+                    if res.status_code >= 400:
+                        metrics["errors"] += 1
+                    return res
+                retry_after = res.headers.get("Retry-After")
+                logger.warning(f"{endpoint} returned {res.status_code} {reason or res.reason_phrase}, retrying")
+
+            # full jitter exponential backoff, google Retry-After win when it's given
+            metrics["retries"] += 1
+            delay = random.uniform(0, min(YOUTUBE_BACKOFF_MAX, YOUTUBE_BACKOFF_BASE * 2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay)
+
+    async def stats(self) -> dict:
+        """
+        quota units used today (shared) and request metrics of this process
+        """
+        key = self._quota_key()
+        try:
+            used = await redis_client.hgetall(key)
+        except Exception as e:
+            logger.warning(f"YouTube quota accounting failed: {e}")
+            used = {}
+
+        user_id = quota_user.get()
+        user_used = None
+        if user_id:
+            try:
+                user_used = int(await redis_client.get(f"{key}:user:{user_id}") or 0)
+            except Exception:
+                pass
+
+        return {
+            "daily_quota": self.daily_quota,
+            "used": int(used.get("project", 0)),
+            "remaining": self.daily_quota - int(used.get("project", 0)),
+            "used_by_endpoint": {name: int(used.get(f"endpoint:{name}", 0)) for name in ENDPOINTS},
+            "used_by_scope": {field[len("scope:"):]: int(units) for field, units in used.items() if field.startswith("scope:")},
+            "user_daily_quota": self.user_daily_quota or None,
+            "used_by_user": user_used,
+            "process": self._metrics,
+        }
+
+# one client shared by the whole app
+youtube_client = YouTubeClient()
@@ -75,4 +75,40 @@ async def delete_refresh_token_by_session(db: AsyncSession, session_id: str):
     ref_token = result.scalar_one_or_none()
     if ref_token:
         await db.delete(ref_token)
-        await db.commit()
\ No newline at end of file
+        await db.commit()
+
+async def get_latest_refresh_token(db: AsyncSession, user_id: str):
+    """
+    get the newest refresh token data of user, used by background jobs that don't have a session
+    """
+    stmt = (
+        select(RefreshToken)
+        .filter_by(user_id=user_id)
+        .order_by(RefreshToken.expires_at.desc().nulls_last())
+        .limit(1)
+    )
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+async def get_auto_moderation_users(db: AsyncSession):
+    """
+    get every user that enable auto moderation and have an uploads playlist
+    """
+    stmt = select(User).where(User.auto_moderation.is_(True), User.playlist_id.is_not(None))
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def update_auto_moderation(db: AsyncSession, user_id: str, enabled: bool, threshold: float | None):
+    """
+    update auto moderation setting of user
+    """
+    stmt = select(User).filter_by(user_id=user_id)
+    result = await db.execute(stmt)
+    user = result.scalar_one_or_none()
+    if not user:
+        return None
+
+    user.auto_moderation = enabled
+    user.moderation_threshold = threshold
+    await db.commit()
+    return user
@@ -1,13 +1,20 @@
 # src/database/crud_content.py
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.postgresql import insert, ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, case, func, update
+from sqlalchemy.orm import aliased, undefer
+from sqlalchemy import select, case, func, update, literal, literal_column, tuple_, any_, String, Boolean, Float, Integer
 from datetime import datetime, timezone
 from typing import List, Dict, Any
+import asyncio
+import logging
 
-from src.database.models import User, Video, Comment
+from src.database.models import User, Video, Comment, VideoStats
 from src.schemas.comment import CommentCreate
 from src.schemas.video import VideoCreate
+from src.utils import tokenization
+from src.utils.preprocessing import normalize_many, content_hash, PREPROCESSING_VERSION
+
+logger = logging.getLogger(__name__)
 
 async def get_user_by_id(db: AsyncSession, user_id: str):
     """
@@ -42,19 +49,41 @@ async def get_video_by_id(db: AsyncSession, video_id: str):
     result = await db.execute(query)
     return result.scalar_one_or_none()
 
-async def get_videos(db: AsyncSession, playlist_id: str, page: int = 1, limit: int = 10):
+async def get_videos(
+    db: AsyncSession,
+    playlist_id: str,
+    page: int = 1,
+    limit: int = 10,
+    cursor: tuple[datetime | None, str] | None = None
+):
     """
-    get all video from users (show videos) with pagination
+    get all video from users (show videos) newest first, with offset pagination
+    or keyset pagination after cursor (published_at, video_id) of the last video of previous page
     """
-    offset = (page - 1) * limit
     query = (
         select(Video)
         .filter_by(playlist_id=playlist_id)
-        .offset(offset)
+        .order_by(Video.published_at.desc().nulls_last(), Video.video_id.desc())
         .limit(limit)
     )
-    result = await db.execute(query)
-    return result.scalars().all()
+    if not cursor:
+        result = await db.execute(query.offset((page - 1) * limit))
+        return result.scalars().all()
+
+    # videos without published_at come last, each bucket is its own range of ix_videos_playlist_published
+    published_at, video_id = cursor
+    null_bucket = query.where(Video.published_at.is_(None))
+    if published_at is None:
+        result = await db.execute(null_bucket.where(Video.video_id < video_id))
+        return result.scalars().all()
+
+    result = await db.execute(query.where(tuple_(Video.published_at, Video.video_id) < (published_at, video_id)))
+    videos = result.scalars().all()
+    if len(videos) < limit:
+        # dated videos are done, continue with the first undated ones
+        result = await db.execute(null_bucket.limit(limit - len(videos)))
+        videos += result.scalars().all()
+    return videos
 
 async def get_count_videos(db: AsyncSession, playlist_id: str):
     """
@@ -77,17 +106,28 @@ async def update_last_fetch_comment(db: AsyncSession, video_id: str):
         await db.commit()
         await db.refresh(video_data)
 
-async def get_comments(db: AsyncSession, video_id: str, page: int = 1, limit: int = 10):
+async def get_comments(
+    db: AsyncSession,
+    video_id: str,
+    page: int = 1,
+    limit: int = 10,
+    cursor: tuple[datetime, str] | None = None
+):
     """
-    get all comment from video (show comments) with pagination
+    get all comment from video (show comments) newest first, with offset pagination
+    or keyset pagination after cursor (published_at, comment_id) of the last comment of previous page
     """
-    offset = (page - 1) * limit
     query = (
         select(Comment)
         .filter_by(video_id=video_id, moderation_status="published")
-        .offset(offset)
+        .order_by(Comment.published_at.desc(), Comment.comment_id.desc())
         .limit(limit)
     )
+    if cursor:
+        # row comparison, so the index on (video_id, published_at) seek straight to the cursor
+        query = query.where(tuple_(Comment.published_at, Comment.comment_id) < tuple_(*cursor))
+    else:
+        query = query.offset((page - 1) * limit)
     result = await db.execute(query)
     return result.scalars().all()
 
@@ -98,51 +138,246 @@ async def get_all_comments(db: AsyncSession, video_id: str):
     query = (
         select(Comment)
         .filter_by(video_id=video_id, moderation_status="published")
+        .options(undefer(Comment.token_ids))
     )
     result = await db.execute(query)
     return result.scalars().all()
 
-async def get_count_comments(db: AsyncSession, video_id: str):
+async def get_unscored_comments(db: AsyncSession, video_id: str, model_version: str):
     """
-    get count comment from video for all comment with moderation_status is published
+    get comment that have never been scored, changed since the last score, or scored by an older model
     """
-    count_query = select(func.count()).select_from(Comment).filter_by(video_id=video_id, moderation_status="published")
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-    return total
+    query = (
+        select(Comment)
+        .filter_by(video_id=video_id, moderation_status="published")
+        .where(
+            Comment.is_judi.is_(None) |
+            Comment.model_version.is_(None) |
+            # < and > instead of !=, so both are range scans on ix_comments_video_model_version
+            (Comment.model_version < model_version) |
+            (Comment.model_version > model_version)
+        )
+        .options(undefer(Comment.token_ids))
+    )
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def get_predictions_by_hash(db: AsyncSession, content_hashes: List[str], model_version: str) -> Dict[str, tuple[bool, float]]:
+    """
+    prediction of comments with the same normalized text (any video) already scored by model_version,
+    {content_hash: (is_judi, confidence)}. one array parameter, an index scan of ix_comments_content_hash
+    """
+    if not content_hashes:
+        return {}
+
+    query = (
+        select(Comment.content_hash, Comment.is_judi, Comment.confidence)
+        .where(Comment.content_hash == any_(literal(list(set(content_hashes)), ARRAY(String))))
+        .where(Comment.model_version == model_version, Comment.is_judi.is_not(None))
+        .distinct(Comment.content_hash)
+    )
+    result = await db.execute(query)
+    return {row.content_hash: (row.is_judi, row.confidence) for row in result}
+
+async def get_flagged_comments(db: AsyncSession, video_id: str):
+    """
+    get published comment that classified as online gambling promotion
+    """
+    query = (
+        select(Comment.comment_id, Comment.is_judi, Comment.confidence)
+        .filter_by(video_id=video_id, moderation_status="published", is_judi=True)
+    )
+    result = await db.execute(query)
+    return result.mappings().all()
 
-async def insert_comments(db: AsyncSession, comments: List[CommentCreate]):
+async def get_comments_to_moderate(db: AsyncSession, video_id: str, threshold: float):
+    """
+    get comment id predicted as judi with confidence above threshold that is still published,
+    except comments youtube already refused to moderate
+    """
+    query = (
+        select(Comment.comment_id)
+        .filter_by(video_id=video_id, is_judi=True, moderation_status="published")
+        .where(Comment.confidence >= threshold, Comment.moderation_error.is_(None))
+    )
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def insert_comments(db: AsyncSession, comments: List[CommentCreate], chunk_size: int = 1000):
     """
     insert bulk comments and replace existing one of either text/author_display_name changing 
-    because these two data that probably contain gambling promotion related
+    because these two data that probably contain gambling promotion related.
+    the normalized text and its hash are computed once here, so a text change is detected by comparing hashes
+    and prediction skip preprocessing. with TOKENIZE_AT_INGEST the token ids of the normalized text are stored too.
+    comments are written in chunks so one statement never exceed postgresql bind-parameter limit
     """
     if not comments:
         return
 
-    values = [comment.model_dump() for comment in comments]
+    values = await asyncio.to_thread(_comment_values, comments)
+    changes = StatsChanges()
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size]
+        before = await _lock_stats_state(db, [value["comment_id"] for value in chunk])
+        changes.add(before, await _upsert_comments(db, chunk))
+    await apply_stats_changes(db, changes)
+    await db.commit()
+
+def _comment_values(comments: List[CommentCreate]) -> List[Dict[str, Any]]:
+    # cpu work of the ingest, runs in a thread
+    normalized = normalize_many([comment.text for comment in comments])
+    token_ids, tokenizer_version = [None] * len(comments), None
+    if tokenization.TOKENIZE_AT_INGEST:
+        try:
+            token_ids, tokenizer_version = tokenization.encode_comments(normalized), tokenization.tokenizer_version
+        except Exception as e:
+            # ingest never fail because of it, the inference worker tokenize these comments instead
+            logger.warning(f"Tokenization at ingest failed: {e}")
+
+    return [
+        {
+            **comment.model_dump(),
+            "normalized_text": text,
+            "content_hash": content_hash(text),
+            "preprocessing_version": PREPROCESSING_VERSION,
+            "token_ids": ids,
+            "tokenizer_version": tokenizer_version if ids else None,
+        }
+        for comment, text, ids in zip(comments, normalized, token_ids)
+    ]
+
+async def _upsert_comments(db: AsyncSession, values: List[Dict[str, Any]]) -> List[tuple]:
     stmt = insert(Comment).values(values)
+    # same hash = same model input. comments stored before the hash existed compare the text,
+    # and are always updated so their hash is filled
+    text_changed = (
+        (Comment.content_hash != stmt.excluded.content_hash) |
+        (Comment.content_hash.is_(None) & (Comment.text != stmt.excluded.text))
+    )
     stmt = stmt.on_conflict_do_update(
         index_elements=["comment_id"],
         set_={
             "text": stmt.excluded.text,
+            "normalized_text": stmt.excluded.normalized_text,
+            "content_hash": stmt.excluded.content_hash,
+            "preprocessing_version": stmt.excluded.preprocessing_version,
             "updated_at": stmt.excluded.updated_at,
             "author_display_name": stmt.excluded.author_display_name,
+            "total_reply_count": func.coalesce(stmt.excluded.total_reply_count, Comment.total_reply_count),
             "is_judi": case(
                 (
-                    (Comment.text != stmt.excluded.text) |
+                    text_changed |
                     (Comment.author_display_name != stmt.excluded.author_display_name),
                     None
                 ),
                 else_=Comment.is_judi
-            )
+            ),
+            # changed comment have to be scored again
+            "model_version": case(
+                (
+                    text_changed |
+                    (Comment.author_display_name != stmt.excluded.author_display_name),
+                    None
+                ),
+                else_=Comment.model_version
+            ),
+            # ids of a changed text are replaced, or dropped when they were not computed this time
+            "token_ids": case(
+                (text_changed, stmt.excluded.token_ids),
+                else_=func.coalesce(stmt.excluded.token_ids, Comment.token_ids)
+            ),
+            "tokenizer_version": case(
+                (text_changed, stmt.excluded.tokenizer_version),
+                else_=func.coalesce(stmt.excluded.tokenizer_version, Comment.tokenizer_version)
+            ),
+            # a changed comment can be moderated again
+            "moderation_error": case((text_changed, None), else_=Comment.moderation_error)
         },
         where=(
-            (Comment.text != stmt.excluded.text) |
+            text_changed |
+            Comment.content_hash.is_(None) |
             (Comment.updated_at != stmt.excluded.updated_at) |
-            (Comment.author_display_name != stmt.excluded.author_display_name)
+            (Comment.author_display_name != stmt.excluded.author_display_name) |
+            (Comment.total_reply_count.is_distinct_from(stmt.excluded.total_reply_count))
+        )
+    )
+    # xmax is 0 for a row inserted by this statement
+    stmt = stmt.returning(*_STATS_COLUMNS, literal_column("xmax = 0").label("inserted"))
+
+    result = await db.execute(stmt)
+    return result.all()
+
+async def update_thread_reply_counts(db: AsyncSession, reply_counts: Dict[str, int]):
+    """
+    update total_reply_count of stored top-level comments, reply_counts: {comment_id: total_reply_count}
+    """
+    if not reply_counts:
+        return
+
+    values = func.unnest(
+        literal(list(reply_counts.keys()), ARRAY(String)),
+        literal(list(reply_counts.values()), ARRAY(Integer))
+    ).table_valued("comment_id", "total_reply_count").render_derived(name="v")
+
+    stmt = (
+        update(Comment)
+        .where(Comment.comment_id == values.c.comment_id)
+        .where(Comment.total_reply_count.is_distinct_from(values.c.total_reply_count))
+        .values(total_reply_count=values.c.total_reply_count)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+async def get_thread_reply_counts(db: AsyncSession, thread_ids: List[str]) -> Dict[str, int]:
+    """
+    get stored total_reply_count of top-level comments, {comment_id: total_reply_count}
+    """
+    if not thread_ids:
+        return {}
+    query = (
+        select(Comment.comment_id, Comment.total_reply_count)
+        .where(Comment.comment_id == any_(literal(thread_ids, ARRAY(String))))
+    )
+    result = await db.execute(query)
+    return {comment_id: count for comment_id, count in result.all()}
+
+async def get_threads_with_hidden_replies(db: AsyncSession, video_id: str) -> List[str]:
+    """
+    get top-level comment id whose total_reply_count is bigger than the replies stored for it
+    """
+    reply = aliased(Comment)
+    stored_replies = (
+        select(func.count())
+        .select_from(reply)
+        .where(reply.parent_id == Comment.comment_id)
+        .scalar_subquery()
+    )
+    query = (
+        select(Comment.comment_id)
+        .filter_by(video_id=video_id)
+        .where(
+            Comment.parent_id.is_(None),
+            Comment.total_reply_count > stored_replies,
+            # replies youtube never return (deleted, held for review) would page the thread on every sync
+            Comment.replies_synced_count.is_distinct_from(Comment.total_reply_count)
         )
     )
+    result = await db.execute(query)
+    return result.scalars().all()
 
+async def mark_replies_synced(db: AsyncSession, thread_ids: List[str]):
+    """
+    remember the total_reply_count of top-level comments whose replies were just paged
+    """
+    if not thread_ids:
+        return
+    stmt = (
+        update(Comment)
+        .where(Comment.comment_id == any_(literal(thread_ids, ARRAY(String))))
+        .values(replies_synced_count=Comment.total_reply_count)
+        .execution_options(synchronize_session=False)
+    )
     await db.execute(stmt)
     await db.commit()
 
@@ -160,32 +395,193 @@ async def update_moderation_status_comment(
     stmt = (
         update(Comment)
         .where(Comment.comment_id.in_(list_comment_id))
-        .values(moderation_status=status)
+        .values(moderation_status=status, moderation_error=None)
+        .returning(*_STATS_COLUMNS, literal(False).label("inserted"))
     )
+    before = await _lock_stats_state(db, list_comment_id)
     result = await db.execute(stmt)
+    changes = StatsChanges()
+    changes.add(before, result.all())
+    await apply_stats_changes(db, changes)
     await db.commit()
 
-    return result.rowcount
+    return changes.rows
+
+async def update_moderation_errors(db: AsyncSession, errors: Dict[str, str]):
+    """
+    store the reason of comments youtube refused to moderate, {comment_id: reason}
+    """
+    if not errors:
+        return
+
+    values = func.unnest(
+        literal(list(errors.keys()), ARRAY(String)),
+        literal(list(errors.values()), ARRAY(String))
+    ).table_valued("comment_id", "reason").render_derived(name="v")
+
+    stmt = (
+        update(Comment)
+        .where(Comment.comment_id == values.c.comment_id)
+        .values(moderation_error=values.c.reason)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(stmt)
+    await db.commit()
 
 async def update_comments_prediction_batch(
     db: AsyncSession,
-    predictions = List[Dict[str, Any]]
+    predictions: List[Dict[str, Any]],
+    model_version: str | None = None,
+    chunk_size: int = 10000
 ):
     """
-    update data after model prediction, predictions: list of {comment_id, is_judi, confidence}
+    update data after model prediction, predictions: list of {comment_id, is_judi, confidence}.
+    every chunk is applied with one UPDATE ... FROM unnest(arrays) statement instead of one UPDATE per comment
     """
     if not predictions:
         return
 
-    for pred in predictions:
+    changes = StatsChanges()
+    for start in range(0, len(predictions), chunk_size):
+        chunk = predictions[start:start + chunk_size]
+
+        # 3 array parameters no matter how many rows, so the bind-parameter limit is never reached
+        values = func.unnest(
+            literal([pred["comment_id"] for pred in chunk], ARRAY(String)),
+            literal([pred["is_judi"] for pred in chunk], ARRAY(Boolean)),
+            literal([pred["confidence"] for pred in chunk], ARRAY(Float))
+        ).table_valued("comment_id", "is_judi", "confidence").render_derived(name="v")
+
         stmt = (
             update(Comment)
-            .where(Comment.comment_id == pred["comment_id"])
+            .where(Comment.comment_id == values.c.comment_id)
             .values(
-                is_judi=pred["is_judi"],
-                confidence=pred["confidence"]
+                is_judi=values.c.is_judi,
+                confidence=values.c.confidence,
+                model_version=model_version
             )
+            .returning(*_STATS_COLUMNS, literal(False).label("inserted"))
+            .execution_options(synchronize_session=False)
         )
-        await db.execute(stmt)
+        before = await _lock_stats_state(db, [pred["comment_id"] for pred in chunk])
+        result = await db.execute(stmt)
+        changes.add(before, result.all())
+
+    await apply_stats_changes(db, changes, scored=True)
+    await db.commit()
+
+# comment columns that decide the video_stats counts, returned by every comment write
+_STATS_COLUMNS = (Comment.comment_id, Comment.video_id, Comment.moderation_status, Comment.is_judi)
+
+def _counts(moderation_status: str | None, is_judi: bool | None) -> tuple[int, int]:
+    # (comment_count, flagged_count) contribution of one comment
+    published = moderation_status == "published"
+    return int(published), int(published and is_judi is True)
+
+class StatsChanges:
+    """
+    change of video_stats counts made by comment writes: state of the rows before (locked) and after each write
+    """
+    def __init__(self):
+        self.deltas: Dict[str, list[int]] = {}
+        self.recount: set[str] = set()
+        self.rows = 0
 
-    await db.commit()
\ No newline at end of file
+    def add(self, before: Dict[str, tuple[str, bool | None]], written: List[tuple]):
+        for comment_id, video_id, moderation_status, is_judi, inserted in written:
+            delta = self.deltas.setdefault(video_id, [0, 0])
+            new_count, new_flagged = _counts(moderation_status, is_judi)
+            if comment_id in before:
+                old_count, old_flagged = _counts(*before[comment_id])
+            elif inserted:
+                old_count, old_flagged = 0, 0
+            else:
+                # inserted by a concurrent transaction after the lock, its previous state is unknown
+                self.recount.add(video_id)
+                old_count, old_flagged = 0, 0
+            delta[0] += new_count - old_count
+            delta[1] += new_flagged - old_flagged
+            self.rows += 1
+
+async def _lock_stats_state(db: AsyncSession, comment_ids: List[str]) -> Dict[str, tuple[str, bool | None]]:
+    """
+    lock the stored comments about to be written until the caller commit, and return what their counts depend on.
+    locked in id order so two writers of the same comments never deadlock
+    """
+    query = (
+        select(Comment.comment_id, Comment.moderation_status, Comment.is_judi)
+        .where(Comment.comment_id == any_(literal(list(comment_ids), ARRAY(String))))
+        .order_by(Comment.comment_id)
+        .with_for_update()
+    )
+    result = await db.execute(query)
+    return {comment_id: (moderation_status, is_judi) for comment_id, moderation_status, is_judi in result.all()}
+
+async def apply_stats_changes(db: AsyncSession, changes: StatsChanges, scored: bool = False):
+    """
+    add the count changes of the written comments to video_stats (created when missing), in the caller transaction.
+    the cost follow the number of written comments, not the size of the video.
+    scored: the write was a prediction, last_scored_at is set
+    """
+    if not changes.deltas:
+        return
+
+    stmt = insert(VideoStats).values([
+        {"video_id": video_id, "comment_count": comment_count, "flagged_count": flagged_count,
+         **({"last_scored_at": func.now()} if scored else {})}
+        for video_id, (comment_count, flagged_count) in sorted(changes.deltas.items())
+    ])
+    set_ = {
+        "comment_count": VideoStats.comment_count + stmt.excluded.comment_count,
+        "flagged_count": VideoStats.flagged_count + stmt.excluded.flagged_count,
+        "updated_at": func.now(),
+    }
+    if scored:
+        set_["last_scored_at"] = func.now()
+    await db.execute(stmt.on_conflict_do_update(index_elements=["video_id"], set_=set_))
+
+    # rare: a row written concurrently, repair those videos with a full recount
+    await refresh_video_stats(db, changes.recount, scored=scored)
+
+async def refresh_video_stats(db: AsyncSession, video_ids: set[str], scored: bool = False):
+    """
+    recompute video_stats of videos from all their comments, in the caller transaction (caller commit).
+    repair path only, comment writes apply their changes with apply_stats_changes.
+    scored: the write was a prediction, last_scored_at is set
+    """
+    if not video_ids:
+        return
+
+    # lock the stats rows first (created when missing), in a stable order so two writers never deadlock.
+    # a concurrent writer of the same video wait here until this transaction commit,
+    # then its own recount below is a new statement that see the committed comments
+    video_ids = sorted(video_ids)
+    lock = insert(VideoStats).values([{"video_id": video_id} for video_id in video_ids])
+    lock = lock.on_conflict_do_update(index_elements=["video_id"], set_={"updated_at": func.now()})
+    await db.execute(lock)
+
+    # both counts are served by the partial indexes of published/flagged comments
+    comment_count = (
+        select(func.count())
+        .select_from(Comment)
+        .filter_by(moderation_status="published")
+        .where(Comment.video_id == VideoStats.video_id)
+        .scalar_subquery()
+    )
+    flagged_count = (
+        select(func.count())
+        .select_from(Comment)
+        .filter_by(is_judi=True, moderation_status="published")
+        .where(Comment.video_id == VideoStats.video_id)
+        .scalar_subquery()
+    )
+    values = {"comment_count": comment_count, "flagged_count": flagged_count, "updated_at": func.now()}
+    if scored:
+        values["last_scored_at"] = func.now()
+    stmt = (
+        update(VideoStats)
+        .where(VideoStats.video_id.in_(video_ids))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(stmt)
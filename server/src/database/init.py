@@ -1,12 +1,17 @@
 # src/database/init.py
 import os
+import asyncio
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from alembic.config import Config
+from alembic import command
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("POSTGRESQL_URL")
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "alembic.ini")
 engine = create_async_engine(DATABASE_URL) # create async engine
 AsyncSessionLocal = sessionmaker( # create async session
     bind=engine,
@@ -16,10 +21,20 @@ AsyncSessionLocal = sessionmaker( # create async session
     expire_on_commit=False
     )
 
-async def init_db(Base): # create database and schema if not available
-    print("Creating tables if not exist...")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def init_db(): # create or upgrade the schema with alembic migrations
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logging"] = False
+
+    async with engine.connect() as conn:
+        tables = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+    if "comments" in tables and "alembic_version" not in tables:
+        # schema created by create_all before migrations existed
+        print("Existing schema without migration history, stamping baseline...")
+        await asyncio.to_thread(command.stamp, config, "0001_baseline")
+
+    print("Running database migrations...")
+    # alembic run its own event loop (migrations/env.py), so run it in a thread
+    await asyncio.to_thread(command.upgrade, config, "head")
     print("Database schema initialized.")
 
 
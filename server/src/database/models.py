@@ -1,6 +1,6 @@
 # src/database/models.py
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean, Float
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Boolean, Float, Integer, LargeBinary, Index, text as sql_text
+from sqlalchemy.orm import declarative_base, relationship, deferred
 from sqlalchemy.sql import func
 from datetime import datetime, timezone
 import uuid
@@ -10,13 +10,15 @@ Base = declarative_base()
 class User(Base):
     __tablename__ = "users"
     
-    user_id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, primary_key=True)
     name = Column(String, nullable=False)
     email = Column(String, nullable=False)
     channel_id = Column(String)
     channel_name = Column(String)
     custom_url = Column(String)
     playlist_id = Column(String)
+    auto_moderation = Column(Boolean, default=False, nullable=False) # scheduler moderate this channel in background
+    moderation_threshold = Column(Float, nullable=True) # min confidence to moderate automatically, null means AUTO_MODERATION_THRESHOLD
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
@@ -36,9 +38,9 @@ class RefreshToken(Base):
 class Video(Base):
     __tablename__ = "videos"
 
-    video_id = Column(String, primary_key=True, unique=True, nullable=False, index=True) # items[i].contentDetails.videoId
+    video_id = Column(String, primary_key=True) # items[i].contentDetails.videoId
     channel_id = Column(String, nullable=True, index=True) # items[i].snippet.channelId
-    playlist_id = Column(String, nullable=False, index=True) # items[i].snippet.playlistId
+    playlist_id = Column(String, nullable=False) # items[i].snippet.playlistId
     title = Column(String, nullable=False) # items[i].snippet.title
     description = Column(Text, nullable=True) # items[i].snippet.description
     published_at = Column(DateTime(timezone=True), nullable=True) # items[i].snippet.publishedAt
@@ -47,21 +49,62 @@ class Video(Base):
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     comments = relationship("Comment", back_populates="video", cascade="all, delete-orphan")
+    # loaded with the video in the same query, written only by crud_content.apply_stats_changes (deltas of every comment write)
+    # and crud_content.refresh_video_stats (full recount, repair path)
+    stats = relationship("VideoStats", uselist=False, lazy="joined", viewonly=True)
+
+    __table_args__ = (
+        # video history listing newest first, same order as get_videos so the keyset cursor is a range scan
+        Index("ix_videos_playlist_published", "playlist_id", sql_text("published_at DESC NULLS LAST"), sql_text("video_id DESC")),
+    )
 
 # https://www.googleapis.com/youtube/v3/commentThreads
 class Comment(Base):
     __tablename__ = "comments"
 
-    comment_id = Column(String, primary_key=True, unique=True, nullable=False, index=True) # items[i].snippet.topLevelComment[j].id
+    comment_id = Column(String, primary_key=True) # items[i].snippet.topLevelComment[j].id
     video_id = Column(String, ForeignKey("videos.video_id", ondelete="CASCADE"), nullable=False, index=True) # items[i].snippet.videoId
+    parent_id = Column(String, nullable=True, index=True) # items[i].replies.comments[j].snippet.parentId, null for top-level comment
+    total_reply_count = Column(Integer, nullable=True) # items[i].snippet.totalReplyCount, null for reply
+    replies_synced_count = Column(Integer, nullable=True) # total_reply_count when the replies were last paged, not paged again until it changes
     author_display_name = Column(String, nullable=True) # items[i].snippet.topLevelComment[j].snippet.authorDisplayName
     text = Column(Text, nullable=False) # items[i].snippet.topLevelComment[j].snippet.textDisplay/textOriginal
+    normalized_text = Column(Text, nullable=True) # normalize_text(text) computed at ingest, input of the model
+    content_hash = Column(String(32), nullable=True) # blake2b-128 hex of normalized_text, change and duplicate detection
+    preprocessing_version = Column(String, nullable=True) # PREPROCESSING_VERSION that produced normalized_text
     published_at = Column(DateTime(timezone=True), nullable=False) # items[i].snippet.topLevelComment[j].snippet.publishedAt
     updated_at = Column(DateTime(timezone=True), nullable=False) # items[i].snippet.topLevelComment[j].snippet.updatedAt
     moderation_status = Column(String, default="published")
+    moderation_error = Column(String, nullable=True) # reason youtube refused to moderate it (e.g. commentNotFound), not retried by auto moderation
     is_judi = Column(Boolean, default=False)
     label = Column(Boolean, default=False) # true label of model prediction (for further training)
     confidence = Column(Float, default=0)
+    model_version = Column(String, nullable=True) # model that produced is_judi/confidence, null means never scored
+    # uint16 token ids of the normalized text stored at ingest (TOKENIZE_AT_INGEST), only loaded by the predict queries
+    token_ids = deferred(Column(LargeBinary, nullable=True), raiseload=True)
+    tokenizer_version = Column(String, nullable=True) # tokenizer + normalization that produced token_ids
     created_at = Column(DateTime(timezone=True),  default=lambda: datetime.now(timezone.utc), nullable=False)
 
-    video = relationship("Video", back_populates="comments")
\ No newline at end of file
+    video = relationship("Video", back_populates="comments")
+
+    # keep in sync with migrations/versions, the hot queries only read published comments of one video
+    __table_args__ = (
+        Index("ix_comments_video_published", "video_id", "published_at", "comment_id",
+              postgresql_where=sql_text("moderation_status = 'published'")),
+        Index("ix_comments_video_unscored", "video_id", postgresql_where=sql_text("is_judi IS NULL")),
+        Index("ix_comments_video_model_version", "video_id", "model_version",
+              postgresql_where=sql_text("moderation_status = 'published'")),
+        Index("ix_comments_video_flagged", "video_id", "confidence",
+              postgresql_where=sql_text("is_judi AND moderation_status = 'published'")),
+        Index("ix_comments_content_hash", "content_hash"),
+    )
+
+# aggregate of the comments of a video, kept up to date by every comment write so listing don't count() comments
+class VideoStats(Base):
+    __tablename__ = "video_stats"
+
+    video_id = Column(String, ForeignKey("videos.video_id", ondelete="CASCADE"), primary_key=True)
+    comment_count = Column(Integer, default=0, nullable=False) # published comments
+    flagged_count = Column(Integer, default=0, nullable=False) # published comments predicted as judi
+    last_scored_at = Column(DateTime(timezone=True), nullable=True) # last prediction write, null means never scored
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
@@ -1,5 +1,4 @@
 # src/handlers/auth_handler.py
-from httpx import AsyncClient
 import urllib.parse
 import os
 import logging
@@ -7,6 +6,7 @@ from fastapi import Request, Response, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.core.session import get_session, create_session, delete_session
+from src.core.http_client import get_http_client
 from src.services.auth_service import (
     handle_auth_callback,
     delete_session_data,
@@ -67,14 +67,13 @@ async def callback_handler(request: Request, db: AsyncSession):
         await delete_session(state)
 
         # request to google to get refresh, access token and token id
-        async with AsyncClient() as client:
-            token_res = await client.post("https://oauth2.googleapis.com/token", data={
-                "code": code,
-                "client_id": CLIENT_ID,
-                "client_secret": CLIENT_SECRET,
-                "redirect_uri": REDIRECT_URI,
-                "grant_type": "authorization_code",
-            })
+        token_res = await get_http_client().post("https://oauth2.googleapis.com/token", data={
+            "code": code,
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "redirect_uri": REDIRECT_URI,
+            "grant_type": "authorization_code",
+        })
         if token_res.status_code != 200:
             # fallback when response status code is not 200
             return JSONResponse(status_code=400, content={"error": "Failed to exchange token"})
@@ -1,25 +1,25 @@
-import logging
+import logging, os, asyncio
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.schemas.video import VideoCreate, VideoFetchSummary
+from src.database.init import AsyncSessionLocal
 from src.services.content_service import (
     get_user_data,
     fetch_latest_video,
-    fetch_comments,
+    sync_video,
     get_videos_handler,
     get_video_comments,
     delete_comments_by_ids,
-    predict_comment
-)
-from src.database.crud_content import (
-    get_video_by_id,
-    insert_video,
-    insert_comments,
-    update_last_fetch_comment
+    predict_comment,
+    get_inference_stats,
+    get_youtube_stats,
+    MODERATION_STATUSES
 )
+from src.services.job_service import job_queue, JOB_KINDS
+from src.services.moderation_service import get_auto_moderation, set_auto_moderation
 
 logger = logging.getLogger(__name__)
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4")) # videos synced at the same time
 
 async def get_user_handler(request: Request, db: AsyncSession):
     """
@@ -40,9 +40,10 @@ async def get_user_handler(request: Request, db: AsyncSession):
         logger.error("Failed to fetch user", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
 
-async def fetch_latest_video_handler(request: Request, db: AsyncSession, playlist_id: str):
+async def fetch_latest_video_handler(request: Request, playlist_id: str, max_result: int = 1):
     """
-    handler to get latest video based on playlist id, also get the comments and stored the video and comment data to postgresql
+    handler to get latest video based on playlist id, also get the comments and stored the video and comment data to postgresql.
+    videos are synced concurrently, each with its own database session so one failure doesn't affect the others
     """
     # get access token that already been set by middleware if user already login
     access_token = getattr(request.state, "access_token", None)
@@ -52,59 +53,25 @@ async def fetch_latest_video_handler(request: Request, db: AsyncSession, playlis
 
     try:
         # get latest video
-        videos = await fetch_latest_video(playlist_id, access_token)
+        videos = await fetch_latest_video(playlist_id, access_token, max_result)
     except HTTPException as e:
         return JSONResponse(status_code=e.status_code, content={"error": e.detail})
     except Exception as e:
         logger.error("Error fetching latest videos", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
 
-    results = []
-    for item in videos or []:
-        # get needed data from videos data
-        snippet = item.get("snippet", {})
-        content = item.get("contentDetails", {})
-        video_id = content.get("videoId")
-        if not video_id:
-            continue
-
-        try:
-            # check if video is already available in database
-            stored_video = await get_video_by_id(db, video_id)
-            if not stored_video:
-                # if not then create new one
-                video_payload = VideoCreate(
-                    video_id=video_id,
-                    channel_id=snippet.get("channelId"),
-                    playlist_id=playlist_id or snippet.get("playlistId", ""),
-                    title=snippet.get("title", ""),
-                    description=snippet.get("description"),
-                    published_at=snippet.get("publishedAt"),
-                )
-                # perform insert video data
-                stored_video = await insert_video(db, video_payload)
-
-            # get related comment from video
-            comments = await fetch_comments(video_id, access_token, stored_video.last_fetch_comment)
-            # insert bulk comment
-            await insert_comments(db, comments or [])
-            # update last fetch comment in video table
-            await update_last_fetch_comment(db, video_id)
-
-            # return video and comment data for client
-            results.append(VideoFetchSummary(
-                video_id=video_id,
-                title=stored_video.title,
-                published_at=stored_video.published_at,
-                new_comment_count=len(comments or [])
-            ))
-        except Exception as e:
-            logger.error(f"Failed syncing comments for video {video_id}", exc_info=True)
-            results.append(VideoFetchSummary(video_id=video_id, error=str(e)))
-
-    return results
-
-async def get_user_videos_handler(db: AsyncSession, playlist_id: str, page: int, page_size: int):
+    # limit how many videos are synced at the same time
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def sync_with_own_session(item: dict):
+        async with semaphore, AsyncSessionLocal() as video_db:
+            return await sync_video(video_db, item, playlist_id, access_token)
+
+    results = await asyncio.gather(*(sync_with_own_session(item) for item in videos or []))
+    # return video and comment data for client, in playlist order
+    return [summary for summary in results if summary]
+
+async def get_user_videos_handler(db: AsyncSession, playlist_id: str, page: int, page_size: int, cursor: str | None = None):
     """
     handler to get history video from postgre
     """
@@ -114,7 +81,7 @@ async def get_user_videos_handler(db: AsyncSession, playlist_id: str, page: int,
 
     try:
         # get video history with pagination
-        data = await get_videos_handler(db, playlist_id, page, page_size)
+        data = await get_videos_handler(db, playlist_id, page, page_size, cursor)
         return data
     except HTTPException as e:
         return JSONResponse(status_code=e.status_code, content={"error": e.detail})
@@ -122,7 +89,7 @@ async def get_user_videos_handler(db: AsyncSession, playlist_id: str, page: int,
         logger.error("Failed to get user videos", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
 
-async def get_video_detail_handler(request: Request, video_id: str, page: int, limit: int, db: AsyncSession):
+async def get_video_detail_handler(request: Request, video_id: str, page: int, limit: int, db: AsyncSession, cursor: str | None = None):
     """
     handler for detail video page where we get the detail video data like description, url, etc, and comment related to that video
     """
@@ -136,12 +103,20 @@ async def get_video_detail_handler(request: Request, video_id: str, page: int, l
         # fallback when video_id is not provided
         return JSONResponse(status_code=400, content={"error": "video_id is required"})
 
+    # new comment are fetched from youtube in background, this request only read from database
+    sync_job = None
+    try:
+        sync_job = await job_queue.enqueue("sync", video_id, access_token, getattr(request.state, "user_id", None))
+    except Exception as e:
+        logger.warning(f"Failed to enqueue comment sync for video {video_id}: {e}")
+
     try:
         # get comment data related to video with pagination
-        data = await get_video_comments(db, video_id, access_token, page, limit)
+        data = await get_video_comments(db, video_id, page, limit, cursor)
+        data["sync_job"] = sync_job
         return data
     except HTTPException as e:
-        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail, "sync_job": sync_job})
     except Exception as e:
         logger.error("Failed to get video detail", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
@@ -154,13 +129,17 @@ async def delete_comments_handler(request: Request, db: AsyncSession):
         # get data from request body
         body = await request.json()
         comment_ids = body.get("comment_ids")
-        moderation_status = body.get("moderation_status", "rejected") # rejected | heldForReview
+        moderation_status = body.get("moderation_status", "rejected") # rejected | heldForReview | published
         ban_author = body.get("ban_author", False)
 
         # validation comment_ids
         if not comment_ids or not isinstance(comment_ids, list):
             return JSONResponse(status_code=400, content={"error": "Invalid comment_ids input"})
 
+        # validation moderation_status, youtube would refuse every call of the dispatch
+        if moderation_status not in MODERATION_STATUSES:
+            return JSONResponse(status_code=400, content={"error": f"moderation_status must be one of {', '.join(MODERATION_STATUSES)}"})
+
         # ban_author can be used when moderation_status is rejected
         if ban_author and moderation_status != "rejected":
             return JSONResponse(
@@ -176,7 +155,10 @@ async def delete_comments_handler(request: Request, db: AsyncSession):
         # perform delete comments
         result = await delete_comments_by_ids(db, access_token, comment_ids, moderation_status, ban_author)
 
-        return JSONResponse(status_code=200, content={"success": True, "updated": result})
+        # failed holds the outcome of every comment that couldn't be moderated
+        return JSONResponse(status_code=200, content={"success": True, "updated": result["updated"], "failed": result["failed"]})
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
     except Exception as e:
         logger.error("Failed to delete comments", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
@@ -189,15 +171,124 @@ async def inference_model_handler(request: Request, db: AsyncSession):
         # get video_id data from request body
         body = await request.json()
         video_id = body.get("video_id")
+        incremental = body.get("incremental", True) # false to score every comment again
+        if isinstance(incremental, str):
+            # form/query style values, "false" and "0" must not be truthy
+            incremental = {"true": True, "1": True, "false": False, "0": False}.get(incremental.strip().lower(), incremental)
 
         # validation video_id
         if not video_id:
             return JSONResponse(status_code=400, content={"error": "video_id is required"})
+        if not isinstance(incremental, bool):
+            return JSONResponse(status_code=400, content={"error": "incremental must be true or false"})
         
         # perform inference model on comment data
-        comment_data = await predict_comment(db, video_id)
+        comment_data = await predict_comment(db, video_id, incremental)
 
         return comment_data
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
     except Exception as e:
         logger.error("Failed to predict comment", exc_info=True)
-        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
+
+async def inference_stats_handler():
+    """
+    handler to get prediction cache hit and miss counters
+    """
+    try:
+        return get_inference_stats()
+    except Exception as e:
+        logger.error("Failed to get inference stats", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
+
+async def youtube_stats_handler():
+    """
+    handler to get youtube quota usage and per endpoint request metrics
+    """
+    try:
+        return await get_youtube_stats()
+    except Exception as e:
+        logger.error("Failed to get youtube stats", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
+
+async def create_job_handler(request: Request):
+    """
+    handler to start a background job for a video: sync (fetch new comment), predict, or refresh (sync then predict)
+    """
+    access_token = getattr(request.state, "access_token", None)
+    if not access_token:
+        return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+
+    try:
+        # get data from request body
+        body = await request.json()
+        video_id = body.get("video_id")
+        kind = body.get("kind", "refresh")
+
+        # validation
+        if not video_id:
+            return JSONResponse(status_code=400, content={"error": "video_id is required"})
+        if kind not in JOB_KINDS:
+            return JSONResponse(status_code=400, content={"error": f"kind must be one of {', '.join(JOB_KINDS)}"})
+
+        # a job for the same video that is still queued or running is returned instead of a new one
+        job = await job_queue.enqueue(kind, video_id, access_token, getattr(request.state, "user_id", None))
+        return JSONResponse(status_code=202, content=job)
+    except Exception as e:
+        logger.error("Failed to create job", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
+
+async def get_job_handler(job_id: str):
+    """
+    handler to poll the status of a background job
+    """
+    try:
+        job = await job_queue.get(job_id)
+        if not job:
+            return JSONResponse(status_code=404, content={"error": "Job not found"})
+        return job
+    except Exception as e:
+        logger.error("Failed to get job", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
+
+async def get_auto_moderation_handler(request: Request, db: AsyncSession):
+    """
+    handler to get auto moderation setting and scheduler state of the logged in channel
+    """
+    user_id = getattr(request.state, "user_id", None)
+    if not user_id:
+        return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+
+    try:
+        return await get_auto_moderation(db, user_id)
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
+    except Exception as e:
+        logger.error("Failed to get auto moderation", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
+
+async def set_auto_moderation_handler(request: Request, db: AsyncSession):
+    """
+    handler to enable/disable auto moderation of the logged in channel and set its confidence threshold
+    """
+    user_id = getattr(request.state, "user_id", None)
+    if not user_id:
+        return JSONResponse(status_code=401, content={"error": "Unauthorized"})
+
+    try:
+        # get data from request body
+        body = await request.json()
+        enabled = bool(body.get("enabled", False))
+        threshold = body.get("threshold") # null means default threshold
+
+        # validation threshold
+        if threshold is not None and (not isinstance(threshold, (int, float)) or not 0.5 <= threshold <= 1):
+            return JSONResponse(status_code=400, content={"error": "threshold must be between 0.5 and 1"})
+
+        return await set_auto_moderation(db, user_id, enabled, threshold)
+    except HTTPException as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
+    except Exception as e:
+        logger.error("Failed to set auto moderation", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
@@ -3,7 +3,7 @@ from fastapi.responses import JSONResponse, RedirectResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from datetime import datetime
 from fastapi import Request
-import httpx, os, logging
+import os, logging
 from dotenv import load_dotenv
 
 from src.database.init import get_async_db
@@ -12,12 +12,14 @@ from src.database.crud import (
 )
 from src.core.session import get_session, create_session
 from src.core.utils import decrypt_token
+from src.core.http_client import get_http_client
+from src.core.youtube_client import quota_user
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 # define some url that will be skip by middleware such as health monitoring and login
-PUBLIC_PATHS = ["/health",
+PUBLIC_PATHS = ["/health", "/ready",
                 "/auth/login", "/auth/callback", 
                 ]
 COOKIE_TTL = 3600 * 24 * 1
@@ -43,6 +45,8 @@ class RequireLoginMiddleware(BaseHTTPMiddleware):
                 # forward the request with data user_id in the request
                 request.state.user_id = session_data['user_id']
                 request.state.access_token = session_data['access_token']
+                # youtube quota used by this request is counted for this user
+                quota_user.set(session_data['user_id'])
                 return await call_next(request)
 
             # Session data not found, try to use refresh token from DB
@@ -97,14 +101,13 @@ class RequireLoginMiddleware(BaseHTTPMiddleware):
         request new access token using refresh token
         """
         try:
-            async with httpx.AsyncClient() as client:
-                # request to google to get new access token using refresh token data
-                response = await client.post("https://oauth2.googleapis.com/token", data={
-                    "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-                    "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-                    "refresh_token": refresh_token,
-                    "grant_type": "refresh_token"
-                })
+            # request to google to get new access token using refresh token data
+            response = await get_http_client().post("https://oauth2.googleapis.com/token", data={
+                "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+                "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token"
+            })
 
             if response.status_code != 200:
                 raise Exception(response.json())
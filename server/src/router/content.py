@@ -7,7 +7,13 @@ from src.handlers.content_handler import (
     get_user_videos_handler,
     get_video_detail_handler,
     delete_comments_handler,
-    inference_model_handler
+    inference_model_handler,
+    inference_stats_handler,
+    youtube_stats_handler,
+    create_job_handler,
+    get_job_handler,
+    get_auto_moderation_handler,
+    set_auto_moderation_handler
 )
 
 router = APIRouter()
@@ -20,21 +26,22 @@ async def get_user(request: Request, db: AsyncSession = Depends(get_async_db)):
 @router.get("/fetch-latest-videos")
 async def fetch_latest_videos(
     request: Request,
-    db: AsyncSession = Depends(get_async_db),
-    playlist_id: str = ""
+    playlist_id: str = "",
+    max_result: int = Query(1, ge=1, le=50)
 ):
     # route to get latest video from channel data
-    return await fetch_latest_video_handler(request, db, playlist_id)
+    return await fetch_latest_video_handler(request, playlist_id, max_result)
 
 @router.get("/user_videos")
 async def get_user_videos(
     db: AsyncSession = Depends(get_async_db),
     playlist_id: str = "",
     page: int = Query(1, ge=1),
-    page_size: int = Query(10, ge=1, le=100)
+    page_size: int = Query(10, ge=1, le=100),
+    cursor: str | None = Query(None) # next_cursor of the previous page, faster than page for deep pages
 ):
     # route to get history video from database
-    return await get_user_videos_handler(db, playlist_id, page, page_size)
+    return await get_user_videos_handler(db, playlist_id, page, page_size, cursor)
 
 @router.get("/video/{video_id}")
 async def get_video_detail(
@@ -42,10 +49,11 @@ async def get_video_detail(
     video_id: str = Path(...),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
+    cursor: str | None = Query(None), # next_cursor of the previous page, faster than page for deep pages
     db: AsyncSession = Depends(get_async_db)
 ):
     # route to get detail video data and all of the comments
-    return await get_video_detail_handler(request, video_id, page, limit, db)
+    return await get_video_detail_handler(request, video_id, page, limit, db, cursor)
 
 @router.post("/comments/delete")
 async def delete_comments(
@@ -62,3 +70,33 @@ async def inference_model(
 ):
     # route for model inference to comments data
     return await inference_model_handler(request, db)
+
+@router.get("/predict/stats")
+async def inference_stats():
+    # route to get prediction cache hit and miss counters and cascade counters
+    return await inference_stats_handler()
+
+@router.get("/youtube/stats")
+async def youtube_stats():
+    # route to get youtube quota usage of today and request metrics per endpoint
+    return await youtube_stats_handler()
+
+@router.post("/jobs")
+async def create_job(request: Request):
+    # route to start background sync/predict job for a video
+    return await create_job_handler(request)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str = Path(...)):
+    # route to poll background job status
+    return await get_job_handler(job_id)
+
+@router.get("/auto-moderation")
+async def get_auto_moderation(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # route to get auto moderation setting of the channel
+    return await get_auto_moderation_handler(request, db)
+
+@router.put("/auto-moderation")
+async def set_auto_moderation(request: Request, db: AsyncSession = Depends(get_async_db)):
+    # route to enable/disable scheduled auto moderation of the channel
+    return await set_auto_moderation_handler(request, db)
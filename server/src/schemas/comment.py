@@ -14,7 +14,8 @@ class CommentBase(BaseModel):
 
 class CommentCreate(CommentBase):
     # insert comment
-    pass
+    parent_id: Optional[str] = None # top-level comment id, only for reply
+    total_reply_count: Optional[int] = None # only for top-level comment
 
 class CommentClassification(BaseModel):
     # update comment classification result
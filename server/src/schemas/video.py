@@ -16,8 +16,19 @@ class VideoCreate(VideoBase):
     # create video, no additional column
     pass
 
+class VideoStatsResponse(BaseModel):
+    # comment stats of a video, maintained on every comment write
+    comment_count: int
+    flagged_count: int
+    last_scored_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class VideoResponse(VideoBase):
     # fetch video, the rest column is inheritance
+    stats: Optional[VideoStatsResponse] = None
+
     class Config:
         from_attributes = True
 
@@ -36,3 +47,4 @@ class VideoListResponse(BaseModel):
     page: int
     page_size: int
     has_next: bool
+    next_cursor: Optional[str] = None
@@ -8,6 +8,8 @@ from src.database.crud import (
 )
 from src.core.session import create_session, delete_session
 from src.core.utils import encrypt_token, decrypt_token
+from src.core.http_client import get_http_client
+from src.core.youtube_client import youtube_client
 from src.schemas.user import UserCreate
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -29,32 +31,32 @@ async def get_channel_info(access_token: str):
     service to get channel info using access token
     """
     try:
-        async with httpx.AsyncClient() as client:
-            # request to get channel data to google
-            response = await client.get(
-                url='https://www.googleapis.com/youtube/v3/channels?part=snippet,contentDetails&mine=true',
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
-
-            if response.status_code != 200:
-                # fallback when response status code isn't 200
-                logger.warning(f"Failed to get channel info: {response.text}")
-                return None
-
-            # get data
-            items = response.json().get("items", [])
-            if not items:
-                # fallback when data isn't available
-                return None
-
-            # return needed data from channel
-            item = items[0]
-            return {
-                "channel_id": item.get("id"),
-                "playlist_id": item["contentDetails"]["relatedPlaylists"]["uploads"],
-                "channel_name": item["snippet"]["title"],
-                "custom_url": item["snippet"].get("customUrl"),
-            }
+        # request to get channel data to google
+        response = await youtube_client.request(
+            "channels.list",
+            access_token,
+            {"part": "snippet,contentDetails", "mine": "true"}
+        )
+
+        if response.status_code != 200:
+            # fallback when response status code isn't 200
+            logger.warning(f"Failed to get channel info: {response.text}")
+            return None
+
+        # get data
+        items = response.json().get("items", [])
+        if not items:
+            # fallback when data isn't available
+            return None
+
+        # return needed data from channel
+        item = items[0]
+        return {
+            "channel_id": item.get("id"),
+            "playlist_id": item["contentDetails"]["relatedPlaylists"]["uploads"],
+            "channel_name": item["snippet"]["title"],
+            "custom_url": item["snippet"].get("customUrl"),
+        }
     except Exception as e:
         logger.error(f"Error in get_channel_info: {e}", exc_info=True)
         return None
@@ -160,12 +162,11 @@ async def revoke_token(decrypted_token: str) -> bool:
     service to revoke refresh token when user logged out
     """
     try:
-        async with httpx.AsyncClient() as client:
-            # request revoke refresh token to google
-            res = await client.post(
-                f"https://oauth2.googleapis.com/revoke?token={decrypted_token}",
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
+        # request revoke refresh token to google
+        res = await get_http_client().post(
+            f"https://oauth2.googleapis.com/revoke?token={decrypted_token}",
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
         if res.status_code == 200:
             return True
         
@@ -181,18 +182,17 @@ async def renew_access_token(decrypted_refresh_token: str):
     service to renew access token using refresh token, if refresh token haven't expired
     """
     try:
-        async with httpx.AsyncClient() as client:
-            # request new access token to google using refresh token
-            token_res = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-                    "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
-                    "refresh_token": decrypted_refresh_token,
-                    "grant_type": "refresh_token",
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
-            )
+        # request new access token to google using refresh token
+        token_res = await get_http_client().post(
+            "https://oauth2.googleapis.com/token",
+            data={
+                "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+                "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+                "refresh_token": decrypted_refresh_token,
+                "grant_type": "refresh_token",
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
 
         if token_res.status_code != 200:
             # fallback when response status code isn't 200
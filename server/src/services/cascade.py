@@ -0,0 +1,130 @@
+# src/services/cascade.py
+"""
+first stage of the prediction: hashed character n-gram logistic regression trained by engine/train_cascade.py.
+it score whole batches with numpy in a few microseconds per comment, comments below its uncertain band are benign,
+above it judi, and only the comments inside the band go to IndoBERT
+"""
+from dotenv import load_dotenv
+import hashlib
+import os
+
+import numpy as np
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true" # score comments with the cascade before IndoBERT
+CASCADE_PATH = os.getenv("CASCADE_PATH", os.path.join(BASE_DIR, "..", "..", "models", "cascade.npz")) # exported by engine/train_cascade.py
+CASCADE_LOW = os.getenv("CASCADE_LOW") # probability below which a comment is benign, default: band of the model file
+CASCADE_HIGH = os.getenv("CASCADE_HIGH") # probability above which a comment is judi, default: band of the model file
+
+# same hash as engine/train_cascade.py
+HASH_SEED = np.uint64(14695981039346656037)
+HASH_PRIME = np.uint64(1099511628211)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+def ngram_buckets(texts: list[str], ngram_range: tuple[int, int], bits: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    bucket of every character n-gram of every text, vectorized over the whole batch (same as engine/train_cascade.py).
+    return (text index, bucket) of each n-gram and the 1/sqrt(n-gram count) scale of each text
+    """
+    # collapse whitespace and pad, so word boundaries are part of the n-grams
+    padded = [" " + " ".join(text.split()) + " " for text in texts]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    chars = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    docs = np.repeat(np.arange(len(padded)), lengths)
+    ends = np.repeat(np.cumsum(lengths), lengths)
+    positions = np.arange(len(chars))
+
+    lo, hi = ngram_range
+    hashes = np.full(len(chars), HASH_SEED)
+    doc_parts, bucket_parts = [], []
+    for n in range(1, hi + 1):
+        # hash of the n-gram starting at each position, extended by one character per step (uint64 wraps around)
+        count = len(chars) - n + 1
+        hashes = hashes[:count] * HASH_PRIME + chars[n - 1:n - 1 + count]
+        if n < lo:
+            continue
+        inside = positions[:count] + n <= ends[:count] # n-gram doesn't cross into the next text
+        bucket_parts.append(((hashes[inside] * HASH_MIX) >> np.uint64(64 - bits)).astype(np.int64))
+        doc_parts.append(docs[:count][inside])
+
+    doc_index = np.concatenate(doc_parts)
+    buckets = np.concatenate(bucket_parts)
+    scale = 1 / np.sqrt(np.maximum(np.bincount(doc_index, minlength=len(padded)), 1))
+    return doc_index, buckets, scale
+
+class CascadeModel:
+    def __init__(self, path: str = CASCADE_PATH, low: float | None = None, high: float | None = None):
+        with open(path, "rb") as f:
+            content = f.read()
+        with np.load(path) as data:
+            self.weights = data["weights"]
+            self.bias = float(data["bias"])
+            self.bits = int(data["hash_bits"])
+            self.ngram_range = tuple(int(n) for n in data["ngram_range"])
+            band_low, band_high = (float(p) for p in data["band"])
+            check_texts, check_scores = data["check_texts"].tolist(), data["check_scores"]
+
+        self.low = band_low if low is None else low
+        self.high = band_high if high is None else high
+        if not 0 <= self.low <= self.high <= 1:
+            raise ValueError(f"Invalid cascade band ({self.low}, {self.high})")
+        # the featurizer is duplicated in the engine, a model scored differently here must not be used
+        if not np.allclose(self.predict_proba(check_texts), check_scores, atol=1e-6):
+            raise ValueError(f"Cascade model {path} doesn't score its check texts like engine/train_cascade.py")
+
+        # model file and band, part of MODEL_VERSION so cascade decisions are not mixed with other setups
+        payload = content + f"\0{self.low}\0{self.high}".encode()
+        self.version = hashlib.blake2b(payload, digest_size=4).hexdigest()
+        self.counts = {"benign": 0, "judi": 0, "uncertain": 0}
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        """
+        probability of judi of normalized texts, linear score without building the feature matrix
+        """
+        if not texts:
+            return np.zeros(0)
+        doc_index, buckets, scale = ngram_buckets(texts, self.ngram_range, self.bits)
+        logits = np.bincount(doc_index, weights=self.weights[buckets], minlength=len(texts)) * scale + self.bias
+        return 1 / (1 + np.exp(-logits))
+
+    def predict(self, texts: list[str]) -> list[tuple[bool, float] | None]:
+        """
+        (is_judi, confidence) for texts outside the uncertain band, None for texts that need the model
+        """
+        results: list[tuple[bool, float] | None] = []
+        for prob in self.predict_proba(texts).tolist():
+            if prob < self.low:
+                results.append((False, 1 - prob))
+            elif prob > self.high:
+                results.append((True, prob))
+            else:
+                results.append(None)
+
+        decided = [result for result in results if result]
+        self.counts["judi"] += sum(is_judi for is_judi, _ in decided)
+        self.counts["benign"] += len(decided) - sum(is_judi for is_judi, _ in decided)
+        self.counts["uncertain"] += len(results) - len(decided)
+        return results
+
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        return {
+            "version": self.version,
+            "band": [self.low, self.high],
+            **self.counts,
+            "skip_ratio": round((total - self.counts["uncertain"]) / total, 4) if total else None,
+        }
+
+def load_cascade() -> CascadeModel | None:
+    """
+    cascade model of the env config, None when it is disabled
+    """
+    if not CASCADE_ENABLED:
+        return None
+    return CascadeModel(
+        CASCADE_PATH,
+        low=float(CASCADE_LOW) if CASCADE_LOW else None,
+        high=float(CASCADE_HIGH) if CASCADE_HIGH else None
+    )
@@ -2,47 +2,49 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 from src.database.crud_content import (
     get_user_by_id, get_video_by_id,
+    insert_video,
     get_count_videos, get_videos,
-    get_comments, get_count_comments,
+    get_comments,
     update_moderation_status_comment,
+    update_moderation_errors,
     get_all_comments,
+    get_unscored_comments,
+    get_predictions_by_hash,
+    get_flagged_comments,
     update_comments_prediction_batch,
     insert_comments,
+    update_thread_reply_counts,
+    get_thread_reply_counts,
+    get_threads_with_hidden_replies,
+    mark_replies_synced,
     update_last_fetch_comment
 )
 from src.schemas.comment import CommentCreate
+from src.schemas.video import VideoCreate, VideoFetchSummary
 from dateutil.parser import parse as parse_datetime
-from typing import List
+from typing import List, Dict, AsyncIterator, NamedTuple, Callable, Awaitable
 from datetime import datetime
-import httpx, os, logging
-
-from transformers import BertTokenizer, AutoModelForSequenceClassification
-from src.utils.preprocessing import normalize_text
-from torch.utils.data import DataLoader
-import torch.nn.functional as F
-from datasets import Dataset
-import torch
-
-# model path
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "..", "..", "models", "best_indobert.pt")
-
-# load model
-model_name = "indobenchmark/indobert-lite-base-p2"
-device = "cuda" if torch.cuda.is_available() else "cpu"
-try:
-    model_indobert = AutoModelForSequenceClassification.from_pretrained(model_name, num_labels=2)
-    model_indobert.load_state_dict(torch.load(MODEL_PATH, weights_only=True))
-    tokenizer_indobert = BertTokenizer.from_pretrained(model_name)
-except Exception as e:
-    print(f"Error loading model or tokenizer: {e}")
-    raise e
+import os, logging, asyncio, random, contextlib
+
+from src.core.youtube_client import youtube_client, error_reason
+from src.core.session import redis_client
+from src.utils.pagination import encode_cursor, decode_cursor
+
+from src.services.inference_service import predict_normalized, prediction_cache, cascade, MODEL_VERSION
+from src.utils.preprocessing import normalize_many, content_hash, PREPROCESSING_VERSION
+from src.utils import tokenization
 
 logger = logging.getLogger(__name__)
-API_KEY = os.getenv("GOOGLE_API_KEY")
-BASE_PLAYLIST_URL = "https://www.googleapis.com/youtube/v3/playlistItems"
-BASE_COMMENT_URL = "https://www.googleapis.com/youtube/v3/commentThreads"
-YOUTUBE_MODERATION_URL = "https://www.googleapis.com/youtube/v3/comments/setModerationStatus"
+REPLY_FETCH_CONCURRENCY = int(os.getenv("REPLY_FETCH_CONCURRENCY", "8")) # reply threads paged at the same time
+COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", "60")) # seconds the video listing total is cached in redis
+COMMENT_FULL_SYNC_INTERVAL = int(os.getenv("COMMENT_FULL_SYNC_INTERVAL", "86400")) # seconds between full comment passes of a video, 0 = always
+MODERATION_BATCH_SIZE = 100 # max comment ids in one setModerationStatus call
+MODERATION_CONCURRENCY = int(os.getenv("MODERATION_CONCURRENCY", "4")) # setModerationStatus calls at the same time
+MODERATION_RETRIES = int(os.getenv("MODERATION_RETRIES", "2")) # extra rounds for chunks that fail transiently
+MODERATION_RETRY_DELAY = float(os.getenv("MODERATION_RETRY_DELAY", "2")) # seconds, doubled on every round
+MODERATION_STATUSES = ("rejected", "heldForReview", "published") # moderationStatus accepted by setModerationStatus
+# setModerationStatus errors caused by one of the ids, the only ones worth bisecting, any other 400 is about the request
+MODERATION_ID_REASONS = ("commentNotFound", "processingFailure", "operationNotSupported")
 
 async def get_user_data(db: AsyncSession, user_id: str):
     """
@@ -59,62 +61,80 @@ async def fetch_latest_video(playlist_id: str, access_token: str, max_result: in
     """
     service to get latest video from channel
     """
-    async with httpx.AsyncClient() as client:
-        # request to google to get latest video
-        res = await client.get(BASE_PLAYLIST_URL, params={
-            "part": "snippet,contentDetails",
-            "playlistId": playlist_id,
-            "maxResults": max_result,
-            "key": API_KEY
-        }, headers={"Authorization": f"Bearer {access_token}"})
-
-    # fallback
+    # request to google to get latest video
+    res = await youtube_client.request("playlistItems.list", access_token, {
+        "part": "snippet,contentDetails",
+        "playlistId": playlist_id,
+        "maxResults": max_result
+    })
+
+    # fallback, quota errors are already raised by the client
     if res.status_code == 403:
-        raise HTTPException(403, "YouTube quota exceeded")
+        raise HTTPException(403, f"YouTube access forbidden: {error_reason(res)}")
     if res.status_code == 404:
         raise HTTPException(404, "Playlist not found")
 
     # return latest video data
     return res.json().get("items", [])
 
-async def fetch_comments(video_id: str, access_token: str, last_fetch: datetime | None, max_result: int = 100):
+class CommentPage(NamedTuple):
+    # one page of commentThreads: new comments, {thread_id: totalReplyCount} of every thread in the page,
+    # and whether nothing on the page is newer than the last fetch
+    comments: List[CommentCreate]
+    reply_counts: Dict[str, int]
+    behind_watermark: bool
+
+async def iter_comment_pages(
+        video_id: str,
+        access_token: str,
+        last_fetch: datetime | None,
+        max_result: int = 100,
+        newest_first: bool = False
+        ) -> AsyncIterator[CommentPage]:
     """
-    service to get all the commments from video
+    service to get the commments from video page by page, so the caller can store each page as it arrives
+    and stop paging early (newest_first request the threads ordered by time, the default order is relevance)
     """
-    comments = []
     params = {
         "part": "snippet,replies",
         "videoId": video_id,
-        "maxResults": max_result,
-        "key": API_KEY
+        "maxResults": max_result
     }
+    if newest_first:
+        params["order"] = "time"
 
     prev_page_token = None
 
-    async with httpx.AsyncClient() as client:
-        # request all the comments to google
-        while True: # using while because in 1 fetch, only 100 data comment will fetched
-            res = await client.get(BASE_COMMENT_URL, params=params, headers={"Authorization": f"Bearer {access_token}"})
-
-            # fallback
-            if res.status_code == 403:
-                raise HTTPException(403, "YouTube quota exceeded")
-            if res.status_code == 404:
-                raise HTTPException(404, "Video not found")
+    # request all the comments to google
+    while True: # using while because in 1 fetch, only 100 data comment will fetched
+        res = await youtube_client.request("commentThreads.list", access_token, params)
 
-            # get data
-            data = res.json()
-            for item in data.get("items", []):
-                # get needed data
-                comment = item["snippet"]["topLevelComment"]["snippet"]
-                published = parse_datetime(comment["publishedAt"])
-                updated = parse_datetime(comment["updatedAt"])
-
-                # filter to stop fetch comment data for older comment based on published or updated datetime
-                # to prevent fetch the same comment everytime
-                if last_fetch and max(published, updated) <= last_fetch:
-                    continue
-                
+        # fallback, quota errors are already raised by the client
+        if res.status_code == 403:
+            if error_reason(res) == "commentsDisabled":
+                # nothing to fetch
+                break
+            raise HTTPException(403, f"YouTube access forbidden: {error_reason(res)}")
+        if res.status_code == 404:
+            raise HTTPException(404, "Video not found")
+
+        # get data
+        data = res.json()
+        items = data.get("items", [])
+        comments: List[CommentCreate] = []
+        reply_counts: Dict[str, int] = {}
+        for item in items:
+            # get needed data
+            comment = item["snippet"]["topLevelComment"]["snippet"]
+            published = parse_datetime(comment["publishedAt"])
+            updated = parse_datetime(comment["updatedAt"])
+            total_reply_count = item["snippet"].get("totalReplyCount", 0)
+            # youtube only inline a few replies, the count tell the caller which threads have to be fetched fully
+            reply_counts[item["id"]] = total_reply_count
+
+            # filter to stop fetch comment data for older comment based on published or updated datetime
+            # to prevent fetch the same comment everytime
+            if not last_fetch or max(published, updated) > last_fetch:
                 # create CommentCreate object for insert comment data
                 comments.append(CommentCreate(
                     comment_id=item["id"],
@@ -122,52 +142,306 @@ async def fetch_comments(video_id: str, access_token: str, last_fetch: datetime
                     author_display_name=comment["authorDisplayName"],
                     text=comment["textDisplay"],
                     published_at=comment["publishedAt"],
-                    updated_at=comment["updatedAt"]
+                    updated_at=comment["updatedAt"],
+                    total_reply_count=total_reply_count
                 ))
 
-                # iterate through all the reply from each comment, treat reply as independent comment
-                for reply in item.get("replies", {}).get("comments", []):
-                    # get needed data
-                    rs = reply["snippet"]
-                    published_r = parse_datetime(rs["publishedAt"])
-                    updated_r = parse_datetime(rs["updatedAt"])
-
-                    # filter to stop fetch reply data for older reply based on published or updated datetime
-                    # to prevent storing the same reply everytime
-                    if last_fetch and max(published_r, updated_r) <= last_fetch:
-                        continue
-                        
-                    # create CommentCreate object for insert comment data
-                    comments.append(CommentCreate(
-                        comment_id=reply["id"],
-                        video_id=video_id,
-                        author_display_name=rs["authorDisplayName"],
-                        text=rs["textDisplay"],
-                        published_at=rs["publishedAt"],
-                        updated_at=rs["updatedAt"]
-                    ))
-
-            # get next token token data
-            next_token = data.get("nextPageToken")
+            # iterate through all the reply from each comment, treat reply as independent comment
+            for reply in item.get("replies", {}).get("comments", []):
+                # get needed data
+                rs = reply["snippet"]
+                published_r = parse_datetime(rs["publishedAt"])
+                updated_r = parse_datetime(rs["updatedAt"])
+
+                # filter to stop fetch reply data for older reply based on published or updated datetime
+                # to prevent storing the same reply everytime
+                if last_fetch and max(published_r, updated_r) <= last_fetch:
+                    continue
+                    
+                # create CommentCreate object for insert comment data
+                comments.append(CommentCreate(
+                    comment_id=reply["id"],
+                    video_id=video_id,
+                    author_display_name=rs["authorDisplayName"],
+                    text=rs["textDisplay"],
+                    published_at=rs["publishedAt"],
+                    updated_at=rs["updatedAt"],
+                    parent_id=item["id"]
+                ))
+
+        if items:
+            yield CommentPage(comments, reply_counts, behind_watermark=bool(last_fetch) and not comments)
+
+        # get next token token data
+        next_token = data.get("nextPageToken")
     
-            if not next_token or next_token == prev_page_token:
-                # if next token data is not available or already in the last page
-                break
-            
-            # setting new page token if next token data still available
-            prev_page_token = next_token
-            params["pageToken"] = next_token
+        if not next_token or next_token == prev_page_token:
+            # if next token data is not available or already in the last page
+            break
+        
+        # setting new page token if next token data still available
+        prev_page_token = next_token
+        params["pageToken"] = next_token
+
+async def _full_sync_due(video_id: str) -> bool:
+    # a full pass is due when the marker of the last one has expired
+    try:
+        return not await redis_client.exists(f"comments:full_sync:{video_id}")
+    except Exception as e:
+        # don't turn every sync into a full pass (and its quota) while redis is down
+        logger.warning(f"Full sync marker lookup failed: {e}")
+        return False
+
+async def _mark_full_sync(video_id: str):
+    try:
+        await redis_client.setex(f"comments:full_sync:{video_id}", COMMENT_FULL_SYNC_INTERVAL, 1)
+    except Exception as e:
+        logger.warning(f"Full sync marker write failed: {e}")
+
+async def ingest_comments(
+        db: AsyncSession,
+        video_id: str,
+        access_token: str,
+        last_fetch: datetime | None,
+        incremental: bool = True
+        ) -> int:
+    """
+    service to fetch new comments from youtube and upsert them page by page,
+    the next page is already being fetched while the current one is written to database.
+
+    incremental mode request threads newest first and stop at the first page where nothing is newer than last_fetch
+    and every thread still has the reply count stored for it. threads are ordered by their own publish time, so
+    a new reply or an edit under a thread older than that page is not seen: a full pass over every page run
+    instead once every COMMENT_FULL_SYNC_INTERVAL per video, which bound how late those changes show up
+    """
+    full = not incremental or last_fetch is None or COMMENT_FULL_SYNC_INTERVAL <= 0 or await _full_sync_due(video_id)
+    pages = iter_comment_pages(video_id, access_token, last_fetch, newest_first=not full)
+    next_page = asyncio.ensure_future(anext(pages, None))
+    total = 0
+    try:
+        while (page := await next_page) is not None:
+            if not full and page.behind_watermark:
+                # nothing new on this page, the next ones are older: stop unless a thread got new (or deleted) replies
+                if await get_thread_reply_counts(db, list(page.reply_counts)) == page.reply_counts:
+                    break
+            # request the next page before writing this one so network and database time overlap
+            next_page = asyncio.ensure_future(anext(pages, None))
+            await insert_comments(db, page.comments)
+            # remember reply count of every thread, also for old threads that were not re-inserted
+            await update_thread_reply_counts(db, page.reply_counts)
+            total += len(page.comments)
+    finally:
+        # the generator can only be closed once the pending read has stopped running it,
+        # its own error (if any) is dropped so the error being raised here is not hidden
+        next_page.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await next_page
+        await pages.aclose()
+
+    # youtube only inline a few replies in commentThreads, fetch the full thread when replies are missing
+    thread_ids = await get_threads_with_hidden_replies(db, video_id)
+    total += await ingest_replies(db, video_id, thread_ids, access_token)
+
+    if full:
+        await _mark_full_sync(video_id)
+    return total
+
+async def iter_reply_pages(
+        video_id: str,
+        parent_id: str,
+        access_token: str,
+        max_result: int = 100
+        ) -> AsyncIterator[List[CommentCreate]]:
+    """
+    service to get every reply of one comment thread page by page using comments.list
+    """
+    params = {
+        "part": "snippet",
+        "parentId": parent_id,
+        "maxResults": max_result
+    }
 
-    return comments
+    prev_page_token = None
+
+    while True:
+        res = await youtube_client.request("comments.list", access_token, params)
+
+        # fallback, quota errors are already raised by the client
+        if res.status_code == 403:
+            raise HTTPException(403, f"YouTube access forbidden: {error_reason(res)}")
+        if res.status_code == 404:
+            raise HTTPException(404, "Comment thread not found")
+
+        # get data
+        data = res.json()
+        replies = [
+            CommentCreate(
+                comment_id=reply["id"],
+                video_id=video_id,
+                author_display_name=reply["snippet"]["authorDisplayName"],
+                text=reply["snippet"]["textDisplay"],
+                published_at=reply["snippet"]["publishedAt"],
+                updated_at=reply["snippet"]["updatedAt"],
+                parent_id=parent_id
+            )
+            for reply in data.get("items", [])
+        ]
+        if replies:
+            yield replies
+
+        # get next token token data
+        next_token = data.get("nextPageToken")
+        if not next_token or next_token == prev_page_token:
+            break
+
+        prev_page_token = next_token
+        params["pageToken"] = next_token
 
-async def get_videos_handler(db: AsyncSession, playlist_id: str, page: int, limit: int):
+async def ingest_replies(db: AsyncSession, video_id: str, thread_ids: List[str], access_token: str) -> int:
     """
-    service to get history video from postgresql with pagination
+    service to fetch the replies of several threads concurrently (bounded by REPLY_FETCH_CONCURRENCY)
+    and upsert every page through one writer, because a database session can't be used concurrently.
+    the first error stop every other fetch (the client already retried transient ones), so an expired token
+    or a spent quota doesn't keep sending requests for the remaining threads.
+    threads fetched completely are marked, they are paged again only when their total_reply_count changes
     """
+    if not thread_ids:
+        return 0
+
+    pages: asyncio.Queue = asyncio.Queue(maxsize=REPLY_FETCH_CONCURRENCY * 2)
+    semaphore = asyncio.Semaphore(REPLY_FETCH_CONCURRENCY)
+    synced: List[str] = []
+
+    async def fetch_thread(thread_id: str):
+        async with semaphore:
+            try:
+                async for page in iter_reply_pages(video_id, thread_id, access_token):
+                    await pages.put(page)
+                synced.append(thread_id)
+            except Exception as e:
+                if isinstance(e, HTTPException) and e.status_code == 404:
+                    # thread was deleted after it was stored, nothing to fetch
+                    logger.warning(f"Reply thread {thread_id} not found")
+                    synced.append(thread_id)
+                    return
+                # stop the other fetches before this slot is given to the next thread
+                for task in tasks:
+                    if task is not asyncio.current_task():
+                        task.cancel()
+                raise
+
+    tasks = [asyncio.ensure_future(fetch_thread(thread_id)) for thread_id in thread_ids]
+    # done when every thread is fetched, or as soon as one fetch failed
+    fetchers = asyncio.gather(*tasks)
+    total = 0
+    try:
+        while True:
+            next_page = asyncio.ensure_future(pages.get())
+            done, _ = await asyncio.wait({next_page, fetchers}, return_when=asyncio.FIRST_COMPLETED)
+            if next_page in done:
+                page = next_page.result()
+                await insert_comments(db, page)
+                total += len(page)
+                continue
+
+            # every thread is fetched (or one failed and stopped the others), write what's left in the queue then surface fetch errors
+            next_page.cancel()
+            while not pages.empty():
+                page = pages.get_nowait()
+                await insert_comments(db, page)
+                total += len(page)
+            # every page of these threads is written, even if another fetch failed
+            await mark_replies_synced(db, synced)
+            fetchers.result()
+            break
+    finally:
+        for task in tasks:
+            task.cancel()
+        # wait for the cancelled fetches, so none of them is still running (or sending requests) after this returns
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    return total
+
+async def sync_video(db: AsyncSession, item: dict, playlist_id: str, access_token: str) -> VideoFetchSummary | None:
+    """
+    service to store one playlist item as video, then fetch and store its new comments
+    """
+    # get needed data from videos data
+    snippet = item.get("snippet", {})
+    content = item.get("contentDetails", {})
+    video_id = content.get("videoId")
+    if not video_id:
+        return None
+
+    try:
+        # check if video is already available in database
+        stored_video = await get_video_by_id(db, video_id)
+        if not stored_video:
+            # if not then create new one
+            video_payload = VideoCreate(
+                video_id=video_id,
+                channel_id=snippet.get("channelId"),
+                playlist_id=playlist_id or snippet.get("playlistId", ""),
+                title=snippet.get("title", ""),
+                description=snippet.get("description"),
+                published_at=snippet.get("publishedAt"),
+            )
+            # perform insert video data
+            stored_video = await insert_video(db, video_payload)
+
+        # get related comment from video and insert them page by page
+        new_comment_count = await ingest_comments(db, video_id, access_token, stored_video.last_fetch_comment)
+        # update last fetch comment in video table
+        await update_last_fetch_comment(db, video_id)
+
+        # return video and comment data for client
+        return VideoFetchSummary(
+            video_id=video_id,
+            title=stored_video.title,
+            published_at=stored_video.published_at,
+            new_comment_count=new_comment_count
+        )
+    except Exception as e:
+        logger.error(f"Failed syncing comments for video {video_id}", exc_info=True)
+        await db.rollback()
+        return VideoFetchSummary(video_id=video_id, error=str(e.detail if isinstance(e, HTTPException) else e))
+
+async def _cached_count(key: str, count: Callable[[], Awaitable[int]]) -> int:
+    # listing totals are cached for a short time, so paging doesn't run count() on every request
+    try:
+        cached = await redis_client.get(key)
+        if cached is not None:
+            return int(cached)
+    except Exception as e:
+        logger.warning(f"Count cache lookup failed: {e}")
+
+    total = await count()
+    try:
+        await redis_client.setex(key, COUNT_CACHE_TTL, total)
+    except Exception as e:
+        logger.warning(f"Count cache write failed: {e}")
+    return total
+
+def _parse_cursor(cursor: str | None) -> tuple[datetime | None, str] | None:
+    if not cursor:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def get_videos_handler(db: AsyncSession, playlist_id: str, page: int, limit: int, cursor: str | None = None):
+    """
+    service to get history video from postgresql with pagination, every video come with its comment stats,
+    cursor (next_cursor of previous page) is used instead of page when it's given
+    """
+    position = _parse_cursor(cursor)
     # get total video
-    total = await get_count_videos(db, playlist_id)
-    # get video data
-    videos = await get_videos(db, playlist_id, page, limit)
+    total = await _cached_count(f"count:videos:{playlist_id}", lambda: get_count_videos(db, playlist_id))
+    # get video data, one more row tell if there is a next page
+    videos = await get_videos(db, playlist_id, page, limit + 1, position)
+    has_next = len(videos) > limit
+    videos = videos[:limit]
     
     if not videos:
         # fallback when video data is not found
@@ -179,28 +453,41 @@ async def get_videos_handler(db: AsyncSession, playlist_id: str, page: int, limi
         "total": total,
         "page": page,
         "page_size": limit,
-        "has_next": page * limit < total
+        "has_next": has_next,
+        "next_cursor": encode_cursor(videos[-1].published_at, videos[-1].video_id) if has_next else None
     }
 
-async def get_video_comments(db: AsyncSession, video_id: str, access_token: str, page: int, limit: int):
+async def sync_video_comments(db: AsyncSession, video_id: str, access_token: str) -> int:
     """
-    service to get all comment from database for video with pagination
+    service to fetch new comment from youtube for a stored video and upsert them to database, used by the background sync job
     """
-    # get video data
     video = await get_video_by_id(db, video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
 
-    # fetch comment data from youtube first to get new comment
-    new_comments = await fetch_comments(video_id, access_token, video.last_fetch_comment)
-    await insert_comments(db, new_comments or [])
+    total = await ingest_comments(db, video_id, access_token, video.last_fetch_comment)
     await update_last_fetch_comment(db, video_id)
+    return total
 
-    # fetch comment data from database
-    comments = await get_comments(db, video_id, page, limit)
-    total = await get_count_comments(db, video_id)
-
-    # fallback when there isn't video or comment data
+async def get_video_comments(db: AsyncSession, video_id: str, page: int, limit: int, cursor: str | None = None):
+    """
+    service to get all comment from database for video with pagination, new comment are fetched by a background job.
+    cursor (next_cursor of previous page) is used instead of page when it's given
+    """
+    position = _parse_cursor(cursor)
+    # get video data
+    video = await get_video_by_id(db, video_id)
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
+
+    # fetch comment data from database, one more row tell if there is a next page
+    comments = await get_comments(db, video_id, page, limit + 1, position)
+    has_next = len(comments) > limit
+    comments = comments[:limit]
+    # maintained by every comment write, loaded with the video
+    total = video.stats.comment_count if video.stats else 0
+
+    # fallback when there isn't comment data
     if not comments:
         raise HTTPException(status_code=404, detail="No comments found")
 
@@ -211,20 +498,27 @@ async def get_video_comments(db: AsyncSession, video_id: str, access_token: str,
         "total": total,
         "page": page,
         "page_size": limit,
-        "has_next": page * limit < total
+        "has_next": has_next,
+        "next_cursor": encode_cursor(comments[-1].published_at, comments[-1].comment_id) if has_next else None
     }
 
 def _chunkify(data: List[str], size: int) -> List[List[str]]:
     # function to create chunk comment for update moderation status to google
     return [data[i:i + size] for i in range(0, len(data), size)]
 
+class ModerationResult(NamedTuple):
+    # result of one setModerationStatus call
+    ok: bool
+    transient: bool # worth retrying the same ids later (429/5xx after the client retries, network error)
+    reason: str | None
+    fatal: bool = False # not caused by the ids (expired token, no permission, bad request), every other call would fail the same way
+
 async def update_moderation_status_batch(
-        client: httpx.AsyncClient, 
         access_token: str,
         ids: List[str], 
         moderation_status: str = "heldForReview",
         ban_author: bool = False
-        ) -> bool:
+        ) -> ModerationResult:
         """
         service to update moderation status when deleting comment that classified as promotion online gambling
         """
@@ -237,22 +531,82 @@ async def update_moderation_status_batch(
                 params["banAuthor"] = "true" if ban_author else "false"
 
             # request to google to update moderation status
-            response: httpx.Response = await client.post(
-                YOUTUBE_MODERATION_URL,
-                params=params,
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
+            response = await youtube_client.request("comments.setModerationStatus", access_token, params)
 
             if response.status_code == 204:
                 logger.info(f"Moderated {len(ids)} comments.")
-                return True
-            else:
-                logger.warning(f"Failed batch of {len(ids)} - {response.status_code}: {response.text}")
-                return False
+                return ModerationResult(True, False, None)
+
+            reason = error_reason(response) or ("authError" if response.status_code == 401 else str(response.status_code))
+            logger.warning(f"Failed batch of {len(ids)} - {response.status_code}: {reason}")
+            transient = response.status_code == 429 or response.status_code >= 500
+            # only 404 and the id reasons of a 400 can come from one bad id in the call
+            caused_by_id = response.status_code == 404 or reason in MODERATION_ID_REASONS
+            return ModerationResult(False, transient, reason, fatal=not transient and not caused_by_id)
+
+        except HTTPException as e:
+            if e.status_code == 429:
+                # quota spent, smaller batches would fail too
+                raise
+            # network error after the client retries
+            return ModerationResult(False, True, e.detail)
+
+async def dispatch_moderation(
+    access_token: str,
+    comment_ids: List[str],
+    moderation_status: str = "heldForReview",
+    ban_author: bool = False
+) -> Dict[str, str]:
+    """
+    service to update moderation status of many comments: chunks are sent concurrently,
+    a chunk that fail because of one of its ids (MODERATION_ID_REASONS, 404) is split in half until the bad ids are found,
+    a chunk that fail transiently is retried as it is, and any other error (401/403, request level 400) stop every call
+    since none of them can succeed. return outcome of every id:
+    moderated | failed:<reason> (permanent, e.g. comment deleted) | retry_exhausted:<reason> | quota_exceeded
+    | aborted:<reason> (not sent, or sent and refused, after an auth/permission/request error)
+    """
+    outcomes: Dict[str, str] = {}
+    semaphore = asyncio.Semaphore(MODERATION_CONCURRENCY)
+    aborted: List[str] = [] # reason of the first fatal error
 
-        except Exception as e:
-            logger.error(f"Exception during batch: {e}", exc_info=True)
-            return False
+    async def moderate(chunk: List[str], retries_left: int):
+        try:
+            async with semaphore:
+                if aborted:
+                    outcomes.update(dict.fromkeys(chunk, f"aborted:{aborted[0]}"))
+                    return
+                result = await update_moderation_status_batch(access_token, chunk, moderation_status, ban_author)
+        except HTTPException:
+            outcomes.update(dict.fromkeys(chunk, "quota_exceeded"))
+            return
+
+        if result.ok:
+            outcomes.update(dict.fromkeys(chunk, "moderated"))
+        elif result.fatal:
+            aborted.append(result.reason)
+            outcomes.update(dict.fromkeys(chunk, f"aborted:{aborted[0]}"))
+        elif result.transient:
+            if not retries_left:
+                outcomes.update(dict.fromkeys(chunk, f"retry_exhausted:{result.reason}"))
+                return
+            # wait outside the semaphore so other chunks keep going
+            await asyncio.sleep(random.uniform(0, MODERATION_RETRY_DELAY * 2 ** (MODERATION_RETRIES - retries_left)))
+            await moderate(chunk, retries_left - 1)
+        elif len(chunk) == 1:
+            outcomes[chunk[0]] = f"failed:{result.reason}"
+        else:
+            # one bad id fail the whole call, bisect to isolate it
+            middle = len(chunk) // 2
+            await asyncio.gather(
+                moderate(chunk[:middle], MODERATION_RETRIES),
+                moderate(chunk[middle:], MODERATION_RETRIES)
+            )
+
+    unique_ids = list(dict.fromkeys(comment_ids))
+    await asyncio.gather(*(
+        moderate(chunk, MODERATION_RETRIES) for chunk in _chunkify(unique_ids, MODERATION_BATCH_SIZE)
+    ))
+    return outcomes
 
 async def delete_comments_by_ids(
     db: AsyncSession,
@@ -260,7 +614,7 @@ async def delete_comments_by_ids(
     comment_ids: list[str],
     moderation_status: str = "heldForReview", # rejected
     ban_author: bool = False
-) -> int:
+) -> dict:
     """
     service to delete comment that classified as online gambling promotion by update moderation status to google and database
     """
@@ -268,94 +622,110 @@ async def delete_comments_by_ids(
         # fallback when comment_ids data is empty
         raise HTTPException(status_code=400, detail="Empty comment_ids list")
 
-    success_ids: List[str] = []
     # Update on YouTube
-    async with httpx.AsyncClient() as client:
-        for chunk in _chunkify(comment_ids, 100):  # Try 100 first
-            if await update_moderation_status_batch(client, access_token, chunk, moderation_status, ban_author):
-                success_ids.extend(chunk)
-            else:
-                for chunk50 in _chunkify(chunk, 50):  # Try 50 fallback
-                    if await update_moderation_status_batch(client, access_token, chunk50, moderation_status, ban_author):
-                        success_ids.extend(chunk50)
-                    else:
-                        for chunk25 in _chunkify(chunk50, 25):  # Final fallback
-                            if await update_moderation_status_batch(client, access_token, chunk25, moderation_status, ban_author):
-                                success_ids.extend(chunk25)
-                            else:
-                                logger.error(f"❌ Final fallback failed for: {chunk25}")
-    
+    outcomes = await dispatch_moderation(access_token, comment_ids, moderation_status, ban_author)
+    success_ids = [comment_id for comment_id, outcome in outcomes.items() if outcome == "moderated"]
+    failed = {comment_id: outcome for comment_id, outcome in outcomes.items() if outcome != "moderated"}
+    if failed:
+        logger.error(f"Failed to moderate {len(failed)} of {len(outcomes)} comments")
+        # youtube will keep refusing these ids, auto moderation skip them from now on
+        await update_moderation_errors(db, {
+            comment_id: outcome[len("failed:"):] for comment_id, outcome in failed.items() if outcome.startswith("failed:")
+        })
+
     if not success_ids:
+        if all(outcome == "quota_exceeded" for outcome in outcomes.values()):
+            raise HTTPException(status_code=429, detail="YouTube quota exceeded")
+        aborted = next((outcome for outcome in outcomes.values() if outcome.startswith("aborted:")), None)
+        if aborted:
+            reason = aborted[len("aborted:"):]
+            # the rest is a bad request, e.g. banWithoutReject
+            status_code = 401 if reason == "authError" else 403 if reason in ("forbidden", "insufficientPermissions") else 400
+            raise HTTPException(status_code=status_code, detail=f"YouTube refused the moderation: {reason}")
         raise HTTPException(status_code=500, detail="All moderation attempts failed.")
     
     # Update on DB
     row_count = await update_moderation_status_comment(db, success_ids, moderation_status)
 
-    return row_count
+    return {"updated": row_count, "failed": failed}
 
 async def predict_comment(
     db: AsyncSession,
-    video_id: str
-) -> list[str]:
+    video_id: str,
+    incremental: bool = True
+) -> dict:
     """
-    service to classified comment data using machine learning
+    service to classified comment data using machine learning,
+    incremental mode only score comment that never scored, changed, or scored by an older model
     """
     if not video_id:
         # fallback when video_id is not available
         raise HTTPException(status_code=400, detail="Video_id is required")
     
-    # fetch all comment
-    comments = await get_all_comments(db, video_id)
-    if not comments:
-        # fallback when comments is empty
-        return []
-    
-    # text processing
-    texts = [normalize_text(c.text) for c in comments]
-    # stored comment_ids
-    comment_ids = [c.comment_id for c in comments]
+    # fetch comment that need to be scored
+    if incremental:
+        comments = await get_unscored_comments(db, video_id, MODEL_VERSION)
+    else:
+        comments = await get_all_comments(db, video_id)
+
+    if comments:
+        # stored comment_ids
+        comment_ids = [c.comment_id for c in comments]
+
+        # normalized text and hash stored at ingest, text processing only for comments stored before
+        # or by an older normalization
+        current = [c.preprocessing_version == PREPROCESSING_VERSION for c in comments]
+        texts = [c.normalized_text if ok else None for c, ok in zip(comments, current)]
+        hashes = [c.content_hash if ok else None for c, ok in zip(comments, current)]
+        stale = [i for i, ok in enumerate(current) if not ok]
+        if stale:
+            normalized = await asyncio.to_thread(normalize_many, [comments[i].text for i in stale])
+            for i, text in zip(stale, normalized):
+                texts[i], hashes[i] = text, content_hash(text)
+
+        # same text already scored by this model (spam repeated in other comments/videos) is not predicted again,
+        # a full re-score always goes to the model
+        known = await get_predictions_by_hash(db, hashes, MODEL_VERSION) if incremental else {}
+        outputs = [known.get(h) for h in hashes]
+        todo = [i for i, output in enumerate(outputs) if output is None]
+
+        if todo:
+            # token ids stored at ingest go straight to the model, only when the same tokenizer/normalization made them
+            token_ids = None
+            if tokenization.TOKENIZE_AT_INGEST and tokenization.tokenizer_version:
+                token_ids = [
+                    comments[i].token_ids if comments[i].tokenizer_version == tokenization.tokenizer_version else None
+                    for i in todo
+                ]
+
+            # model inference in the worker pool for texts that are not cached yet
+            predicted = await predict_normalized([texts[i] for i in todo], token_ids)
+            for i, output in zip(todo, predicted):
+                outputs[i] = output
+        results: list[dict] = [
+            {
+                "comment_id": idx,
+                "is_judi": pred,
+                "confidence": conf
+            }
+            for idx, (pred, conf) in zip(comment_ids, outputs)
+        ]
 
-    # create comment dataset from text
-    comments_dataset = Dataset.from_dict({"text": texts})
-    
-    # model inference
-    model_indobert.to(device)
-    model_indobert.eval()
-
-    # create data loader to create batch of comment data so inference will be faster
-    dataloader = DataLoader(comments_dataset, batch_size=64)
-    results: list[dict] = []
-
-    with torch.no_grad(): # turn of gradient calculation
-        # iterate through each batch
-        for i, batch in enumerate(dataloader):
-            # tokenize input
-            batch_inputs = tokenizer_indobert(batch['text'], return_tensors='pt', truncation=True, padding=True, max_length=512)
-            batch_inputs = {k: v.to(device) for k, v in batch_inputs.items()}
-            
-            # get logits/output data
-            outputs = model_indobert(**batch_inputs)
-
-            # calculating the probability based on logits
-            probs = F.softmax(outputs.logits, dim=1)
-
-            # get the prediction by find the max value of probability and get the index of it
-            preds = torch.argmax(probs, dim=1).tolist()
-
-            # calculate the confidence based on probability
-            confs = torch.max(probs, dim=1).values.tolist()
-
-            # store prediction data
-            start_idx = i * dataloader.batch_size
-            end_idx = start_idx + len(preds)
-            for idx, pred, conf in zip(comment_ids[start_idx:end_idx], preds, confs):
-                results.append({
-                    "comment_id": idx,
-                    "is_judi": bool(pred),
-                    "confidence": conf
-                })
-    
-    # update data after prediction
-    await update_comments_prediction_batch(db, results)
-    # return only predicted as judi
-    return {"predictions": [r for r in results if r["is_judi"]]}
\ No newline at end of file
+        # update data after prediction
+        await update_comments_prediction_batch(db, results, MODEL_VERSION)
+
+    # return every comment predicted as judi, including the one scored in previous call
+    flagged = await get_flagged_comments(db, video_id)
+    return {"predictions": [dict(row) for row in flagged]}
+
+async def get_youtube_stats() -> dict:
+    """
+    service to get youtube quota units used today and request metrics
+    """
+    return await youtube_client.stats()
+
+def get_inference_stats() -> dict:
+    """
+    service to get prediction cache and cascade counters
+    """
+    return {"cache": prediction_cache.stats(), "cascade": cascade.stats() if cascade else None}
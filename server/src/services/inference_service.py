@@ -0,0 +1,313 @@
+# src/services/inference_service.py
+"""
+inference execution layer: the model runs in a pool of worker processes so the event loop is never blocked,
+comments from all in-flight predict requests are grouped into shared micro-batches before going to a worker
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import multiprocessing
+import asyncio
+import logging
+import os
+
+from src.core.prediction_cache import PredictionCache
+from src.services import inference_worker
+from src.services.cascade import load_cascade
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1")) # number of worker processes
+INFERENCE_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "1")) # torch threads for each worker
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch") # torch | torch-int8 | onnx | onnx-int8
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "4096")) # max comments waiting to be batched
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "30")) # seconds to wait for a slot in the queue
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "64")) # max comments in one forward pass
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10")) # max time a batch waits to be filled
+MODEL_VERSION = os.getenv("MODEL_VERSION", "indobert-lite-p2-v1") # change it every time best_indobert.pt is replaced
+if INFERENCE_BACKEND != "torch":
+    # quantized/exported backend give slightly different scores, don't mix them in cache and database
+    MODEL_VERSION = f"{MODEL_VERSION}+{INFERENCE_BACKEND}"
+# first stage classifier (CASCADE_ENABLED), its decisions depend on the model file and band
+cascade = load_cascade()
+if cascade:
+    MODEL_VERSION = f"{MODEL_VERSION}+cascade-{cascade.version}"
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "100000")) # max predictions kept in memory
+PREDICTION_CACHE_REDIS = os.getenv("PREDICTION_CACHE_REDIS", "false").lower() == "true" # share the cache through redis
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", str(3600 * 24 * 7))) # seconds a prediction live in redis
+
+class InferencePool:
+    def __init__(
+            self,
+            workers: int = INFERENCE_WORKERS,
+            torch_threads: int = INFERENCE_TORCH_THREADS,
+            backend: str = INFERENCE_BACKEND,
+            queue_size: int = INFERENCE_QUEUE_SIZE,
+            queue_timeout: float = INFERENCE_QUEUE_TIMEOUT,
+            max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms: float = INFERENCE_MAX_WAIT_MS
+            ):
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.backend = backend
+        self.queue_timeout = queue_timeout
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.state = "stopped" # stopped | loading | ready | failed
+        self.error: str | None = None
+        self.restarts = 0
+        self._executor: ProcessPoolExecutor | None = None
+        self._scheduler: asyncio.Task | None = None
+        self._restarting: asyncio.Task | None = None
+        # batches in flight, referenced here so they are not garbage collected and can be drained
+        self._batches: set[asyncio.Task] = set()
+        # pending ((text, token_ids), future) items, callers have to wait for a slot when it is full (backpressure)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # one batch in flight for each worker, the rest keep filling up in the queue
+        self._free_workers = asyncio.Semaphore(workers)
+
+    async def start(self):
+        """
+        create the worker processes and the batch scheduler, then warm up the workers.
+        the model is loaded once in each worker, run it in background so startup is not blocked
+        """
+        if self._executor:
+            return
+        logger.info(f"Starting {self.backend} inference pool with {self.workers} workers x {self.torch_threads} threads")
+        self._scheduler = asyncio.create_task(self._schedule_batches())
+        await self._load()
+
+    async def _load(self):
+        # new worker processes, queued and new batches go to them while they load
+        self.state = "loading"
+        self.error = None
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"), # fork is not safe with torch threads
+            initializer=inference_worker.init_worker,
+            initargs=(self.torch_threads, self.backend)
+        )
+
+        try:
+            # one warm-up job for each worker: load the model and run a few forward passes
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, inference_worker.warm_up) for _ in range(self.workers)
+            ))
+        except Exception as e:
+            logger.error("Failed to load the inference model", exc_info=True)
+            self.state = "failed"
+            self.error = str(e) or type(e).__name__
+            return
+
+        self.state = "ready"
+        logger.info("Inference pool is ready")
+
+    async def _restart(self, broken: ProcessPoolExecutor):
+        """
+        a worker process died (OOM, segfault), the executor is broken for good and fail every call:
+        replace it with new workers, /ready report loading until they are warmed up again.
+        the batches already sent to the dead pool fail with 503, queued ones wait for the new workers
+        """
+        if self._executor is not broken or self.state == "stopped":
+            # already replaced by another failed batch, or shutting down
+            return
+        logger.error("Inference worker process died, restarting the inference pool")
+        self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True) # dead pool, nothing to wait for
+        # batches sent to the dead pool fail fast, let them answer their callers before the new workers load
+        await self._drain_batches()
+        await self._load()
+
+    def status(self) -> dict:
+        """
+        model state for the readiness probe
+        """
+        return {
+            "state": self.state,
+            "backend": self.backend,
+            "workers": self.workers,
+            "model_version": MODEL_VERSION,
+            "error": self.error,
+            "restarts": self.restarts,
+        }
+
+    async def shutdown(self):
+        """
+        stop the scheduler and the worker processes, waiting callers get an error
+        """
+        self.state = "stopped"
+        if not self._executor:
+            return
+        self._scheduler.cancel()
+        if self._restarting:
+            self._restarting.cancel()
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(HTTPException(status_code=503, detail="Inference pool is shutting down"))
+
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+        await self._drain_batches()
+
+    async def _drain_batches(self):
+        # wait for the batches in flight, every caller gets a result or an error
+        current = asyncio.current_task()
+        batches = [task for task in self._batches if task is not current]
+        if batches:
+            await asyncio.gather(*batches, return_exceptions=True)
+
+    async def _collect_batch(self) -> list[list[tuple[tuple[str, bytes | None], asyncio.Future]]]:
+        # block until there is at least one comment, then fill the batch until it's full or the deadline passed
+        window = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(window) < self.max_batch_size:
+            if not self._queue.empty():
+                window.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                window.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # under load take what is already queued for the other workers too, up to one batch per worker,
+        # and cut the window by length so comments of several requests are padded to a similar length
+        while len(window) < self.max_batch_size * self.workers and not self._queue.empty():
+            window.append(self._queue.get_nowait())
+
+        # skip comments whose caller has already gone away
+        window = sorted(((item, future) for item, future in window if not future.done()), key=lambda entry: len(entry[0][0]))
+        return [window[i:i + self.max_batch_size] for i in range(0, len(window), self.max_batch_size)]
+
+    async def _schedule_batches(self):
+        while True:
+            await self._free_workers.acquire()
+            try:
+                batches = await self._collect_batch()
+            except BaseException:
+                self._free_workers.release()
+                raise
+
+            if not batches:
+                self._free_workers.release()
+                continue
+            for i, batch in enumerate(batches):
+                try:
+                    if i:
+                        # the first batch got the worker acquired above, the others wait for their own
+                        await self._free_workers.acquire()
+                except BaseException:
+                    for _, future in (entry for rest in batches[i:] for entry in rest):
+                        if not future.done():
+                            future.set_exception(HTTPException(status_code=503, detail="Inference pool is shutting down"))
+                    raise
+                task = asyncio.create_task(self._run_batch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list[tuple[tuple[str, bytes | None], asyncio.Future]]):
+        # one forward pass for comments coming from several requests, results go back to each caller's future
+        executor = self._executor
+        try:
+            loop = asyncio.get_running_loop()
+            outputs = await loop.run_in_executor(
+                executor, inference_worker.predict_texts,
+                [text for (text, _), _ in batch], [token_ids for (_, token_ids), _ in batch]
+            )
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+        except BrokenProcessPool:
+            logger.error(f"Inference batch of {len(batch)} comments failed, a worker process died", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(HTTPException(status_code=503, detail="Inference worker crashed, restarting"))
+            if not (self._restarting and not self._restarting.done()):
+                self._restarting = asyncio.create_task(self._restart(executor))
+        except asyncio.CancelledError:
+            # executor shut down with the batch still pending
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(HTTPException(status_code=503, detail="Inference pool is shutting down"))
+            raise
+        except Exception as e:
+            logger.error(f"Inference batch of {len(batch)} comments failed", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._free_workers.release()
+
+    async def predict(self, texts: list[str], token_ids: list[bytes | None] | None = None) -> list[tuple[bool, float]]:
+        """
+        classify normalized texts in the worker pool, return (is_judi, confidence) for each text in the same order.
+        token_ids are optional ids stored at ingest, the worker skip tokenization for them
+        """
+        if not self._executor or self.state == "failed":
+            # while the model is still loading, requests just wait in the queue
+            raise HTTPException(status_code=503, detail="Inference model is not available")
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        token_ids = token_ids or [None] * len(texts)
+        try:
+            # enqueue shortest first so consecutive batches hold comments of similar length,
+            # each text keeps its own future so the results stay in the original order
+            for i in sorted(range(len(texts)), key=lambda i: len(texts[i])):
+                # wait for a slot in the bounded queue
+                await asyncio.wait_for(self._queue.put(((texts[i], token_ids[i]), futures[i])), timeout=self.queue_timeout)
+            return list(await asyncio.gather(*futures))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Inference queue is full, try again later")
+        finally:
+            # don't spend forward passes on a request that failed or was cancelled
+            for future in futures:
+                future.cancel()
+
+inference_pool = InferencePool()
+prediction_cache = PredictionCache(
+    model_version=MODEL_VERSION,
+    max_size=PREDICTION_CACHE_SIZE,
+    use_redis=PREDICTION_CACHE_REDIS,
+    redis_ttl=PREDICTION_CACHE_TTL
+)
+
+async def predict_normalized(texts: list[str], token_ids: list[bytes | None] | None = None) -> list[tuple[bool, float]]:
+    """
+    classify normalized texts, texts decided by the cascade or found in the prediction cache don't go to the model.
+    token_ids are optional ids stored at ingest for the same texts
+    """
+    # duplicated spam collapse into one key, so it's predicted once
+    keys = [prediction_cache.key(text) for text in texts]
+    unique = dict(zip(keys, texts))
+    stored_ids = {key: ids for key, ids in zip(keys, token_ids or []) if ids}
+
+    predictions = {}
+    if cascade:
+        # obvious benign/judi comments are decided in microseconds, only the uncertain band goes further
+        decisions = await asyncio.to_thread(cascade.predict, list(unique.values()))
+        predictions = {key: decision for key, decision in zip(unique, decisions) if decision}
+    undecided = [key for key in unique if key not in predictions]
+    if undecided:
+        predictions.update(await prediction_cache.get_many(undecided))
+
+    missing = [key for key in unique if key not in predictions]
+    if missing:
+        outputs = await inference_pool.predict(
+            [unique[key] for key in missing], [stored_ids.get(key) for key in missing]
+        )
+        new_predictions = dict(zip(missing, outputs))
+        await prediction_cache.set_many(new_predictions)
+        predictions.update(new_predictions)
+
+    return [predictions[key] for key in keys]
@@ -0,0 +1,134 @@
+# src/services/inference_worker.py
+"""
+code that runs inside the inference worker processes, each worker load its own copy of the model once.
+torch and transformers are only imported inside the worker, so the API process never load them
+"""
+import os
+
+import numpy as np
+
+from src.utils import tokenization
+
+# model path
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "..", "..", "models")
+MODEL_PATH = os.path.join(MODEL_DIR, "best_indobert.pt")
+ONNX_MODEL_PATH = os.path.join(MODEL_DIR, "best_indobert.onnx") # exported by engine/export_onnx.py
+ONNX_INT8_MODEL_PATH = os.path.join(MODEL_DIR, "best_indobert.int8.onnx")
+MODEL_NAME = "indobenchmark/indobert-lite-base-p2"
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+BATCH_SIZE = 64
+
+# per process state, filled by init_worker
+forward_logits = None # padded numpy inputs -> numpy logits, depend on the backend
+
+def _load_torch_backend(backend: str, num_threads: int):
+    # fp32 model, or with linear layers dynamically quantized to int8 for CPU
+    from transformers import AutoModelForSequenceClassification
+    import torch
+
+    # limit intra-op threads so several workers don't fight over the same cores
+    torch.set_num_threads(num_threads)
+    device = "cuda" if torch.cuda.is_available() and backend == "torch" else "cpu"
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME, num_labels=2)
+    model.load_state_dict(torch.load(MODEL_PATH, weights_only=True, map_location=device))
+    model.eval()
+    if backend == "torch-int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.to(device)
+
+    def forward(inputs: dict) -> np.ndarray:
+        with torch.no_grad(): # turn of gradient calculation
+            outputs = model(**{k: torch.from_numpy(v).to(device) for k, v in inputs.items()})
+        return outputs.logits.cpu().numpy()
+    return forward
+
+def _load_onnx_backend(backend: str, num_threads: int):
+    # onnxruntime is only needed when an onnx backend is selected
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = num_threads
+    session = ort.InferenceSession(
+        ONNX_INT8_MODEL_PATH if backend == "onnx-int8" else ONNX_MODEL_PATH,
+        options,
+        providers=["CPUExecutionProvider"]
+    )
+
+    def forward(inputs: dict) -> np.ndarray:
+        return session.run(["logits"], {k: v.astype(np.int64) for k, v in inputs.items()})[0]
+    return forward
+
+def init_worker(num_threads: int, backend: str = "torch"):
+    """
+    initializer for each worker process: load tokenizer and model for the selected backend, limited to num_threads.
+    torch is only imported by the torch backends
+    """
+    global forward_logits
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend}, expected one of {BACKENDS}")
+
+    try:
+        if backend.startswith("onnx"):
+            forward_logits = _load_onnx_backend(backend, num_threads)
+        else:
+            forward_logits = _load_torch_backend(backend, num_threads)
+        # fast tokenizer, same ids as BertTokenizer (checked by benchmark_tokenizer.py)
+        tokenization.load_tokenizer(from_hub=True)
+    except Exception as e:
+        print(f"Error loading model or tokenizer: {e}")
+        raise e
+
+def length_buckets(lengths: list[int], batch_size: int) -> list[list[int]]:
+    """
+    sort indices by token length and cut them into batches, so each batch is padded to a similar length
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+def predict_texts(texts: list[str], token_ids: list[bytes | None] | None = None) -> list[tuple[bool, float]]:
+    """
+    classify normalized comment texts, return (is_judi, confidence) for each text in the same order.
+    token_ids are the ids stored at ingest, only texts without them are tokenized here
+    """
+    token_ids = token_ids or [None] * len(texts)
+    sequences = [tokenization.unpack(ids) if ids else None for ids in token_ids]
+
+    # tokenize without padding first, padding is done per bucket
+    missing = [i for i, ids in enumerate(sequences) if ids is None]
+    if missing:
+        for i, ids in zip(missing, tokenization.encode([texts[i] for i in missing])):
+            sequences[i] = ids
+    lengths = [len(ids) for ids in sequences]
+    results: list[tuple[bool, float]] = [None] * len(texts)
+
+    # iterate through each bucket of similar length comments
+    for bucket in length_buckets(lengths, BATCH_SIZE):
+        batch_inputs = tokenization.pad_batch([sequences[i] for i in bucket])
+
+        # get logits/output data
+        logits = forward_logits(batch_inputs)
+
+        # calculating the probability based on logits
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs = exp / exp.sum(axis=1, keepdims=True)
+
+        # get the prediction and the confidence from the max value of probability
+        preds = probs.argmax(axis=1)
+        confs = probs.max(axis=1)
+
+        # put the result back in the original position
+        for i, pred, conf in zip(bucket, preds.tolist(), confs.tolist()):
+            results[i] = (bool(pred), conf)
+
+    return results
+
+def warm_up() -> int:
+    """
+    run a few forward passes with different lengths so the first real request doesn't pay the setup cost
+    """
+    samples = ["mantap", "semoga sehat selalu semuanya", "slot gacor maxwin hari ini daftar sekarang " * 8]
+    for _ in range(2):
+        predict_texts(samples)
+    return os.getpid()
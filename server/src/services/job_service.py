@@ -0,0 +1,160 @@
+# src/services/job_service.py
+"""
+background jobs for the slow per-video work (fetch + upsert comments from youtube, model prediction),
+so read endpoints only query postgresql. jobs run on asyncio workers in this process,
+job status is kept in redis so it can be polled from any api process
+"""
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import asyncio
+import logging
+import json
+import uuid
+import os
+
+from src.core.session import redis_client
+from src.core.youtube_client import quota_user
+from src.database.init import AsyncSessionLocal
+from src.services.content_service import sync_video_comments, predict_comment
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2")) # jobs running at the same time
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000")) # max jobs waiting to run
+JOB_TTL = int(os.getenv("JOB_TTL", str(3600 * 24))) # seconds a job status can still be polled
+JOB_LOCK_TTL = int(os.getenv("JOB_LOCK_TTL", "1800")) # max seconds a video stay locked if the process die mid-job
+JOB_KINDS = ("sync", "predict", "refresh") # refresh = sync then predict
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _lock_key(video_id: str) -> str:
+    return f"job:lock:video:{video_id}"
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, queue_size: int = JOB_QUEUE_SIZE):
+        self.workers = workers
+        # (job, access_token, user_id), the token stays in memory and is never written to redis
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        """
+        start the job workers
+        """
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def shutdown(self):
+        """
+        stop the workers, running and queued jobs are marked as failed so pollers don't wait forever
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        while not self._queue.empty():
+            job, _, _ = self._queue.get_nowait()
+            try:
+                await self._finish(job, "failed", error="Server shutting down")
+            except Exception as e:
+                logger.warning(f"Failed to update job {job['job_id']}: {e}")
+
+    async def enqueue(self, kind: str, video_id: str, access_token: str, user_id: str | None = None) -> dict:
+        """
+        add a job for the video, when a job is already queued or running for it that job is returned instead
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind}, expected one of {JOB_KINDS}")
+
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "kind": kind,
+            "video_id": video_id,
+            "status": "queued", # queued | running | done | failed
+            "created_at": _now(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+
+        # deduplication: one active job per video whatever its kind, also between api processes,
+        # so a sync and a refresh of the same video never upsert its comments at the same time
+        lock_key = _lock_key(video_id)
+        if not await redis_client.set(lock_key, job["job_id"], nx=True, ex=JOB_LOCK_TTL):
+            active_id = await redis_client.get(lock_key)
+            active = await self.get(active_id) if active_id else None
+            if active:
+                return active
+            # the lock outlived its job, take it over
+            await redis_client.set(lock_key, job["job_id"], ex=JOB_LOCK_TTL)
+
+        await self._save(job)
+        try:
+            self._queue.put_nowait((job, access_token, user_id))
+        except asyncio.QueueFull:
+            await self._finish(job, "failed", error="Job queue is full")
+        return job
+
+    async def get(self, job_id: str) -> dict | None:
+        """
+        get job status by job id
+        """
+        data = await redis_client.get(f"job:{job_id}")
+        return json.loads(data) if data else None
+
+    async def _save(self, job: dict):
+        await redis_client.setex(f"job:{job['job_id']}", JOB_TTL, json.dumps(job, default=str))
+
+    async def _finish(self, job: dict, status: str, result=None, error: str | None = None):
+        job.update(status=status, finished_at=_now(), result=result, error=error)
+        await self._save(job)
+        # release the video only if the lock still belong to this job
+        lock_key = _lock_key(job["video_id"])
+        if await redis_client.get(lock_key) == job["job_id"]:
+            await redis_client.delete(lock_key)
+
+    async def _worker(self):
+        while True:
+            job, access_token, user_id = await self._queue.get()
+            try:
+                # youtube quota used by the job is counted for the user that started it
+                quota_user.set(user_id)
+                await self._process(job, access_token)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # redis is down, keep the worker alive, the lock expire by itself
+                logger.error(f"Failed to update job {job['job_id']}", exc_info=True)
+
+    async def _process(self, job: dict, access_token: str):
+        try:
+            job.update(status="running", started_at=_now())
+            await self._save(job)
+            result = await self._run(job, access_token)
+        except asyncio.CancelledError:
+            await asyncio.shield(self._finish(job, "failed", error="Server shutting down"))
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['kind']} failed for video {job['video_id']}", exc_info=True)
+            await self._finish(job, "failed", error=getattr(e, "detail", None) or str(e) or type(e).__name__)
+        else:
+            await self._finish(job, "done", result=result)
+
+    async def _run(self, job: dict, access_token: str) -> dict:
+        # every job use its own database session
+        result = {}
+        async with AsyncSessionLocal() as db:
+            if job["kind"] in ("sync", "refresh"):
+                result["new_comment_count"] = await sync_video_comments(db, job["video_id"], access_token)
+            if job["kind"] in ("predict", "refresh"):
+                predicted = await predict_comment(db, job["video_id"])
+                result["flagged_count"] = len(predicted["predictions"])
+        return result
+
+# job queue shared by the whole app
+job_queue = JobQueue()
@@ -0,0 +1,273 @@
+# src/services/moderation_service.py
+"""
+scheduled auto moderation: every channel that enable it is synced, classified and moderated in background.
+each channel has its own interval that follow its comment velocity, channel runs share a concurrency cap
+and a daily youtube quota budget. schedule state is kept in redis so several api processes don't run the same channel
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import asyncio
+import logging
+import math
+import time
+import os
+
+from src.core.session import redis_client
+from src.core.youtube_client import youtube_client, quota_user, quota_scope, ENDPOINTS
+from src.core.utils import decrypt_token
+from src.database.init import AsyncSessionLocal
+from src.database.crud import (
+    get_latest_refresh_token,
+    get_auto_moderation_users,
+    update_auto_moderation
+)
+from src.database.crud_content import get_user_by_id, get_comments_to_moderate
+from src.services.auth_service import renew_access_token
+from src.services.content_service import (
+    fetch_latest_video,
+    sync_video,
+    predict_comment,
+    delete_comments_by_ids,
+    MODERATION_BATCH_SIZE
+)
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+AUTO_MODERATION_ENABLED = os.getenv("AUTO_MODERATION_ENABLED", "false").lower() == "true" # start the scheduler with the app
+AUTO_MODERATION_TICK = float(os.getenv("AUTO_MODERATION_TICK", "30")) # seconds between checks for due channels
+AUTO_MODERATION_CONCURRENCY = int(os.getenv("AUTO_MODERATION_CONCURRENCY", "2")) # channels processed at the same time
+AUTO_MODERATION_VIDEOS = int(os.getenv("AUTO_MODERATION_VIDEOS", "5")) # latest videos synced for each channel
+AUTO_MODERATION_THRESHOLD = float(os.getenv("AUTO_MODERATION_THRESHOLD", "0.9")) # default min confidence to moderate
+AUTO_MODERATION_STATUS = os.getenv("AUTO_MODERATION_STATUS", "heldForReview") # heldForReview | rejected
+AUTO_MODERATION_MIN_INTERVAL = float(os.getenv("AUTO_MODERATION_MIN_INTERVAL", "300")) # seconds, busiest channel
+AUTO_MODERATION_MAX_INTERVAL = float(os.getenv("AUTO_MODERATION_MAX_INTERVAL", str(3600 * 6))) # seconds, quiet channel
+AUTO_MODERATION_TARGET_COMMENTS = int(os.getenv("AUTO_MODERATION_TARGET_COMMENTS", "100")) # new comments wanted per run
+AUTO_MODERATION_QUOTA = int(os.getenv("AUTO_MODERATION_QUOTA", "5000")) # youtube quota units per day for the scheduler, enforced by the youtube client
+AUTO_MODERATION_LOCK_TTL = int(os.getenv("AUTO_MODERATION_LOCK_TTL", "1800")) # max seconds a channel run stay locked
+
+# youtube data api quota cost
+LIST_COST = ENDPOINTS["playlistItems.list"][2]
+MODERATION_COST = ENDPOINTS["comments.setModerationStatus"][2]
+# every youtube call of a scheduler run is counted under this scope by the youtube client
+QUOTA_SCOPE = ("moderation", AUTO_MODERATION_QUOTA)
+
+async def get_quota_remaining() -> int:
+    """
+    service to get the scheduler quota units left for today, from the units really counted by the youtube client
+    (comment and reply pages, moderation calls with their bisection and retries), capped by the project quota left
+    """
+    scheduler_used = await youtube_client.used_today(f"scope:{QUOTA_SCOPE[0]}")
+    project_used = await youtube_client.used_today("project")
+    return min(AUTO_MODERATION_QUOTA - scheduler_used, youtube_client.daily_quota - project_used)
+
+async def get_channel_access_token(db: AsyncSession, user_id: str) -> str:
+    """
+    service to get access token of a channel without user session, renewed from the stored refresh token when needed
+    """
+    key = f"moderation:token:{user_id}"
+    access_token = await redis_client.get(key)
+    if access_token:
+        return access_token
+
+    token_data = await get_latest_refresh_token(db, user_id)
+    if not token_data:
+        raise HTTPException(status_code=401, detail="No refresh token stored for channel")
+
+    access_token = await renew_access_token(decrypt_token(token_data.refresh_token_encrypted))
+    if not access_token:
+        raise HTTPException(status_code=401, detail="Unable to refresh access token")
+
+    # google access token live for one hour
+    await redis_client.setex(key, 3000, access_token)
+    return access_token
+
+async def moderate_channel(db: AsyncSession, user_id: str, playlist_id: str, threshold: float) -> dict:
+    """
+    service to sync the latest videos of a channel, classify new comments incrementally,
+    and moderate comments predicted as judi with confidence above threshold
+    """
+    # one playlist call and at least one comment page for each video
+    if await get_quota_remaining() < LIST_COST * (1 + AUTO_MODERATION_VIDEOS):
+        raise HTTPException(status_code=429, detail="Auto moderation quota budget exhausted")
+
+    access_token = await get_channel_access_token(db, user_id)
+    videos = await fetch_latest_video(playlist_id, access_token, AUTO_MODERATION_VIDEOS)
+
+    # sync comments of every video, one by one because they share the session
+    synced = []
+    new_comments = 0
+    for item in videos or []:
+        summary = await sync_video(db, item, playlist_id, access_token)
+        if not summary:
+            continue
+        if summary.error:
+            logger.warning(f"Auto moderation failed syncing video {summary.video_id}: {summary.error}")
+            continue
+        synced.append(summary.video_id)
+        new_comments += summary.new_comment_count
+
+    moderated = 0
+    for video_id in synced:
+        # classify only new or changed comments
+        await predict_comment(db, video_id)
+        comment_ids = await get_comments_to_moderate(db, video_id, threshold)
+        if not comment_ids:
+            continue
+
+        # moderate only as many comments as the budget allow, the rest is picked up in the next run.
+        # bisection and retries can still spend more, the client refuse calls over the budget
+        # remaining is negative once retries overspent, a negative slice would still keep most ids
+        calls = max(0, min(math.ceil(len(comment_ids) / MODERATION_BATCH_SIZE), await get_quota_remaining() // MODERATION_COST))
+        if calls == 0:
+            logger.warning(f"Auto moderation quota budget exhausted, skip moderating channel {user_id}")
+            break
+        comment_ids = comment_ids[:calls * MODERATION_BATCH_SIZE]
+
+        try:
+            result = await delete_comments_by_ids(db, access_token, comment_ids, AUTO_MODERATION_STATUS)
+            moderated += result["updated"] or 0
+        except HTTPException as e:
+            logger.warning(f"Auto moderation failed for video {video_id}: {e.detail}")
+
+    return {"videos": len(synced), "new_comments": new_comments, "moderated": moderated}
+
+def next_interval(interval: float, new_comments: int, elapsed: float) -> float:
+    """
+    channel with many new comments is checked more often, quiet channel less often
+    """
+    if new_comments <= 0:
+        interval *= 2
+    else:
+        # time needed to collect AUTO_MODERATION_TARGET_COMMENTS at the current velocity
+        velocity = new_comments / max(elapsed, 1)
+        interval = AUTO_MODERATION_TARGET_COMMENTS / velocity
+    return min(max(interval, AUTO_MODERATION_MIN_INTERVAL), AUTO_MODERATION_MAX_INTERVAL)
+
+class ModerationScheduler:
+    def __init__(self, tick: float = AUTO_MODERATION_TICK, concurrency: int = AUTO_MODERATION_CONCURRENCY):
+        self.tick = tick
+        # global cap of channels processed at the same time
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._loop: asyncio.Task | None = None
+        self._running: dict[str, asyncio.Task] = {}
+
+    async def start(self):
+        """
+        start the scheduler loop
+        """
+        if self._loop:
+            return
+        self._loop = asyncio.create_task(self._schedule())
+
+    async def shutdown(self):
+        """
+        stop the scheduler loop and running channels, their locks expire by themselves
+        """
+        tasks = [self._loop, *self._running.values()] if self._loop else []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop = None
+        self._running = {}
+
+    async def _schedule(self):
+        while True:
+            try:
+                await self._dispatch_due_channels()
+            except Exception:
+                logger.error("Auto moderation scheduler failed", exc_info=True)
+            await asyncio.sleep(self.tick)
+
+    async def _dispatch_due_channels(self):
+        async with AsyncSessionLocal() as db:
+            users = await get_auto_moderation_users(db)
+
+        now = time.time()
+        for user in users:
+            if user.user_id in self._running:
+                continue
+            state = await redis_client.hgetall(f"moderation:channel:{user.user_id}")
+            if float(state.get("next_run", 0)) > now:
+                continue
+
+            threshold = user.moderation_threshold or AUTO_MODERATION_THRESHOLD
+            task = asyncio.create_task(self._run_channel(user.user_id, user.playlist_id, threshold))
+            self._running[user.user_id] = task
+            task.add_done_callback(lambda _, user_id=user.user_id: self._running.pop(user_id, None))
+
+    async def _run_channel(self, user_id: str, playlist_id: str, threshold: float):
+        async with self._semaphore:
+            # lock the channel between api processes
+            lock_key = f"moderation:lock:{user_id}"
+            if not await redis_client.set(lock_key, "1", nx=True, ex=AUTO_MODERATION_LOCK_TTL):
+                return
+
+            try:
+                state_key = f"moderation:channel:{user_id}"
+                state = await redis_client.hgetall(state_key)
+                started = time.time()
+                if float(state.get("next_run", 0)) > started:
+                    # another process has just run it
+                    return
+
+                interval = float(state.get("interval", AUTO_MODERATION_MIN_INTERVAL))
+                elapsed = started - float(state.get("last_run", started - interval))
+                update = {"last_run": started, "error": ""}
+                # youtube quota used by the run is counted for the scheduler budget and the channel owner
+                quota_user.set(user_id)
+                quota_scope.set(QUOTA_SCOPE)
+                try:
+                    async with AsyncSessionLocal() as db:
+                        result = await moderate_channel(db, user_id, playlist_id, threshold)
+                    interval = next_interval(interval, result["new_comments"], elapsed)
+                    update.update(
+                        new_comments=result["new_comments"],
+                        moderated=result["moderated"],
+                        total_moderated=int(state.get("total_moderated", 0)) + result["moderated"]
+                    )
+                    logger.info(f"Auto moderation of channel {user_id}: {result}, next run in {interval:.0f}s")
+                except Exception as e:
+                    # back off on failure (expired token, quota, youtube error)
+                    logger.error(f"Auto moderation failed for channel {user_id}", exc_info=True)
+                    interval = min(interval * 2, AUTO_MODERATION_MAX_INTERVAL)
+                    update["error"] = str(getattr(e, "detail", None) or e)
+
+                update.update(interval=interval, next_run=time.time() + interval)
+                await redis_client.hset(state_key, mapping=update)
+            finally:
+                await redis_client.delete(lock_key)
+
+async def get_auto_moderation(db: AsyncSession, user_id: str) -> dict:
+    """
+    service to get auto moderation setting and the last scheduler run of a channel
+    """
+    user = await get_user_by_id(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    state = await redis_client.hgetall(f"moderation:channel:{user_id}")
+    return {
+        "enabled": user.auto_moderation,
+        "threshold": user.moderation_threshold or AUTO_MODERATION_THRESHOLD,
+        "moderation_status": AUTO_MODERATION_STATUS,
+        "scheduler_running": AUTO_MODERATION_ENABLED,
+        "quota_remaining": await get_quota_remaining(),
+        "state": state,
+    }
+
+async def set_auto_moderation(db: AsyncSession, user_id: str, enabled: bool, threshold: float | None) -> dict:
+    """
+    service to enable or disable auto moderation of a channel
+    """
+    user = await update_auto_moderation(db, user_id, enabled, threshold)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if enabled:
+        # run it on the next scheduler tick
+        await redis_client.hset(f"moderation:channel:{user_id}", "next_run", 0)
+    return await get_auto_moderation(db, user_id)
+
+# scheduler shared by the whole app
+moderation_scheduler = ModerationScheduler()
@@ -0,0 +1,22 @@
+# src/utils/pagination.py
+from datetime import datetime
+import base64
+import json
+
+def encode_cursor(published_at: datetime | None, item_id: str) -> str:
+    """
+    opaque cursor of the last row of a page, ordered by (published_at, id) newest first
+    """
+    payload = json.dumps([published_at.isoformat() if published_at else None, item_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, str]:
+    """
+    get (published_at, id) back from cursor, raise ValueError when the cursor is not valid
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        published_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(published_at) if published_at else None, str(item_id))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
@@ -1,6 +1,12 @@
 import unicodedata
+import hashlib
 import re
-from bs4 import BeautifulSoup
+from html.entities import html5
+from html.parser import HTMLParser
+
+# Versi hasil normalisasi, naikkan setiap kali output normalize_text berubah
+# supaya token id yang disimpan saat ingest dengan versi lama tidak dipakai lagi
+PREPROCESSING_VERSION = "2"
 
 # Mapping untuk mengganti karakter mirip huruf/angka (visual clones)
 CHARACTER_MAP = {
@@ -220,25 +226,202 @@ CHARACTER_MAP = {
     '〇': '0', 'З': '3', 'Ƽ': '5', '߈': '4'
 }
 
+# Semua pola di-compile sekali saat import; tiap pola hanya dijalankan kalau teks bisa cocok dengannya.
+# Pola URL, shortener, timestamp dan @/# tetap dijalankan berurutan (tidak digabung jadi satu regex),
+# karena penghapusan satu pola bisa membuat/menghilangkan kecocokan pola berikutnya, mis. "bit.ly/www.x" atau "#12:34"
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+SHORTENER_PATTERN = re.compile(r'\b(bit\.ly|tinyurl\.com|t\.co|goo\.gl|linktr\.ee)/\S+')
+TIMESTAMP_PATTERN = re.compile(r'\b\d{1,2}:\d{2}(?::\d{2})?\b')
+SYMBOL_PREFIX_PATTERN = re.compile(r'[@#](\w+)')
+
+# Teks HTML diambil dengan tokenizer html.parser yang sama seperti BeautifulSoup, tanpa membangun pohon dokumen.
+# Hasilnya sama dengan get_text(): komentar/doctype/processing instruction dibuang, isi CDATA dipertahankan,
+# isi <script>/<style>/<template>/<rt>/<rp> tidak ikut, entity yang tidak dikenal ditulis apa adanya tanpa ';',
+# dan teks di antara dua tag yang hanya berisi spasi ascii diringkas jadi satu spasi/newline (kecuali di <pre>/<textarea>)
+HTML_ENTITIES = {name[:-1]: char for name, char in html5.items() if name.endswith(';')}
+HIDDEN_TEXT_TAGS = frozenset(("script", "style", "template", "rt", "rp"))
+PRESERVE_WHITESPACE_TAGS = frozenset(("pre", "textarea"))
+VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta",
+    "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer"
+))
+ASCII_SPACES = frozenset(' \n\t\x0c\r')
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts: list[str] = []
+        self.open_tags: list[str] = []
+        self.hidden = 0 # tag HIDDEN_TEXT_TAGS yang sedang terbuka
+        self.preserve = 0 # tag PRESERVE_WHITESPACE_TAGS yang sedang terbuka
+        self._current: list[str] = []
+
+    def _flush(self, keep: bool = True):
+        # satu string teks selesai setiap kali ada tag/komentar/deklarasi
+        if not self._current:
+            return
+        data = ''.join(self._current)
+        self._current = []
+        if not self.preserve and ASCII_SPACES.issuperset(data):
+            data = '\n' if '\n' in data else ' '
+        if keep:
+            self.parts.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._flush(not self.hidden)
+        # tag void langsung tertutup
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+            self.hidden += tag in HIDDEN_TEXT_TAGS
+            self.preserve += tag in PRESERVE_WHITESPACE_TAGS
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush(not self.hidden)
+
+    def handle_endtag(self, tag):
+        self._flush(not self.hidden)
+        # tutup sampai tag terbuka terakhir dengan nama yang sama, end tag tanpa pasangan diabaikan
+        if tag not in self.open_tags:
+            return
+        while True:
+            closed = self.open_tags.pop()
+            self.hidden -= closed in HIDDEN_TEXT_TAGS
+            self.preserve -= closed in PRESERVE_WHITESPACE_TAGS
+            if closed == tag:
+                return
+
+    def handle_data(self, data):
+        self._current.append(data)
+
+    def handle_charref(self, name):
+        code = int(name[1:], 16) if name[0] in 'xX' else int(name)
+        if code == 0 or code > 0x10FFFF or 0xD800 <= code <= 0xDFFF:
+            char = '\ufffd'
+        elif 0x80 <= code <= 0x9F:
+            # referensi yang ditulis dengan kode windows-1252
+            try:
+                char = bytes([code]).decode('cp1252')
+            except UnicodeDecodeError:
+                char = chr(code)
+        else:
+            char = chr(code)
+        self._current.append(char)
+
+    def handle_entityref(self, name):
+        self._current.append(HTML_ENTITIES.get(name, f"&{name}"))
+
+    def _skip(self, data):
+        # komentar, doctype, processing instruction
+        self._flush(not self.hidden)
+
+    handle_comment = handle_decl = handle_pi = _skip
+
+    def unknown_decl(self, data):
+        self._flush(not self.hidden)
+        if data.upper().startswith("CDATA["):
+            self._current.append(data[len("CDATA["):])
+            self._flush()
+
+    def close(self):
+        super().close()
+        self._flush(not self.hidden)
+
+# Key CHARACTER_MAP yang lebih dari satu codepoint (keycap '1️⃣', emoji dengan VS16 '🅰️') dicocokkan dengan trie,
+# match terpanjang menang ('🅰️' dulu, baru '🅰'). Trie dikompilasi jadi satu regex supaya scan-nya berjalan di C;
+# key satu karakter tetap lewat CHAR_TABLE, hasil penggantian urutan selalu ascii sehingga tidak berubah lagi di sana
+SEQUENCE_MAP = {key: value for key, value in CHARACTER_MAP.items() if len(key) > 1}
+# karakter selain yang pertama dari setiap urutan, teks tanpa karakter ini tidak perlu di-scan
+SEQUENCE_TAILS = frozenset(char for key in SEQUENCE_MAP for char in key[1:])
+
+def _build_trie(keys) -> dict:
+    trie: dict = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = {} # akhir key
+    return trie
+
+def _trie_pattern(node: dict) -> str:
+    # cabang yang lebih panjang dicoba sebelum akhir key, jadi regex selalu memilih match terpanjang
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        pattern = ('(?:' + pattern + ')' if len(branches) == 1 else pattern) + '?'
+    return pattern
+
+SEQUENCE_PATTERN = re.compile(_trie_pattern(_build_trie(SEQUENCE_MAP)))
+
+def _replace_sequence(match: re.Match) -> str:
+    return SEQUENCE_MAP[match.group()]
+
+class _CharTable(dict):
+    """
+    tabel str.translate untuk semua langkah per karakter sekaligus: CHARACTER_MAP, NFKD, hapus karakter combining,
+    hapus zero-width, dan simbol selain huruf/angka/spasi/dash jadi spasi. diisi saat karakter pertama kali ditemui
+    """
+    _keep = re.compile(r'[\w\s\-]')
+    _zero_width = re.compile(r'[\u200B\u200C\u200D\uFEFF]')
+
+    def __missing__(self, code: int) -> str:
+        # key satu karakter, urutan sudah diganti SEQUENCE_PATTERN
+        text = CHARACTER_MAP.get(chr(code), chr(code))
+        # NFKD per karakter sama dengan NFKD seluruh teks di sini: pengurutan ulang NFKD hanya
+        # menyentuh karakter combining, dan semuanya dihapus
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join([c for c in text if not unicodedata.combining(c)])
+        text = self._zero_width.sub('', text)
+        text = ''.join([c if self._keep.match(c) else ' ' for c in text])
+        self[code] = text
+        return text
+
+CHAR_TABLE = _CharTable()
+# karakter ascii langsung dihitung saat import
+for _code in range(128):
+    CHAR_TABLE[_code]
+
 def strip_urls_and_timestamps(text: str) -> str:
     # Hapus URL penuh (http, https, www)
-    text = re.sub(r'https?://\S+|www\.\S+', '', text)
+    if 'http' in text or 'www.' in text:
+        text = URL_PATTERN.sub('', text)
 
     # Hapus URL shortener umum seperti bit.ly, t.co, dll.
-    text = re.sub(r'\b(bit\.ly|tinyurl\.com|t\.co|goo\.gl|linktr\.ee)/\S+', '', text)
+    if '/' in text:
+        text = SHORTENER_PATTERN.sub('', text)
 
     # Hapus timestamp video dalam format 00:12 atau 1:02:03
-    text = re.sub(r'\b\d{1,2}:\d{2}(?::\d{2})?\b', '', text)
+    if ':' in text:
+        text = TIMESTAMP_PATTERN.sub('', text)
 
     return text
 
 def strip_html_tags(text: str) -> str:
     # Hapus seluruh tag HTML dan ambil teksnya saja
-    return BeautifulSoup(text, "html.parser").get_text()
+    if '<' not in text and '&' not in text:
+        # teks yang hanya berisi spasi ascii juga diringkas
+        if text and not text.strip(' \n\t\x0c\r'):
+            return '\n' if '\n' in text else ' '
+        return text
+    parser = _TextExtractor()
+    parser.feed(text)
+    parser.close()
+    return ''.join(parser.parts)
 
 def strip_symbols_prefix(text: str) -> str:
     # Ubah @mention dan #hashtag menjadi kata biasa tanpa simbolnya
-    return re.sub(r'[@#](\w+)', r'\1', text)
+    if '@' not in text and '#' not in text:
+        return text
+    return SYMBOL_PREFIX_PATTERN.sub(r'\1', text)
+
+def map_characters(text: str) -> str:
+    # Ganti urutan karakter mirip huruf/angka (match terpanjang), lalu semua langkah per karakter dalam satu pass
+    for char in SEQUENCE_TAILS:
+        if char in text:
+            text = SEQUENCE_PATTERN.sub(_replace_sequence, text)
+            break
+    return text.translate(CHAR_TABLE)
 
 # Fungsi utama normalisasi teks
 def normalize_text(text: str) -> str:
@@ -251,21 +434,26 @@ def normalize_text(text: str) -> str:
     # Hapus simbol @ dan # di awal kata (biarkan katanya tetap ada)
     text = strip_symbols_prefix(text)
 
-    # Ganti karakter spesial berdasarkan peta karakter
-    text = ''.join(CHARACTER_MAP.get(char, char) for char in text)
-
-    # Normalisasi Unicode dan hapus karakter combining (misalnya aksen atau garis bawah panjang)
-    text = unicodedata.normalize('NFKD', text)
-    text = ''.join([c for c in text if not unicodedata.combining(c)])
-
-    # Hapus karakter zero-width/invisible seperti ZWJ dan ZWNJ
-    text = re.sub(r'[\u200B\u200C\u200D\uFEFF]', '', text)
-
-    # Hapus simbol/emoji non-informasi, hanya pertahankan huruf, angka, spasi, dan dash
-    text = re.sub(r'[^\w\s\-]', ' ', text)
+    # Peta karakter, normalisasi unicode, hapus combining/zero-width dan simbol
+    text = map_characters(text)
 
     # Ubah ke huruf kecil dan hapus spasi di awal/akhir
     return text.lower().strip()
 
+def normalize_many(texts: list[str]) -> list[str]:
+    # Normalisasi banyak teks sekaligus, teks yang sama (mis. komentar spam) hanya diproses sekali
+    cache: dict[str, str] = {}
+    results = []
+    for text in texts:
+        normalized = cache.get(text)
+        if normalized is None:
+            normalized = cache[text] = normalize_text(text)
+        results.append(normalized)
+    return results
+
+def content_hash(normalized_text: str) -> str:
+    # Hash 128-bit (32 karakter hex) dari teks hasil normalisasi, dipakai untuk deteksi perubahan dan teks duplikat
+    return hashlib.blake2b(normalized_text.encode(), digest_size=16).hexdigest()
+
 def tokenize_text(tokenizer, data):
     return tokenizer(data['text'], max_length=512, truncation=True, padding='max_length')
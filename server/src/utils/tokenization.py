@@ -0,0 +1,90 @@
+# src/utils/tokenization.py
+"""
+fast IndoBERT tokenizer (rust `tokenizers`) shared by the inference workers and comment ingest.
+it only needs the `tokenizers` package, so the API process can tokenize at ingest without loading transformers/torch.
+token ids are stored as compact little-endian uint16 arrays (the vocab is smaller than 65536)
+"""
+from dotenv import load_dotenv
+import hashlib
+import os
+
+# one thread per tokenizer call, the workers and the api process already run side by side on the same cores
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+import numpy as np
+from tokenizers import Tokenizer
+
+from src.utils.preprocessing import PREPROCESSING_VERSION
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_NAME = "indobenchmark/indobert-lite-base-p2"
+TOKENIZER_PATH = os.getenv("TOKENIZER_PATH", os.path.join(BASE_DIR, "..", "..", "models", "indobert_tokenizer.json")) # exported by engine/export_onnx.py --export
+TOKENIZE_AT_INGEST = os.getenv("TOKENIZE_AT_INGEST", "false").lower() == "true" # store token ids of new/changed comments
+MAX_LENGTH = 512
+TOKEN_DTYPE = np.dtype("<u2")
+
+# per process state, filled by load_tokenizer
+tokenizer: Tokenizer | None = None
+tokenizer_version: str | None = None
+pad_id = 0
+
+def load_tokenizer(from_hub: bool = False) -> Tokenizer:
+    """
+    load the exported tokenizer.json once per process, configured like the slow BertTokenizer call of the model
+    (truncation to 512 tokens, no padding). from_hub convert the hub tokenizer with transformers when the file is missing
+    """
+    global tokenizer, tokenizer_version, pad_id
+    if tokenizer is not None:
+        return tokenizer
+
+    if os.path.exists(TOKENIZER_PATH):
+        loaded = Tokenizer.from_file(TOKENIZER_PATH)
+    elif from_hub:
+        from transformers import BertTokenizerFast
+        loaded = BertTokenizerFast.from_pretrained(MODEL_NAME).backend_tokenizer
+    else:
+        raise FileNotFoundError(f"Tokenizer file {TOKENIZER_PATH} not found, export it with engine/export_onnx.py --export")
+
+    if loaded.get_vocab_size() > np.iinfo(TOKEN_DTYPE).max + 1:
+        raise ValueError(f"Vocab of {loaded.get_vocab_size()} tokens doesn't fit in {TOKEN_DTYPE}")
+    loaded.no_padding()
+    loaded.enable_truncation(MAX_LENGTH)
+
+    # stored ids are only reused when both the vocab/rules and the text normalization are the same
+    payload = f"{PREPROCESSING_VERSION}\0{loaded.to_str()}".encode()
+    tokenizer_version = hashlib.blake2b(payload, digest_size=8).hexdigest()
+    pad_id = loaded.token_to_id("[PAD]") or 0
+    tokenizer = loaded
+    return tokenizer
+
+def encode(texts: list[str]) -> list[np.ndarray]:
+    """
+    token ids of normalized texts, with [CLS]/[SEP] and truncated to MAX_LENGTH
+    """
+    return [np.asarray(encoding.ids, dtype=TOKEN_DTYPE) for encoding in load_tokenizer().encode_batch(texts)]
+
+def encode_comments(texts: list[str]) -> list[bytes]:
+    """
+    packed token ids of normalized comment texts, for storing at ingest
+    """
+    return [ids.tobytes() for ids in encode(texts)]
+
+def unpack(data: bytes) -> np.ndarray:
+    """
+    stored token ids back to an array, no copy
+    """
+    return np.frombuffer(data, dtype=TOKEN_DTYPE)
+
+def pad_batch(sequences: list[np.ndarray]) -> dict[str, np.ndarray]:
+    """
+    right-pad token ids to the longest sequence, same arrays as BertTokenizer.pad(..., return_tensors='np')
+    """
+    width = max(len(ids) for ids in sequences)
+    input_ids = np.full((len(sequences), width), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(sequences), width), dtype=np.int64)
+    for row, ids in enumerate(sequences):
+        input_ids[row, :len(ids)] = ids
+        attention_mask[row, :len(ids)] = 1
+    return {"input_ids": input_ids, "token_type_ids": np.zeros_like(input_ids), "attention_mask": attention_mask}
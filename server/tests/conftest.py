@@ -0,0 +1,160 @@
+# shared fixtures: a postgres session (tests marked db are skipped without one) and a mock youtube data api
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
+import os
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+from src.core import http_client
+from src.core.youtube_client import youtube_client, TokenBucket
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def db():
+    """
+    session of the POSTGRESQL_URL database migrated to head, videos created by the test are removed after it
+    """
+    if not os.getenv("POSTGRESQL_URL"):
+        pytest.skip("POSTGRESQL_URL is not set")
+    from src.database.init import engine, init_db, AsyncSessionLocal
+    from src.database.models import Video
+
+    try:
+        await init_db()
+    except Exception as e:
+        await engine.dispose()
+        pytest.skip(f"Database is not reachable: {e}")
+
+    async with AsyncSessionLocal() as session:
+        session.info["video_ids"] = []
+        yield session
+        await session.rollback()
+        await session.execute(delete(Video).where(Video.video_id.in_(session.info["video_ids"])))
+        await session.commit()
+    # connections belong to the event loop of this test
+    await engine.dispose()
+
+@pytest.fixture
+async def video(db):
+    from src.database.crud_content import insert_video
+    from src.schemas.video import VideoCreate
+
+    video_id = f"test-{uuid.uuid4().hex[:12]}"
+    db.info["video_ids"].append(video_id)
+    await insert_video(db, VideoCreate(
+        video_id=video_id, channel_id="channel", playlist_id="playlist", title="test video",
+        published_at=datetime.now(timezone.utc) - timedelta(days=30)
+    ))
+    return video_id
+
+def timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class MockYouTube:
+    """
+    in-memory commentThreads.list / comments.list / comments.setModerationStatus of one channel,
+    served through the shared http client.
+    threads: {video_id: [thread]}, each thread {"id", "published", "updated", "text", "replies": [reply]},
+    a thread "held" count adds replies to totalReplyCount that are never returned (held for review)
+    """
+    def __init__(self, page_size: int = 2, inline_replies: int = 2):
+        self.page_size = page_size
+        self.inline_replies = inline_replies
+        self.threads: dict[str, list[dict]] = {}
+        self.failures: dict[str, tuple[int, str]] = {} # parent_id -> (status, reason) of comments.list
+        self.moderation_failures: dict[str, tuple[int, str]] = {} # comment_id -> (status, reason), fail the whole call
+        self.moderation_error: tuple[int, str] | None = None # (status, reason) of every setModerationStatus call
+        self.moderated: dict[str, str] = {} # comment_id -> moderation status
+        self.requests: list[tuple[str, dict]] = []
+
+    def add_thread(self, video_id: str, thread_id: str, published: datetime, replies: int = 0) -> dict:
+        thread = {"id": thread_id, "published": published, "updated": published, "text": f"comment {thread_id}", "replies": []}
+        self.threads.setdefault(video_id, []).append(thread)
+        for _ in range(replies):
+            self.add_reply(thread, published)
+        return thread
+
+    def add_reply(self, thread: dict, published: datetime) -> dict:
+        reply = {"id": f"{thread['id']}.r{len(thread['replies'])}", "published": published, "updated": published,
+                 "text": f"reply {len(thread['replies'])} of {thread['id']}"}
+        thread["replies"].append(reply)
+        return reply
+
+    def count(self, path: str) -> int:
+        return sum(1 for requested, _ in self.requests if requested == path)
+
+    def _snippet(self, comment: dict) -> dict:
+        return {"authorDisplayName": "author", "textDisplay": comment["text"],
+                "publishedAt": timestamp(comment["published"]), "updatedAt": timestamp(comment["updated"])}
+
+    def _page(self, items: list, params: dict) -> dict:
+        start = int(params.get("pageToken", 0))
+        page = {"items": items[start:start + self.page_size]}
+        if start + self.page_size < len(items):
+            page["nextPageToken"] = str(start + self.page_size)
+        return page
+
+    def _error(self, status: int, reason: str) -> httpx.Response:
+        return httpx.Response(status, json={"error": {"code": status, "errors": [{"reason": reason}]}})
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        params = {key: values[0] for key, values in parse_qs(request.url.query.decode()).items()}
+        path = request.url.path.rsplit("/", 1)[-1]
+        self.requests.append((path, params))
+
+        if path == "commentThreads":
+            threads = self.threads.get(params["videoId"], [])
+            if params.get("order") == "time":
+                threads = sorted(threads, key=lambda thread: thread["published"], reverse=True)
+            items = [{
+                "id": thread["id"],
+                "snippet": {"totalReplyCount": len(thread["replies"]) + thread.get("held", 0),
+                            "topLevelComment": {"id": thread["id"], "snippet": self._snippet(thread)}},
+                **({"replies": {"comments": [{"id": reply["id"], "snippet": self._snippet(reply)}
+                                             for reply in thread["replies"][:self.inline_replies]]}}
+                   if thread["replies"] and self.inline_replies else {}),
+            } for thread in threads]
+            return httpx.Response(200, json=self._page(items, params))
+
+        if path == "comments":
+            parent_id = params["parentId"]
+            if parent_id in self.failures:
+                return self._error(*self.failures[parent_id])
+            thread = next((thread for threads in self.threads.values() for thread in threads if thread["id"] == parent_id), None)
+            if thread is None:
+                return self._error(404, "commentNotFound")
+            items = [{"id": reply["id"], "snippet": {**self._snippet(reply), "parentId": parent_id}} for reply in thread["replies"]]
+            return httpx.Response(200, json=self._page(items, params))
+
+        if path == "setModerationStatus":
+            ids = params["id"].split(",")
+            if self.moderation_error:
+                return self._error(*self.moderation_error)
+            failed = [comment_id for comment_id in ids if comment_id in self.moderation_failures]
+            if failed:
+                return self._error(*self.moderation_failures[failed[0]])
+            self.moderated.update(dict.fromkeys(ids, params["moderationStatus"]))
+            return httpx.Response(204)
+
+        return self._error(404, "notFound")
+
+@pytest.fixture
+async def youtube(monkeypatch):
+    """
+    mock youtube api behind the shared http client, quota accounting (redis) is skipped
+    """
+    mock = MockYouTube()
+    async def no_quota(*args):
+        return None
+    monkeypatch.setattr(youtube_client, "_reserve", no_quota)
+    # its lock belong to the event loop that first waited on it, every test has its own loop
+    monkeypatch.setattr(youtube_client, "_bucket", TokenBucket(youtube_client._bucket.rate, youtube_client._bucket.capacity))
+    monkeypatch.setattr(http_client, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(mock.handle)))
+    yield mock
+    await http_client.http_client.aclose()
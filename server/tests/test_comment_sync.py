@@ -0,0 +1,86 @@
+# incremental comment sync against the mock youtube api: what the early stop sees, and what only the full pass sees
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from src.database.models import Comment
+from src.services import content_service
+
+pytestmark = [pytest.mark.anyio, pytest.mark.db]
+
+@pytest.fixture
+def full_sync_due(monkeypatch):
+    # full pass marker of each video, instead of redis
+    state = {"due": True}
+    async def due(video_id):
+        return state["due"]
+    async def mark(video_id):
+        state["due"] = False
+    monkeypatch.setattr(content_service, "_full_sync_due", due)
+    monkeypatch.setattr(content_service, "_mark_full_sync", mark)
+    return state
+
+async def stored(db, video_id: str) -> dict[str, Comment]:
+    db.expire_all()
+    result = await db.execute(select(Comment).filter_by(video_id=video_id))
+    return {comment.comment_id: comment for comment in result.scalars()}
+
+@pytest.fixture
+async def synced(db, video, youtube, full_sync_due):
+    # 8 threads on 4 pages (newest first) with one inlined reply, the first sync is a full one
+    youtube.inline_replies = 1
+    start = datetime.now(timezone.utc) - timedelta(days=10)
+    threads = [youtube.add_thread(video, f"{video}-t{i}", start + timedelta(hours=i), replies=1) for i in range(8)]
+    assert await content_service.sync_video_comments(db, video, "token") == 16
+    assert not full_sync_due["due"]
+    youtube.requests.clear()
+    return threads
+
+async def test_incremental_stops_at_first_unchanged_page(db, video, youtube, synced):
+    assert await content_service.sync_video_comments(db, video, "token") == 0
+    assert youtube.count("commentThreads") == 1
+    assert youtube.requests[0][1]["order"] == "time"
+
+async def test_incremental_keeps_paging_while_reply_counts_change(db, video, youtube, synced):
+    # new replies under threads of the 2nd and 3rd page (newest first), not inlined: only totalReplyCount changes
+    now = datetime.now(timezone.utc) + timedelta(minutes=1) # after the last fetch, youtube timestamps are in seconds
+    for thread in (synced[5], synced[3]):
+        youtube.add_reply(thread, now)
+        youtube.add_reply(thread, now)
+    # and an edit of a thread on the 1st page
+    synced[7]["updated"], synced[7]["text"] = now, "edited comment"
+
+    # the edit, then every reply of the two threads fetched with comments.list
+    assert await content_service.sync_video_comments(db, video, "token") == 7
+    # stopped at the 4th page, the first one without changes
+    assert youtube.count("commentThreads") == 4
+    comments = await stored(db, video)
+    assert comments[synced[7]["id"]].text == "edited comment"
+    for thread in (synced[5], synced[3]):
+        assert comments[thread["id"]].total_reply_count == 3
+        assert sum(comment.parent_id == thread["id"] for comment in comments.values()) == 3
+
+async def test_changes_under_old_threads_wait_for_the_full_pass(db, video, youtube, synced, full_sync_due):
+    # tradeoff of the early stop: activity under a thread older than the first unchanged page is not seen...
+    now = datetime.now(timezone.utc) + timedelta(minutes=1) # after the last fetch, youtube timestamps are in seconds
+    youtube.add_reply(synced[0], now)
+    youtube.add_reply(synced[0], now)
+    synced[1]["updated"], synced[1]["text"] = now, "edited old comment"
+
+    assert await content_service.sync_video_comments(db, video, "token") == 0
+    comments = await stored(db, video)
+    assert comments[synced[0]["id"]].total_reply_count == 1
+    assert comments[synced[1]["id"]].text != "edited old comment"
+
+    # ...until the next full pass, which page every thread
+    full_sync_due["due"] = True
+    youtube.requests.clear()
+    assert await content_service.sync_video_comments(db, video, "token") == 4
+    assert youtube.count("commentThreads") == 4
+    assert "order" not in youtube.requests[0][1]
+    comments = await stored(db, video)
+    assert comments[synced[0]["id"]].total_reply_count == 3
+    assert sum(comment.parent_id == synced[0]["id"] for comment in comments.values()) == 3
+    assert comments[synced[1]["id"]].text == "edited old comment"
+    assert not full_sync_due["due"]
@@ -0,0 +1,71 @@
+# moderation calls against the mock youtube api
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+
+from src.database.crud_content import get_comments_to_moderate, insert_comments
+from src.database.models import Comment
+from src.schemas.comment import CommentCreate
+from src.services import content_service
+
+pytestmark = [pytest.mark.anyio, pytest.mark.db]
+
+@pytest.fixture
+async def flagged(db, video) -> list[str]:
+    # 10 published comments predicted as judi
+    ids = [f"{video}-c{i}" for i in range(10)]
+    now = datetime.now(timezone.utc)
+    await db.execute(insert(Comment), [
+        {"comment_id": comment_id, "video_id": video, "text": f"judi {comment_id}", "published_at": now,
+         "updated_at": now, "is_judi": True, "confidence": 0.95, "model_version": "test"}
+        for comment_id in ids
+    ])
+    await db.commit()
+    return ids
+
+async def moderation_errors(db, video_id: str) -> dict[str, str | None]:
+    db.expire_all()
+    result = await db.execute(select(Comment.comment_id, Comment.moderation_error).filter_by(video_id=video_id))
+    return dict(result.all())
+
+async def test_permanent_failures_are_skipped_by_later_runs(db, video, youtube, flagged):
+    youtube.moderation_failures[flagged[3]] = (404, "commentNotFound")
+    youtube.moderation_failures[flagged[7]] = (400, "processingFailure")
+
+    result = await content_service.delete_comments_by_ids(db, "token", flagged)
+    assert result["updated"] == 8
+    assert result["failed"] == {flagged[3]: "failed:commentNotFound", flagged[7]: "failed:processingFailure"}
+    errors = await moderation_errors(db, video)
+    assert errors[flagged[3]] == "commentNotFound" and errors[flagged[7]] == "processingFailure"
+    assert sum(error is None for error in errors.values()) == 8
+
+    # the next run has nothing left to send
+    assert await get_comments_to_moderate(db, video, 0.9) == []
+
+async def test_edited_comment_can_be_moderated_again(db, video, youtube, flagged):
+    youtube.moderation_failures[flagged[0]] = (404, "commentNotFound")
+    await content_service.delete_comments_by_ids(db, "token", flagged[:2])
+
+    now = datetime.now(timezone.utc)
+    await insert_comments(db, [CommentCreate(comment_id=flagged[0], video_id=video, author_display_name="author",
+                                             text="edited judi comment", published_at=now, updated_at=now)])
+    assert (await moderation_errors(db, video))[flagged[0]] is None
+
+@pytest.mark.parametrize("status, reason", [(401, "authError"), (403, "forbidden"), (400, "banWithoutReject")])
+async def test_request_error_stops_every_call(db, video, youtube, status, reason):
+    # expired token, missing permission or a bad request: no bisection, the chunks not sent yet are not sent at all
+    youtube.moderation_error = (status, reason)
+    ids = [f"{video}-c{i}" for i in range(500)]
+
+    outcomes = await content_service.dispatch_moderation("token", ids)
+    assert outcomes == dict.fromkeys(ids, f"aborted:{reason}")
+    # only the calls already in flight when the first one failed
+    assert youtube.count("setModerationStatus") <= content_service.MODERATION_CONCURRENCY
+
+    with pytest.raises(HTTPException) as error:
+        await content_service.delete_comments_by_ids(db, "token", ids)
+    assert error.value.status_code == status
+    # not a problem of the comments, nothing is marked as failed
+    assert all(error is None for error in (await moderation_errors(db, video)).values())
@@ -0,0 +1,16 @@
+# the hot comment/video queries must keep using their indexes, same check as check_query_plans.py
+import os
+
+import pytest
+
+pytestmark = [pytest.mark.anyio, pytest.mark.db]
+
+QUERY_PLAN_COMMENTS = int(os.getenv("QUERY_PLAN_COMMENTS", "30000")) # seeded comments, small tables get sequential scans
+
+async def test_queries_use_their_indexes(db):
+    # imported after the db fixture, the module creates the engine from POSTGRESQL_URL
+    from check_query_plans import check_plans
+
+    results = await check_plans(QUERY_PLAN_COMMENTS)
+    assert results
+    assert [(name, sorted(used)) for name, ok, used in results if not ok] == []
@@ -0,0 +1,89 @@
+# reply threads fetched with comments.list against the mock youtube api
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from src.database.models import Comment
+from src.services import content_service
+
+pytestmark = [pytest.mark.anyio, pytest.mark.db]
+
+async def replies_of(db, thread_id: str) -> list[str]:
+    result = await db.execute(select(Comment.comment_id).filter_by(parent_id=thread_id).order_by(Comment.comment_id))
+    return result.scalars().all()
+
+async def reply_count(db, thread_id: str) -> int:
+    db.expire_all()
+    return (await db.execute(select(Comment.total_reply_count).filter_by(comment_id=thread_id))).scalar_one()
+
+@pytest.fixture
+def threads(video, youtube):
+    # one inlined reply per thread, the rest is paged 2 at a time by comments.list
+    youtube.inline_replies = 1
+    start = datetime.now(timezone.utc) - timedelta(days=3)
+    return [youtube.add_thread(video, f"{video}-t{i}", start + timedelta(hours=i), replies=replies)
+            for i, replies in enumerate((5, 1, 3))]
+
+async def test_hidden_replies_are_paged(db, video, youtube, threads):
+    await content_service.sync_video_comments(db, video, "token")
+
+    for thread in threads:
+        assert await replies_of(db, thread["id"]) == sorted(reply["id"] for reply in thread["replies"])
+        assert await reply_count(db, thread["id"]) == len(thread["replies"])
+    # 3 pages for the thread with 5 replies, 2 for 3 replies, none for the fully inlined thread
+    parents = [params["parentId"] for path, params in youtube.requests if path == "comments"]
+    assert sorted(parents) == sorted([threads[0]["id"]] * 3 + [threads[2]["id"]] * 2)
+
+async def test_new_replies_update_the_reply_count(db, video, youtube, threads):
+    await content_service.sync_video_comments(db, video, "token")
+    later = datetime.now(timezone.utc) + timedelta(minutes=1)
+    youtube.add_reply(threads[1], later)
+    youtube.add_reply(threads[1], later)
+    youtube.requests.clear()
+
+    await content_service.sync_video_comments(db, video, "token")
+    assert await reply_count(db, threads[1]["id"]) == 3
+    assert len(await replies_of(db, threads[1]["id"])) == 3
+    # threads that are already complete are not fetched again
+    assert {params["parentId"] for path, params in youtube.requests if path == "comments"} == {threads[1]["id"]}
+
+async def test_deleted_thread_doesnt_stop_the_others(db, video, youtube, threads):
+    youtube.failures[threads[0]["id"]] = (404, "commentNotFound")
+    await content_service.sync_video_comments(db, video, "token")
+
+    # only the inlined reply of the deleted thread, every reply of the other one
+    assert len(await replies_of(db, threads[0]["id"])) == 1
+    assert len(await replies_of(db, threads[2]["id"])) == 3
+
+async def test_first_error_cancels_the_other_fetches(db, video, youtube, threads, monkeypatch):
+    # one fetch at a time: the threads after the failing one must never be requested
+    monkeypatch.setattr(content_service, "REPLY_FETCH_CONCURRENCY", 1)
+    start = datetime.now(timezone.utc) - timedelta(days=2)
+    extra = [youtube.add_thread(video, f"{video}-x{i}", start + timedelta(hours=i), replies=3) for i in range(5)]
+    await content_service.sync_video_comments(db, video, "token")
+    for thread in [threads[2], *extra]:
+        youtube.add_reply(thread, datetime.now(timezone.utc) + timedelta(minutes=1))
+    youtube.failures[threads[2]["id"]] = (403, "forbidden")
+    youtube.requests.clear()
+
+    with pytest.raises(HTTPException) as error:
+        await content_service.ingest_replies(db, video, [threads[2]["id"]] + [thread["id"] for thread in extra], "token")
+    assert error.value.status_code == 403
+    assert [params["parentId"] for path, params in youtube.requests if path == "comments"] == [threads[2]["id"]]
+
+async def test_replies_youtube_never_returns_are_paged_once(db, video, youtube, threads):
+    threads[1]["held"] = 1
+    await content_service.sync_video_comments(db, video, "token")
+    assert len(await replies_of(db, threads[1]["id"])) == 1
+    youtube.requests.clear()
+
+    # the held reply keeps the count above the stored replies, the thread isn't paged again for it
+    await content_service.sync_video_comments(db, video, "token")
+    assert youtube.count("comments") == 0
+
+    youtube.add_reply(threads[1], datetime.now(timezone.utc) + timedelta(minutes=1))
+    await content_service.sync_video_comments(db, video, "token")
+    assert {params["parentId"] for path, params in youtube.requests if path == "comments"} == {threads[1]["id"]}
+    assert len(await replies_of(db, threads[1]["id"])) == 2
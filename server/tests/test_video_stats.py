@@ -0,0 +1,60 @@
+# video_stats maintained with count changes must always match a full recount
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from src.database import crud_content
+from src.database.crud_content import StatsChanges
+from src.database.models import VideoStats
+from src.schemas.comment import CommentCreate
+
+def comment(video_id: str, i: int, text: str | None = None) -> CommentCreate:
+    now = datetime.now(timezone.utc) - timedelta(minutes=i)
+    return CommentCreate(comment_id=f"{video_id}-c{i}", video_id=video_id, author_display_name="author",
+                         text=text or f"comment {i}", published_at=now, updated_at=now)
+
+async def assert_stats_match_recount(db, video_id: str) -> tuple[int, int]:
+    db.expire_all()
+    stats = (await db.execute(select(VideoStats).filter_by(video_id=video_id))).scalar_one()
+    maintained = (stats.comment_count, stats.flagged_count)
+    await crud_content.refresh_video_stats(db, {video_id})
+    db.expire_all()
+    stats = (await db.execute(select(VideoStats).filter_by(video_id=video_id))).scalar_one()
+    assert maintained == (stats.comment_count, stats.flagged_count)
+    await db.rollback()
+    return maintained
+
+@pytest.mark.anyio
+@pytest.mark.db
+async def test_changes_match_full_recount(db, video):
+    await crud_content.insert_comments(db, [comment(video, i) for i in range(30)])
+    assert await assert_stats_match_recount(db, video) == (30, 0)
+
+    await crud_content.update_comments_prediction_batch(db, [
+        {"comment_id": f"{video}-c{i}", "is_judi": i < 10, "confidence": 0.95} for i in range(30)
+    ], "test")
+    assert await assert_stats_match_recount(db, video) == (30, 10)
+
+    # edited judi comments wait for a new prediction, unchanged ones and new ones in the same page
+    await crud_content.insert_comments(db, [comment(video, i, "edited") for i in range(3)] +
+                                           [comment(video, i) for i in range(3, 35)])
+    assert await assert_stats_match_recount(db, video) == (35, 7)
+
+    await crud_content.update_moderation_status_comment(db, [f"{video}-c{i}" for i in (3, 4, 20)], "heldForReview")
+    assert await assert_stats_match_recount(db, video) == (32, 5)
+
+    # writing the same state again change nothing
+    await crud_content.update_moderation_status_comment(db, [f"{video}-c3"], "heldForReview")
+    await crud_content.update_comments_prediction_batch(db, [{"comment_id": f"{video}-c5", "is_judi": True, "confidence": 0.9}], "test")
+    assert await assert_stats_match_recount(db, video) == (32, 5)
+
+def test_row_written_concurrently_is_recounted():
+    changes = StatsChanges()
+    changes.add(
+        {"a": ("published", True)},
+        [("a", "v1", "published", None, False), ("b", "v1", "published", None, True), ("c", "v2", "published", None, False)]
+    )
+    assert changes.deltas == {"v1": [1, -1], "v2": [1, 0]}
+    # "c" was updated without being locked before: inserted by another transaction in between
+    assert changes.recount == {"v2"}